@@ -44,17 +44,48 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "reviews.instrumentation.InstrumentationMiddleware",
+    "reviews.querybudget.QueryBudgetMiddleware",
+    "reviews.routers.ReplicaPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # Static files are answered here, before sessions and authentication.
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
 ]
 
-ROOT_URLCONF = "django_project.urls"
+# asgi.py switches to django_project.urls_async, which serves the read pages with async views.
+ROOT_URLCONF = os.environ.get("DJANGO_URLCONF", "django_project.urls")
+
+# Query budgets per URL name, checked by reviews.querybudget (logged in DEBUG, asserted in tests).
+# Each ceiling includes the session and user lookups of an authenticated request; review writes also
+# update the author's statistics and queue the recompute of the restaurant's ranking, daily rollup and
+# similar restaurants (reviews.jobs).
+QUERY_BUDGET_ENABLED = DEBUG
+
+QUERY_BUDGETS = {
+    "home": 3,
+    "restaurant_detail": 5,
+    "restaurant_stats": 4,
+    "add_review": 9,
+    "search": 5,
+    "user_reviews": 4,
+    "metrics": 1,
+    "api_restaurants": 1,
+    "api_restaurants_export": 1,
+    # Only the lookup that rebuilds the process's name index reads the database.
+    "api_restaurant_typeahead": 1,
+    "api_restaurant": 1,
+    "api_restaurant_reviews": 2,
+    "api_restaurant_reviews_export": 2,
+    "review_detail": 3,
+    "update_review": 9,
+    "delete_review": 9,
+}
 
 TEMPLATES = [
     {
@@ -85,9 +116,186 @@ DATABASES = {
     }
 }
 
+# Database performance profiles. DJANGO_DB_PROFILE selects one: "web" (default) for the site,
+# "batch" for long imports and maintenance commands, "default" for the engines' own defaults.
+# SQLite PRAGMAs and the PostgreSQL statement timeout are applied to every new connection by
+# reviews.dbtuning; "python manage.py db_profile" reports the settings in effect.
+#
+# SQLITE_PRAGMAS only holds per-connection settings. The journal mode is stored in the database file
+# itself, so it is only changed by the "wal" profile: the web profile plus WAL, so readers do not block
+# on the writer. gunicorn.conf.py selects it for the served processes, which own the database file;
+# management commands and tests keep the file's mode unless run with it, as it rewrites the file and
+# leaves -wal and -shm files next to it.
+
+DATABASE_PROFILES = {
+    "default": {
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": False,
+        "SQLITE_PRAGMAS": {},
+        "SQLITE_JOURNAL_MODE": None,
+        "SQLITE_TRANSACTION_MODE": None,
+        "STATEMENT_TIMEOUT_MS": None,
+    },
+    "web": {
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "SQLITE_PRAGMAS": {
+            "synchronous": "NORMAL",
+            "mmap_size": 256 * 1024 * 1024,
+            "cache_size": -64 * 1024,
+            "busy_timeout": 5000,
+            "temp_store": "MEMORY",
+        },
+        "SQLITE_JOURNAL_MODE": None,
+        "SQLITE_TRANSACTION_MODE": "IMMEDIATE",
+        "STATEMENT_TIMEOUT_MS": 5000,
+    },
+    "batch": {
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": False,
+        "SQLITE_PRAGMAS": {
+            "synchronous": "NORMAL",
+            "mmap_size": 1024 * 1024 * 1024,
+            "cache_size": -256 * 1024,
+            "busy_timeout": 30000,
+            "temp_store": "MEMORY",
+        },
+        "SQLITE_JOURNAL_MODE": None,
+        "SQLITE_TRANSACTION_MODE": "IMMEDIATE",
+        "STATEMENT_TIMEOUT_MS": 0,
+    },
+}
+DATABASE_PROFILES["wal"] = {**DATABASE_PROFILES["web"], "SQLITE_JOURNAL_MODE": "WAL"}
+
+DATABASE_PROFILE = os.environ.get("DJANGO_DB_PROFILE", "web")
+_db_profile = DATABASE_PROFILES[DATABASE_PROFILE]
+
 # Update database configuration from $DATABASE_URL.
-# db_from_env = dj_database_url.config(conn_max_age=500)
-# DATABASES["default"].update(db_from_env)
+if "DATABASE_URL" in os.environ:
+    db_from_env = dj_database_url.config(
+        conn_max_age=_db_profile["CONN_MAX_AGE"], conn_health_checks=_db_profile["CONN_HEALTH_CHECKS"]
+    )
+    DATABASES["default"].update(db_from_env)
+
+DATABASES["default"]["CONN_MAX_AGE"] = _db_profile["CONN_MAX_AGE"]
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = _db_profile["CONN_HEALTH_CHECKS"]
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3" and _db_profile["SQLITE_TRANSACTION_MODE"]:
+    # Writers take the lock when their transaction starts, so they wait on busy_timeout instead of failing
+    # with "database is locked" when a read lock cannot be upgraded.
+    DATABASES["default"].setdefault("OPTIONS", {})["transaction_mode"] = _db_profile["SQLITE_TRANSACTION_MODE"]
+if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    # .iterator() streams through server-side cursors; set DISABLE_SERVER_SIDE_CURSORS only behind a
+    # transaction-pooling PgBouncer.
+    DATABASES["default"].setdefault("DISABLE_SERVER_SIDE_CURSORS", False)
+
+# Read replicas. DATABASE_REPLICA_URL adds a "replica" alias that read-only views read from (see
+# reviews.routers); writes and everything outside those views use "default". For a local setup, point it
+# at a second SQLite file and keep it current with "python manage.py sync_replica --interval 2".
+
+if "DATABASE_REPLICA_URL" in os.environ:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        **dj_database_url.parse(
+            os.environ["DATABASE_REPLICA_URL"],
+            conn_max_age=_db_profile["CONN_MAX_AGE"],
+            conn_health_checks=_db_profile["CONN_HEALTH_CHECKS"],
+        ),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["reviews.routers.PrimaryReplicaRouter"]
+
+# After a write, the client's reads stay on the primary for this long; keep it above the replication lag.
+REPLICA_PIN_COOKIE = "primary_pin"
+REPLICA_PIN_SECONDS = 10
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# DJANGO_CACHE selects the backend: "locmem" (default), "file" or "db" (run createcachetable first).
+
+CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "restaurant-ratings",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("DJANGO_CACHE_DIR", BASE_DIR / "cache"),
+    },
+    "db": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "django_cache",
+    },
+}
+
+CACHES = {"default": CACHE_BACKENDS[os.environ.get("DJANGO_CACHE", "locmem")]}
+
+# Seconds a rendered page fragment stays cached; writes invalidate it earlier through reviews.caching.
+PAGE_CACHE_TIMEOUT = 600
+
+# Restaurant rankings (reviews.ranking). The Bayesian score counts RANKING_PRIOR_WEIGHT reviews at the
+# site-wide mean (RANKING_PRIOR_MEAN until compact_rankings has computed it); trending counts reviews
+# with a weight halving every TRENDING_HALF_LIFE_DAYS.
+RANKING_PRIOR_MEAN = 3.0
+RANKING_PRIOR_WEIGHT = 10
+TRENDING_HALF_LIFE_DAYS = 7
+
+# "Near me" searches (?near=lat,lng&radius=km on the home page and the restaurant list API, see reviews.geo).
+NEAR_DEFAULT_RADIUS_KM = 5
+NEAR_MAX_RADIUS_KM = 100
+
+# Request instrumentation (reviews.instrumentation). With SERVER_TIMING_ENABLED, every request's database
+# statements are recorded and responses carry a Server-Timing header with their database, template and
+# view time and query count, which exposes those timings publicly, so it is only on by default in DEBUG;
+# the per-route database metrics (reviews.metrics) are also only recorded then. cProfile profiles of a
+# PROFILE_SAMPLE_RATE sample of requests, of every request to PROFILE_URL_NAMES and, with
+# PROFILE_STAFF_FLAG, of staff requests with ?profile are written to PROFILE_DIR, which keeps the newest
+# PROFILE_MAX_FILES; `manage.py profile_summary` reports their hottest functions.
+SERVER_TIMING_ENABLED = DEBUG
+PROFILE_DIR = os.environ.get("DJANGO_PROFILE_DIR", BASE_DIR / "profiles")
+PROFILE_MAX_FILES = int(os.environ.get("DJANGO_PROFILE_MAX_FILES", "1000"))
+PROFILE_SAMPLE_RATE = float(os.environ.get("DJANGO_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_URL_NAMES = [name for name in os.environ.get("DJANGO_PROFILE_URL_NAMES", "").split(",") if name]
+PROFILE_STAFF_FLAG = True
+
+# Metrics (reviews.metrics) are served at /metrics in the Prometheus text format, to scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>". Without a token the endpoint answers 404, unless DEBUG is on
+# or METRICS_PUBLIC serves it to anyone. Set PROMETHEUS_MULTIPROC_DIR to an empty directory before
+# starting gunicorn to aggregate them across its worker processes.
+METRICS_TOKEN = os.environ.get("DJANGO_METRICS_TOKEN", "")
+METRICS_PUBLIC = os.environ.get("DJANGO_METRICS_PUBLIC", "") == "True"
+
+# Restaurant name typeahead (reviews.typeahead): each process rebuilds its name index on the first lookup
+# after a restaurant is added, renamed or deleted, at most every TYPEAHEAD_REBUILD_SECONDS. Review writes
+# do not trigger rebuilds; the review counts it ranks by are refreshed every TYPEAHEAD_MAX_AGE_SECONDS.
+TYPEAHEAD_REBUILD_SECONDS = 10
+TYPEAHEAD_MAX_AGE_SECONDS = 600
+
+# Similar restaurants (reviews.similarity): the top SIMILAR_RESTAURANTS neighbours of each restaurant,
+# by cosine similarity of their ratings shrunk by n / (n + SIMILARITY_SHRINKAGE) for n shared reviewers,
+# ignoring pairs with fewer than SIMILARITY_MIN_COMMON_REVIEWERS. A restaurant's neighbours are recomputed
+# SIMILARITY_REFRESH_DELAY_SECONDS after a review write; `manage.py compute_similarities` rebuilds them all.
+SIMILAR_RESTAURANTS = 10
+SIMILARITY_SHRINKAGE = 10
+SIMILARITY_MIN_COMMON_REVIEWERS = 2
+SIMILARITY_REFRESH_DELAY_SECONDS = 3600
+
+# Background jobs (reviews.jobs), run by `manage.py run_worker`. A failed batch is retried after
+# JOB_RETRY_BACKOFF_SECONDS, doubling per attempt, up to JOB_MAX_ATTEMPTS; a running job whose worker
+# stays silent for JOB_LOCK_TIMEOUT_SECONDS is handed to another worker.
+JOB_BATCH_SIZE = 100
+JOB_POLL_SECONDS = 1.0
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF_SECONDS = 5
+JOB_LOCK_TIMEOUT_SECONDS = 300
+
+# Deleting a restaurant or user with many reviews (the admin's delete jobs and `manage.py
+# delete_with_reviews`) removes REVIEW_DELETE_BATCH_SIZE reviews per transaction, and the command
+# sleeps REVIEW_DELETE_PAUSE_SECONDS between them so review submissions get the write lock.
+REVIEW_DELETE_BATCH_SIZE = 1000
+REVIEW_DELETE_PAUSE_SECONDS = 0.05
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -128,7 +336,19 @@ STATIC_URL = "/static/"
 
 STATICFILES_DIRS = (BASE_DIR / "static",)
 
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# collectstatic writes every file under a content-hashed name with gzip and (with the Brotli package)
+# brotli copies; WhiteNoise serves the hashed names with a far-future, immutable Cache-Control header.
+# STATICFILES_STORAGE is no longer read by Django 5.1, so this is configured through STORAGES. The test
+# runner (django_project.test_runner) has no collectstatic manifest and swaps in plain storage.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"},
+}
+
+TEST_RUNNER = "django_project.test_runner.TestRunner"
+
+# Unhashed files (none are referenced by the templates) may be cached for a day.
+WHITENOISE_MAX_AGE = 0 if DEBUG else 86400
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
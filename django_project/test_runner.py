@@ -0,0 +1,29 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# The tests render pages without running collectstatic first, so there is no manifest of hashed names.
+TEST_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner that serves static files under their plain names.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.storages = override_settings(STORAGES=TEST_STORAGES)
+        self.storages.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.storages.disable()
+        super().teardown_test_environment(**kwargs)
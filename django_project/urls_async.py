@@ -0,0 +1,18 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+from django.urls import path
+from reviews.async_views import AsyncHomeView, AsyncRestaurantDetailView, AsyncReviewDetailView
+from .urls import urlpatterns as sync_urlpatterns
+
+# URLconf used under ASGI (see asgi.py): the read pages resolve to their async views first and every
+# other URL falls through to the regular patterns.
+urlpatterns = [
+    path("", AsyncHomeView.as_view(), name="home"),
+    path("restaurant/<int:pk>/", AsyncRestaurantDetailView.as_view(), name="restaurant_detail"),
+    path("review/<int:pk>/", AsyncReviewDetailView.as_view(), name="review_detail"),
+    *sync_urlpatterns,
+]
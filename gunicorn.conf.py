@@ -0,0 +1,120 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# Gunicorn configuration, read from the working directory by `gunicorn django_project.wsgi`. Every value
+# can be overridden from the environment (or on the command line).
+STARTED = time.perf_counter()
+
+# Heroku and most platforms set PORT and WEB_CONCURRENCY.
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+
+# Threaded workers: a request waiting on the database or the cache does not hold up the worker's other
+# requests, and threads share the worker's warmed templates, typeahead index and connections per thread.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Import the application once in the master, warm it up there, and fork workers that share its memory.
+preload_app = True
+
+# Recycle workers after a few thousand requests, jittered so they do not all restart at once.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 200))
+
+# A worker silent for timeout seconds is killed; on shutdown or reload, workers get graceful_timeout
+# seconds to finish their requests.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+# The served processes own the database file, so SQLite runs in WAL mode: readers no longer wait for
+# the writer (see DATABASE_PROFILES in the settings). Read before the application is preloaded.
+os.environ.setdefault("DJANGO_DB_PROFILE", "wal")
+
+# Workers share their metrics through this directory (reviews.metrics); prometheus_client reads it when
+# imported, so it is set before the application is preloaded.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "restaurant-review-metrics"))
+
+
+def on_starting(server):
+    """
+    Start every run with an empty metrics directory, as the processes that wrote the old files are gone.
+    """
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def when_ready(server):
+    """
+    Compile the templates and URLs in the preloaded master, so every worker inherits them, and report
+    how long startup took.
+    """
+    from django.conf import settings
+    from django.db import connections
+    from reviews.warmup import warm_up
+
+    report = warm_up([settings.ROOT_URLCONF], databases=False)
+    # Connections are opened per worker after the fork; none may be inherited from the master.
+    connections.close_all()
+    steps = ", ".join(f"{name} {result} in {elapsed * 1000:.0f} ms" for name, result, elapsed in report)
+    server.log.info("Ready in %.0f ms (warmup: %s)", (time.perf_counter() - STARTED) * 1000, steps)
+
+
+def pre_fork(server, worker):
+    """
+    Note when the worker was forked, for its boot time.
+    """
+    worker.forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    """
+    Open the database connections of the threads that will serve requests, and report the worker's boot time.
+    """
+    from reviews.warmup import prime_connections
+
+    pool = getattr(worker, "tpool", None)
+    if pool is None:
+        primed = prime_connections()
+    else:
+        # Django connections belong to a thread. Each task waits for the others, so every pool thread
+        # runs one and keeps its connection (CONN_MAX_AGE) for the requests it will serve.
+        barrier = threading.Barrier(worker.cfg.threads)
+
+        def prime():
+            try:
+                barrier.wait(timeout=10)
+            except threading.BrokenBarrierError:
+                pass
+            return prime_connections()
+
+        primed = sum(task.result() for task in [pool.submit(prime) for _ in range(worker.cfg.threads)])
+    worker.log.info(
+        "Worker %s ready in %.0f ms (%d connections)",
+        worker.pid,
+        (time.perf_counter() - worker.forked_at) * 1000,
+        primed,
+    )
+
+
+def child_exit(server, worker):
+    """
+    Let the metrics of a dead worker be merged without its live gauges.
+    """
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -4,26 +4,267 @@ CIS 218: Django Project
 Date: October 10, 2024
 """
 
-from django.contrib import admin
-from .models import Restaurant, Review
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.utils import NestedObjects, quote
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
+from django.db import router, transaction
+from django.db.models import Count
+from django.db.models.functions import Now
+from django.urls import NoReverseMatch, reverse
+from django.utils.html import format_html
+from django.utils.text import capfirst
+from .caching import invalidate_all
+from .jobs import delete_owners
+from .models import DELETE_RESTAURANT_JOB, DELETE_USER_JOB, RATING_CHOICES, Job, Restaurant, Review
+from .pagination import EstimatedCountPaginator
+from .search import filter_restaurants, filter_reviews
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    List filter for a foreign key that picks the related object with the admin's autocomplete widget.
+
+    Unlike the default related filter it never lists the related table: the options are fetched from
+    the autocomplete view as the user types. The related model's admin needs search_fields.
+    """
+
+    template = "admin/reviews/autocomplete_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f"{field_path}__{field.target_field.name}__exact"
+        super().__init__(field, request, params, model, model_admin, field_path)
+        widget = AutocompleteSelect(
+            field, model_admin.admin_site, attrs={"data-filter-param": self.lookup_kwarg, "style": "width: 100%"}
+        )
+        # The form field gives the widget its choices, which only ever query the selected object.
+        self.form_field = forms.ModelChoiceField(
+            field.remote_field.model._default_manager.all(), widget=widget, required=False
+        )
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def value(self):
+        """
+        Returns the selected related object's key, or None.
+        """
+        values = self.used_parameters.get(self.lookup_kwarg)
+        return values[-1] if values else None
+
+    def choices(self, changelist):
+        yield {
+            "selected": self.value() is None,
+            "query_string": changelist.get_query_string(remove=[self.lookup_kwarg]),
+            "display": "All",
+        }
+
+    def rendered_widget(self):
+        """
+        Returns the HTML of the autocomplete select, showing the selected object if there is one.
+        """
+        return self.form_field.widget.render(self.lookup_kwarg, self.value(), attrs={"id": f"filter_{self.field_path}"})
+
+
+class RatingFilter(admin.SimpleListFilter):
+    """
+    Filter reviews by rating from the fixed choices, rather than from a DISTINCT scan of the table.
+    """
+
+    title = "rating"
+    parameter_name = "rating"
+
+    def lookups(self, request, model_admin):
+        return [(str(rating), f"{rating} star{'s' if rating > 1 else ''}") for rating in RATING_CHOICES]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(rating=self.value())
+        return queryset
+
+
+class ReviewlessCollector(NestedObjects):
+    """
+    Collects the objects a deletion cascades to, except the reviews: those are counted instead, as a
+    restaurant or user can have far too many to load or list.
+    """
+
+    def related_objects(self, related_model, related_fields, objs):
+        related = super().related_objects(related_model, related_fields, objs)
+        return related.none() if related_model is Review else related
+
+
+class BatchedDeletionMixin:
+    """
+    Admin mixin for models with many reviews. Deleting an object hides it at once and queues a job
+    (reviews.jobs.delete_owners) that removes its reviews in short batches and then the object, instead
+    of cascading in the request; objects whose reviews fit in one batch are deleted right away.
+
+    The confirmation page lists what the deletion cascades to as usual, but only counts the reviews.
+    """
+
+    deletion_job = None
+    # The Review foreign key to the model, and the values that hide an object until its job has run.
+    review_lookup = None
+    hidden_values = {}
+
+    def review_counts(self, pks):
+        """
+        Returns {pk: number of reviews} for the objects with the given primary keys that have reviews.
+        """
+        reviews = Review.objects.filter(**{f"{self.review_lookup}__in": pks}).order_by()
+        return dict(reviews.values_list(self.review_lookup).annotate(Count("pk")))
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        if not objs:
+            return [], {}, set(), []
+        collector = ReviewlessCollector(using=router.db_for_write(self.model), origin=objs)
+        collector.collect(objs)
+        perms_needed = set()
+
+        def format_callback(obj):
+            # As django.contrib.admin.utils.get_deleted_objects() does.
+            opts = obj._meta
+            no_edit_link = f"{capfirst(opts.verbose_name)}: {obj}"
+            if not self.admin_site.is_registered(obj.__class__):
+                return no_edit_link
+            if not self.admin_site.get_model_admin(obj.__class__).has_delete_permission(request, obj):
+                perms_needed.add(opts.verbose_name)
+            try:
+                url = reverse(f"{self.admin_site.name}:{opts.app_label}_{opts.model_name}_change", args=[quote(obj.pk)])
+            except NoReverseMatch:
+                return no_edit_link
+            return format_html('{}: <a href="{}">{}</a>', capfirst(opts.verbose_name), url, obj)
+
+        deleted = collector.nested(format_callback)
+        protected = [format_callback(obj) for obj in collector.protected]
+        model_count = {model._meta.verbose_name_plural: len(found) for model, found in collector.model_objs.items()}
+        reviews = sum(self.review_counts([obj.pk for obj in objs]).values())
+        if reviews:
+            deleted.append(f"{reviews} {Review._meta.verbose_name_plural}, deleted in batches")
+            model_count[Review._meta.verbose_name_plural] = reviews
+            if not request.user.has_perm("reviews.delete_review"):
+                perms_needed.add(Review._meta.verbose_name)
+        return deleted, model_count, perms_needed, protected
+
+    def delete_model(self, request, obj):
+        self.queue_deletion(request, [obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        self.queue_deletion(request, list(queryset.values_list("pk", flat=True)))
+
+    def hide(self, pks):
+        """
+        Hide the objects with the given primary keys from the site until their deletion job has run.
+        """
+        self.model._default_manager.filter(pk__in=pks).update(**self.hidden_values)
+
+    def queue_deletion(self, request, pks):
+        """
+        Hide the objects with the given primary keys, delete those whose reviews fit in one batch of
+        settings.REVIEW_DELETE_BATCH_SIZE and queue the deletion of the others.
+        """
+        counts = self.review_counts(pks)
+        budget = settings.REVIEW_DELETE_BATCH_SIZE
+        now, later = [], []
+        for pk in pks:
+            # delete_owners() only deletes an object while some of its budget is left.
+            if counts.get(pk, 0) < budget:
+                now.append(pk)
+                budget -= counts.get(pk, 0)
+            else:
+                later.append(pk)
+        using = router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            self.hide(pks)
+            if now:
+                delete_owners(self.model, self.review_lookup, self.deletion_job, now, using)
+            Job.objects.using(using).enqueue((self.deletion_job, pk) for pk in later)
+        if later:
+            self.message_user(
+                request,
+                f"{len(later)} {self.opts.verbose_name_plural} with many reviews are hidden now; they and "
+                f"their reviews are removed in the background by the job worker.",
+                messages.INFO,
+            )
 
 
 @admin.register(Restaurant)
-class RestaurantAdmin(admin.ModelAdmin):
+class RestaurantAdmin(BatchedDeletionMixin, admin.ModelAdmin):
     """
     Restaurant admin
     """
 
     list_display = ("name", "created", "updated")
     search_fields = ("name",)
+    deletion_job = DELETE_RESTAURANT_JOB
+    review_lookup = "restaurant"
+    hidden_values = {"deleted": Now()}
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).visible()
+
+    def hide(self, pks):
+        super().hide(pks)
+        # Other restaurants' pages list hidden ones as similar, and profiles list their reviews.
+        invalidate_all()
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Match names through the full-text index; the review admin's restaurant autocomplete uses this too.
+        """
+        return filter_restaurants(queryset, search_term), False
 
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     """
-    Review admin
+    Review admin, built to stay fast with millions of reviews.
     """
 
     list_display = ("restaurant", "user", "rating", "created")
-    list_filter = ("restaurant", "rating")
-    search_fields = ("restaurant__name", "user__username")
+    list_select_related = ("restaurant", "user")
+    list_filter = (("restaurant", AutocompleteFilter), ("user", AutocompleteFilter), RatingFilter)
+    autocomplete_fields = ("restaurant", "user")
+    search_fields = ("body", "restaurant__name", "user__username")
+    search_help_text = "Words from the review or the restaurant's name, or a reviewer's exact username."
+    # The changelist counts at most EstimatedCountPaginator.exact_limit rows, and skips the total count.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Newest first by primary key, which needs no sort; other columns would sort the whole table.
+    ordering = ("-pk",)
+    sortable_by = ()
+
+    @property
+    def media(self):
+        restaurant = Review._meta.get_field("restaurant")
+        return (
+            super().media
+            + AutocompleteSelect(restaurant, self.admin_site).media
+            + forms.Media(js=["reviews/admin/autocomplete_filter.js"])
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search through the full-text indexes instead of LIKE scans across joins.
+        """
+        return filter_reviews(queryset, search_term), False
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class ReviewerAdmin(BatchedDeletionMixin, UserAdmin):
+    """
+    User admin that deletes users with their reviews in batches.
+    """
+
+    deletion_job = DELETE_USER_JOB
+    review_lookup = "user"
+    # Inactive users can no longer log in, and their sessions stop authenticating.
+    hidden_values = {"is_active": False}
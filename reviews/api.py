@@ -0,0 +1,265 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+from operator import itemgetter
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views import View
+from .geo import nearest, parse_near
+from .models import Restaurant, Review
+from .pagination import InvalidCursor, KeysetPaginator
+from . import typeahead
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+EXPORT_CHUNK_SIZE = 2000
+
+
+def average_rating(row):
+    return round(row["rating_sum"] / row["review_count"], 2) if row["review_count"] else None
+
+
+# API field name -> (database fields read with values(), function building the output value from the row).
+RESTAURANT_FIELDS = {
+    "id": (["id"], lambda row: row["id"]),
+    "name": (["name"], lambda row: row["name"]),
+    "review_count": (["review_count"], lambda row: row["review_count"]),
+    "average_rating": (["rating_sum", "review_count"], average_rating),
+    "rating_histogram": (
+        [f"rating_{rating}_count" for rating in range(1, 6)],
+        lambda row: {str(rating): row[f"rating_{rating}_count"] for rating in range(1, 6)},
+    ),
+    "latitude": (["latitude"], lambda row: row["latitude"]),
+    "longitude": (["longitude"], lambda row: row["longitude"]),
+    "created": (["created"], lambda row: row["created"]),
+    "updated": (["updated"], lambda row: row["updated"]),
+}
+RESTAURANT_LIST_FIELDS = ["id", "name", "review_count", "average_rating"]
+# A "near me" list also has each restaurant's distance from the point, computed after the query.
+NEARBY_RESTAURANT_FIELDS = {**RESTAURANT_FIELDS, "distance_km": ([], lambda row: round(row["distance_km"], 3))}
+NEARBY_RESTAURANT_LIST_FIELDS = [*RESTAURANT_LIST_FIELDS, "distance_km"]
+# Typeahead answers come from the in-memory name index, which only holds these.
+TYPEAHEAD_FIELDS = {name: RESTAURANT_FIELDS[name] for name in ("id", "name", "review_count")}
+
+REVIEW_FIELDS = {
+    "id": (["id"], lambda row: row["id"]),
+    "restaurant": (["restaurant_id"], lambda row: row["restaurant_id"]),
+    "user": (["user__username"], lambda row: row["user__username"]),
+    "rating": (["rating"], lambda row: row["rating"]),
+    "body": (["body"], lambda row: row["body"]),
+    "created": (["created"], lambda row: row["created"]),
+    "updated": (["updated"], lambda row: row["updated"]),
+}
+REVIEW_LIST_FIELDS = ["id", "user", "rating", "body", "created"]
+
+
+class ApiError(Exception):
+    """
+    Raised for a bad API request; rendered as a JSON 400 response.
+    """
+
+
+class JsonApiView(View):
+    """
+    Base class for the read-only JSON API.
+
+    Rows are read with values() and serialized straight to JSON, so no model instances are built.
+    Subclasses set model or queryset, fields (the available fields) and default_fields, and clients can
+    pick a subset with ?fields=a,b.
+    """
+
+    http_method_names = ["get", "head", "options"]
+    read_from_replica = True
+    model = None
+    queryset = None
+    fields = {}
+    default_fields = []
+    ordering = ("id",)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+
+    def selected_fields(self):
+        requested = self.request.GET.get("fields")
+        if not requested:
+            return list(self.default_fields)
+        names = [name.strip() for name in requested.split(",") if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(self.fields)}.")
+        return names
+
+    def database_fields(self, names):
+        """
+        Returns the database fields needed for the selected API fields and the ordering.
+        """
+        needed = dict.fromkeys(field.lstrip("-") for field in self.ordering)
+        for name in names:
+            needed.update(dict.fromkeys(self.fields[name][0]))
+        return list(needed)
+
+    def serialize(self, row, names):
+        return {name: self.fields[name][1](row) for name in names}
+
+    def page_size(self):
+        try:
+            size = int(self.request.GET.get("limit", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ApiError("limit must be an integer.")
+        return max(1, min(size, MAX_PAGE_SIZE))
+
+    def get_queryset(self):
+        """
+        Returns the rows the view serves: a copy of queryset, or else every row of model.
+        """
+        if self.queryset is not None:
+            return self.queryset.all()
+        if self.model is not None:
+            return self.model._default_manager.all()
+        raise ImproperlyConfigured(f"{self.__class__.__name__} is missing a queryset or a model.")
+
+    def paginated_response(self):
+        names = self.selected_fields()
+        queryset = self.get_queryset().values(*self.database_fields(names))
+        paginator = KeysetPaginator(queryset, self.ordering, self.page_size())
+        try:
+            page = paginator.page(self.request.GET.get("cursor"))
+        except InvalidCursor:
+            raise ApiError("Invalid cursor.")
+        return JsonResponse(
+            {
+                "results": [self.serialize(row, names) for row in page],
+                "next": page.next_cursor,
+                "previous": page.previous_cursor,
+            }
+        )
+
+    def streaming_response(self):
+        """
+        Stream every row as JSON Lines, reading the queryset in chunks so memory use stays constant.
+        """
+        names = self.selected_fields()
+        rows = self.get_queryset().order_by(*self.ordering).values(*self.database_fields(names))
+        # The rows are read after the middleware has returned, so fix the alias chosen for this request now.
+        rows = rows.using(rows.db)
+        encoder = DjangoJSONEncoder(separators=(",", ":"))
+
+        def lines():
+            for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                yield encoder.encode(self.serialize(row, names)) + "\n"
+
+        return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+
+
+class RestaurantListApiView(JsonApiView):
+    """
+    API endpoint listing restaurants by name, one cursor page at a time.
+
+    With ?near=lat,lng&radius=km it lists the restaurants within the radius instead, nearest first,
+    as a single page of at most ?limit= results.
+    """
+
+    queryset = Restaurant.objects.visible()
+    fields = RESTAURANT_FIELDS
+    default_fields = RESTAURANT_LIST_FIELDS
+    ordering = ("name", "id")
+
+    def get(self, request):
+        if request.GET.get("near"):
+            return self.nearby_response()
+        return self.paginated_response()
+
+    def nearby_response(self):
+        try:
+            latitude, longitude, radius_km = parse_near(self.request.GET["near"], self.request.GET.get("radius"))
+        except ValueError as exc:
+            raise ApiError(str(exc))
+        self.fields, self.default_fields = NEARBY_RESTAURANT_FIELDS, NEARBY_RESTAURANT_LIST_FIELDS
+        names = self.selected_fields()
+        fields = [field for field in self.database_fields(names) if field not in ("latitude", "longitude")]
+        rows = self.get_queryset().near(latitude, longitude, radius_km).values(*fields, "latitude", "longitude")
+        found = nearest(rows, latitude, longitude, radius_km, self.page_size(), itemgetter("latitude", "longitude"))
+        results = []
+        for distance, row in found:
+            row["distance_km"] = distance
+            results.append(self.serialize(row, names))
+        return JsonResponse({"results": results, "next": None, "previous": None})
+
+
+class RestaurantExportApiView(RestaurantListApiView):
+    """
+    API endpoint streaming every restaurant as JSON Lines.
+    """
+
+    def get(self, request):
+        return self.streaming_response()
+
+
+class RestaurantTypeaheadApiView(JsonApiView):
+    """
+    API endpoint completing a restaurant name: the restaurants with a word starting with ?q=, ignoring
+    case and accents, most reviewed first, at most ?limit= of them.
+
+    Answered from the process's prefix index (reviews.typeahead) without querying the database.
+    """
+
+    fields = TYPEAHEAD_FIELDS
+    default_fields = list(TYPEAHEAD_FIELDS)
+
+    def get(self, request):
+        names = self.selected_fields()
+        found = typeahead.get_index().search(request.GET.get("q", ""), self.page_size())
+        rows = [{"id": pk, "name": name, "review_count": review_count} for pk, name, review_count in found]
+        return JsonResponse({"results": [self.serialize(row, names) for row in rows]})
+
+
+class RestaurantDetailApiView(JsonApiView):
+    """
+    API endpoint for a single restaurant, including its rating histogram.
+    """
+
+    queryset = Restaurant.objects.visible()
+    fields = RESTAURANT_FIELDS
+    default_fields = list(RESTAURANT_FIELDS)
+
+    def get(self, request, pk):
+        names = self.selected_fields()
+        row = self.get_queryset().filter(pk=pk).values(*self.database_fields(names)).first()
+        if row is None:
+            raise Http404("No restaurant found.")
+        return JsonResponse(self.serialize(row, names))
+
+
+class RestaurantReviewsApiView(JsonApiView):
+    """
+    API endpoint listing a restaurant's reviews, newest first, one cursor page at a time.
+    """
+
+    model = Review
+    fields = REVIEW_FIELDS
+    default_fields = REVIEW_LIST_FIELDS
+    ordering = ("-created", "-id")
+
+    def get_queryset(self):
+        if not Restaurant.objects.visible().filter(pk=self.kwargs["pk"]).exists():
+            raise Http404("No restaurant found.")
+        return super().get_queryset().filter(restaurant_id=self.kwargs["pk"])
+
+    def get(self, request, pk):
+        return self.paginated_response()
+
+
+class RestaurantReviewsExportApiView(RestaurantReviewsApiView):
+    """
+    API endpoint streaming every review of a restaurant as JSON Lines.
+    """
+
+    def get(self, request, pk):
+        return self.streaming_response()
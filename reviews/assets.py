@@ -0,0 +1,196 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import re
+from pathlib import Path
+
+# At-rules whose blocks hold rules (and are purged recursively); other blocks such as @keyframes are kept whole.
+NESTED_AT_RULES = ("@media", "@supports", "@container", "@layer")
+
+# Words in templates that could be class names, ids or attribute names.
+_TOKEN = re.compile(r"[A-Za-z_][\w-]*")
+_NEGATION = re.compile(r":not\((?:[^()]|\([^()]*\))*\)")
+_CLASS_OR_ID = re.compile(r"[.#](-?[A-Za-z_][\w-]*)")
+_ATTRIBUTE = re.compile(r"\[\s*([\w-]+)")
+_KEYFRAMES = re.compile(r"@(?:-webkit-)?keyframes\s+([\w-]+)")
+
+
+def used_tokens(paths):
+    """
+    Returns every word that appears in the given files, as the set of possibly used selectors.
+
+    Like PurgeCSS's default extractor this over-approximates: a word anywhere in a template keeps the
+    rules for a class of that name, so classes assembled in template conditionals survive.
+    """
+    tokens = set()
+    for path in paths:
+        tokens.update(_TOKEN.findall(Path(path).read_text(encoding="utf-8")))
+    return tokens
+
+
+def _scan(css, start, stops):
+    """
+    Returns the index of the first of stops at or after start, skipping strings, comments and brackets.
+    """
+    depth = 0
+    index = start
+    while index < len(css):
+        char = css[index]
+        if css.startswith("/*", index):
+            index = css.index("*/", index + 2) + 2
+            continue
+        if char in "\"'":
+            index = css.index(char, index + 1) + 1
+            continue
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif depth == 0 and char in stops:
+            return index
+        index += 1
+    return index
+
+
+def parse(css, start=0, end=None):
+    """
+    Parse a stylesheet into ("comment", text), ("statement", text), ("block", prelude, children) and
+    ("rule", prelude, body) nodes. Declarations are kept as they are, so minified input stays minified.
+    """
+    end = len(css) if end is None else end
+    nodes = []
+    index = start
+    while index < end:
+        if css[index].isspace():
+            index += 1
+            continue
+        if css.startswith("/*", index):
+            close = css.index("*/", index + 2) + 2
+            # Only /*! license */ comments are kept.
+            if css.startswith("/*!", index):
+                nodes.append(("comment", css[index:close]))
+            index = close
+            continue
+        stop = _scan(css, index, "{;}")
+        prelude = css[index:stop].strip()
+        if stop >= end or css[stop] != "{":
+            if prelude:
+                nodes.append(("statement", prelude))
+            index = stop + 1
+            continue
+        close = _matching_brace(css, stop)
+        if prelude.startswith(NESTED_AT_RULES):
+            nodes.append(("block", prelude, parse(css, stop + 1, close)))
+        else:
+            nodes.append(("rule", prelude, css[stop + 1 : close]))
+        index = close + 1
+    return nodes
+
+
+def _matching_brace(css, opening):
+    depth = 0
+    index = opening
+    while True:
+        index = _scan(css, index, "{}")
+        depth += 1 if css[index] == "{" else -1
+        if depth == 0:
+            return index
+        index += 1
+
+
+def serialize(nodes):
+    """
+    Returns the stylesheet text of parsed nodes.
+    """
+    parts = []
+    for kind, *rest in nodes:
+        if kind == "comment":
+            parts.append(rest[0] + "\n")
+        elif kind == "statement":
+            parts.append(rest[0] + ";")
+        elif kind == "block":
+            parts.append(f"{rest[0]}{{{serialize(rest[1])}}}")
+        else:
+            parts.append(f"{rest[0]}{{{rest[1]}}}")
+    return "".join(parts)
+
+
+def split_selectors(prelude):
+    """
+    Split a selector list on its top-level commas.
+    """
+    selectors = []
+    start = 0
+    while start <= len(prelude):
+        stop = _scan(prelude, start, ",")
+        selectors.append(prelude[start:stop].strip())
+        start = stop + 1
+    return selectors
+
+
+def selector_used(selector, tokens):
+    """
+    Returns whether every class, id and attribute name the selector requires is among tokens.
+
+    Names inside :not() are not required, so ".btn:not(.disabled)" is kept whenever "btn" is used.
+    """
+    required = _NEGATION.sub("", selector)
+    names = _CLASS_OR_ID.findall(required) + _ATTRIBUTE.findall(required)
+    return all(name in tokens for name in names)
+
+
+def purge(nodes, tokens):
+    """
+    Returns the nodes without the selectors (and then rules and blocks) the tokens do not use.
+
+    Keyframes survive only while a kept rule still names them.
+    """
+    kept = _purge_rules(nodes, tokens)
+    text = serialize(node for node in _walk(kept) if node[0] == "rule" and not node[1].startswith("@"))
+    return _drop_unused_keyframes(kept, text)
+
+
+def _purge_rules(nodes, tokens):
+    kept = []
+    for node in nodes:
+        kind = node[0]
+        if kind == "block":
+            children = _purge_rules(node[2], tokens)
+            if children:
+                kept.append(("block", node[1], children))
+        elif kind == "rule" and not node[1].startswith("@"):
+            selectors = [selector for selector in split_selectors(node[1]) if selector_used(selector, tokens)]
+            if selectors:
+                kept.append(("rule", ",".join(selectors), node[2]))
+        else:
+            kept.append(node)
+    return kept
+
+
+def _walk(nodes):
+    for node in nodes:
+        yield node
+        if node[0] == "block":
+            yield from _walk(node[2])
+
+
+def _drop_unused_keyframes(nodes, text):
+    kept = []
+    for node in nodes:
+        if node[0] == "block":
+            kept.append(("block", node[1], _drop_unused_keyframes(node[2], text)))
+            continue
+        keyframes = _KEYFRAMES.match(node[1]) if node[0] == "rule" else None
+        if keyframes is None or re.search(rf"\b{re.escape(keyframes.group(1))}\b", text):
+            kept.append(node)
+    return kept
+
+
+def purge_css(css, tokens):
+    """
+    Returns the stylesheet with the rules the tokens do not use removed.
+    """
+    return serialize(purge(parse(css), tokens))
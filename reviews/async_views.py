@@ -0,0 +1,144 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import asyncio
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.template.loader import render_to_string
+from django.template.response import TemplateResponse
+from .caching import aget_versions, areplica_may_lag, fragment_cache_enabled, fragment_cache_key
+from .conditional import not_modified_response, set_validator_headers
+from .metrics import record_cache_lookup
+from .models import Restaurant
+from .pagination import KeysetPaginator, apaginate_or_404
+from .views import REVIEWS_PER_PAGE, HomeView, RestaurantDetailView, ReviewDetailView
+
+
+async def get_user(request):
+    """
+    Returns the logged-in user, loaded with the async ORM.
+
+    The user is also stored on request.user, so the templates' context processors reuse it instead of
+    loading it again synchronously.
+    """
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+async def get_cached_fragment(view, request):
+    """
+    Returns (cache key, cached fragment or None, its validators or None) for a view using the versioned
+    fragment cache. The key is None when the client bypasses the cache (see fragment_cache_enabled()).
+    """
+    if not fragment_cache_enabled(request):
+        return None, None, None
+    versions = await aget_versions(*view.get_fragment_versions())
+    key = fragment_cache_key(view.fragment_template_name, versions, request)
+    cached = await cache.aget(key)
+    record_cache_lookup(view.fragment_template_name, cached is not None)
+    return (key, *(cached or (None, None)))
+
+
+async def store_fragment(view, key, context, request):
+    fragment = render_to_string(view.fragment_template_name, context, request)
+    if key is not None and not await areplica_may_lag(view.get_fragment_versions()):
+        await cache.aset(key, (fragment, view.get_fragment_validators(context)), settings.PAGE_CACHE_TIMEOUT)
+    return fragment
+
+
+class AsyncHomeView(HomeView):
+    """
+    Async version of HomeView, served when the project runs under ASGI.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        # The user is only needed by the page template, so it loads while the fragment is looked up.
+        (key, fragment, _), _ = await asyncio.gather(get_cached_fragment(self, request), get_user(request))
+        if fragment is None:
+            near = self.get_near()
+            if near is not None:
+                paginator = page = None
+                restaurants = await Restaurant.objects.visible().anearest(*near, limit=self.paginate_by)
+            else:
+                paginator = self.get_keyset_paginator(self.paginate_by)
+                page = self.restaurants_on_page(await apaginate_or_404(paginator, request.GET.get("cursor")))
+                restaurants = page.object_list
+            context = {
+                **self.sort_context(),
+                "paginator": paginator,
+                "page_obj": page,
+                "is_paginated": page is not None and page.has_other_pages(),
+                "object_list": restaurants,
+                self.context_object_name: restaurants,
+                "view": self,
+            }
+            fragment = await store_fragment(self, key, context, request)
+        return TemplateResponse(request, self.template_name, {"fragment": fragment, "view": self})
+
+
+class AsyncRestaurantDetailView(RestaurantDetailView):
+    """
+    Async version of RestaurantDetailView, served when the project runs under ASGI.
+
+    The user and the cached fragment are fetched concurrently. A cached fragment carries the page's
+    validators, so the restaurant row (which carries the stored rating aggregates) and the review page
+    are only read when the fragment is not cached.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        user, (key, fragment, validators) = await asyncio.gather(get_user(request), get_cached_fragment(self, request))
+        if fragment is None:
+            restaurant = await self.get_queryset().filter(pk=kwargs["pk"]).afirst()
+            if restaurant is None:
+                raise Http404("No restaurant found matching the query")
+            validators = self.get_validators(restaurant)
+        response, etag, last_modified = not_modified_response(request, validators, user.pk)
+        if response is None:
+            if fragment is None:
+                reviews = restaurant.reviews.select_related("user")
+                paginator = KeysetPaginator(reviews, self.reviews_ordering, REVIEWS_PER_PAGE)
+                page, similar_restaurants = await asyncio.gather(
+                    apaginate_or_404(paginator, request.GET.get("cursor")),
+                    self.aget_similar_restaurants(restaurant),
+                )
+                context = {
+                    "object": restaurant,
+                    self.context_object_name: restaurant,
+                    "reviews_page": page,
+                    "reviews": page.object_list,
+                    "average_rating": restaurant.average_rating(),
+                    "similar_restaurants": similar_restaurants,
+                    "view": self,
+                }
+                fragment = await store_fragment(self, key, context, request)
+            response = TemplateResponse(request, self.template_name, {"fragment": fragment, "view": self})
+        return set_validator_headers(response, etag, last_modified)
+
+    async def aget_similar_restaurants(self, restaurant):
+        return [similar async for similar in self.get_similar_restaurants(restaurant)]
+
+
+class AsyncReviewDetailView(ReviewDetailView):
+    """
+    Async version of ReviewDetailView, served when the project runs under ASGI.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        review, user = await asyncio.gather(self.get_queryset().filter(pk=kwargs["pk"]).afirst(), get_user(request))
+        if review is None:
+            raise Http404("No review found matching the query")
+        response, etag, last_modified = not_modified_response(request, self.get_validators(review), user.pk)
+        if response is None:
+            context = {
+                "object": review,
+                self.context_object_name: review,
+                "restaurant": review.restaurant,
+                "view": self,
+            }
+            response = TemplateResponse(request, self.template_name, context)
+        return set_validator_headers(response, etag, last_modified)
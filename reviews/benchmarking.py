@@ -0,0 +1,27 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import statistics
+
+
+def percentile(sorted_values, fraction):
+    """
+    Returns the value below which the given fraction of the sorted values fall (nearest rank).
+    """
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def latency_summary(latencies):
+    """
+    Returns the mean and p50/p95/p99 of a list of latencies in seconds, in milliseconds.
+    """
+    latencies = sorted(latencies)
+    return {
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
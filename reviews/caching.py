@@ -0,0 +1,207 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from .conditional import not_modified_response, set_validator_headers
+from .metrics import record_cache_lookup
+from .routers import pinned_to_primary, reading_from_replica
+
+CATALOG_VERSION = "catalog"
+RESTAURANT_LIST_VERSION = "restaurant-list"
+# Only moves when restaurants are added, renamed, hidden or deleted, not on review writes.
+RESTAURANT_NAMES_VERSION = "restaurant-names"
+
+
+def restaurant_version(restaurant_id):
+    """
+    Returns the name of the version counter for one restaurant's pages.
+    """
+    return f"restaurant:{restaurant_id}"
+
+
+def _version_key(name):
+    return f"reviews:version:{name}"
+
+
+def _fresh_version():
+    # A missing counter (never set or evicted) restarts from the clock, so it can never
+    # reuse a number that older cached fragments were stored under.
+    return time.time_ns() // 1000
+
+
+def get_versions(*names):
+    """
+    Returns the current value of each named version counter, creating missing ones.
+    """
+    keys = [_version_key(name) for name in names]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_version(), timeout=None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+async def aget_versions(*names):
+    """
+    Async version of get_versions().
+    """
+    keys = [_version_key(name) for name in names]
+    found = await cache.aget_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            await cache.aadd(key, _fresh_version(), timeout=None)
+            found[key] = await cache.aget(key)
+        versions.append(found[key])
+    return versions
+
+
+def _written_key(name):
+    return f"reviews:written:{name}"
+
+
+def bump_versions(*names):
+    """
+    Increment the named version counters, invalidating every fragment cached under them.
+
+    With replicas configured, the counters are also marked as written for REPLICA_PIN_SECONDS (kept
+    above the replication lag), so fragments rendered from a replica meanwhile are not stored under them.
+    """
+    for name in names:
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), timeout=None)
+    if settings.DATABASE_REPLICAS:
+        cache.set_many({_written_key(name): True for name in names}, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def invalidate(*names):
+    """
+    Bump the counters now and again once the surrounding transaction commits.
+
+    The second bump covers a reader that re-caches the old data between the first bump and the commit.
+    """
+    bump_versions(*names)
+    transaction.on_commit(lambda: bump_versions(*names))
+
+
+def invalidate_restaurants(restaurant_ids):
+    """
+    Invalidate the cached pages of the given restaurants and the restaurant list.
+    """
+    invalidate(RESTAURANT_LIST_VERSION, *(restaurant_version(pk) for pk in restaurant_ids))
+
+
+def invalidate_all():
+    """
+    Invalidate every cached page, for example after a bulk import.
+    """
+    invalidate(CATALOG_VERSION)
+
+
+def fragment_cache_key(name, versions, request):
+    """
+    Returns the cache key of a rendered fragment for the given versions and request query string.
+    """
+    query = hashlib.md5(request.GET.urlencode().encode(), usedforsecurity=False).hexdigest()
+    # v2: entries are (fragment, validators) pairs.
+    return f"reviews:fragment:v2:{name}:{':'.join(str(version) for version in versions)}:{query}"
+
+
+def fragment_cache_enabled(request):
+    """
+    Returns False for clients pinned to the primary after a write: they must see their own writes, and
+    the shared fragments may have been rendered from a replica that has not caught up yet.
+    """
+    return not pinned_to_primary(request)
+
+
+def replica_may_lag(names):
+    """
+    Returns True when reads go to a replica and one of the named version counters was bumped recently,
+    so a fragment rendered now may predate that write and must not be stored under the current version.
+    """
+    return reading_from_replica() and bool(cache.get_many([_written_key(name) for name in names]))
+
+
+async def areplica_may_lag(names):
+    """
+    Async version of replica_may_lag().
+    """
+    return reading_from_replica() and bool(await cache.aget_many([_written_key(name) for name in names]))
+
+
+class VersionedFragmentCacheMixin:
+    """
+    Cache the user-independent part of a page under version counters bumped on every write.
+
+    The fragment template is rendered to HTML and stored in the cache; the page template receives it as
+    ``fragment`` and renders everything user-specific (the nav bar, forms with CSRF tokens) around it.
+    On a hit the view skips get_object() and get_queryset(), so the page renders without touching the
+    database beyond the session and user lookups. Pages with conditional GET validators store them with
+    the fragment, so a hit also answers If-None-Match / If-Modified-Since without a query.
+
+    Clients pinned to the primary bypass the cache, and a fragment rendered from a replica is not stored
+    while the replica may still be missing a write that bumped one of its versions.
+    """
+
+    fragment_template_name = None
+
+    def get_fragment_versions(self):
+        """
+        Returns the names of the version counters the fragment depends on.
+        """
+        return [CATALOG_VERSION]
+
+    def get_fragment_cache_key(self):
+        versions = get_versions(*self.get_fragment_versions())
+        return fragment_cache_key(self.fragment_template_name, versions, self.request)
+
+    def get_fragment_validators(self, context):
+        """
+        Returns the page's conditional GET validators (see reviews.conditional), or None if it has none.
+        """
+        return None
+
+    def get(self, request, *args, **kwargs):
+        if not fragment_cache_enabled(request):
+            self.fragment_key = None
+            return super().get(request, *args, **kwargs)
+        self.fragment_key = self.get_fragment_cache_key()
+        cached = cache.get(self.fragment_key)
+        record_cache_lookup(self.fragment_template_name, cached is not None)
+        if cached is None:
+            return super().get(request, *args, **kwargs)
+        fragment, validators = cached
+        if validators is None:
+            return self.fragment_response(fragment)
+        response, etag, last_modified = not_modified_response(request, validators, request.user.pk)
+        return set_validator_headers(response or self.fragment_response(fragment), etag, last_modified)
+
+    def fragment_response(self, fragment):
+        return self.response_class(
+            request=self.request,
+            template=[self.template_name],
+            context={"fragment": fragment, "view": self},
+            using=self.template_engine,
+        )
+
+    def render_to_response(self, context, **response_kwargs):
+        fragment = render_to_string(self.fragment_template_name, context, self.request)
+        if self.fragment_key is not None and not replica_may_lag(self.get_fragment_versions()):
+            cache.set(self.fragment_key, (fragment, self.get_fragment_validators(context)), settings.PAGE_CACHE_TIMEOUT)
+        context["fragment"] = fragment
+        return super().render_to_response(context, **response_kwargs)
@@ -0,0 +1,72 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import hashlib
+from calendar import timegm
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def page_etag(validators, user_pk, query_string):
+    """
+    Returns the quoted ETag of a page. The page shows the logged-in user's name and may be paginated,
+    so both are part of the tag.
+    """
+    parts = [*validators, user_pk, query_string]
+    return quote_etag(hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest())
+
+
+def not_modified_response(request, validators, user_pk):
+    """
+    Returns (response, etag, last_modified): a 304 response when the request's conditional headers
+    match, else None, plus the header values to set on a full response.
+    """
+    etag = page_etag(validators, user_pk, request.GET.urlencode())
+    last_modified = timegm(validators[0].utctimetuple())
+    return get_conditional_response(request, etag=etag, last_modified=last_modified), etag, last_modified
+
+
+def set_validator_headers(response, etag, last_modified):
+    response.headers.setdefault("ETag", etag)
+    response.headers.setdefault("Last-Modified", http_date(last_modified))
+    return response
+
+
+class ConditionalPageMixin:
+    """
+    Answer GET requests with ETag/Last-Modified headers and 304 Not Modified responses.
+
+    The page object is fetched with one primary-key lookup before anything else runs. When the
+    client's If-None-Match / If-Modified-Since match, the view returns 304 without fetching reviews
+    or rendering a template; otherwise get_object() reuses the row that was already loaded.
+    """
+
+    def get_validators(self, obj):
+        """
+        Returns a tuple describing the page's content. Its first item is the last-modified time.
+        """
+        return (obj.updated,)
+
+    def get_conditional_object(self):
+        """
+        Returns the page object, or None if it does not exist (the view then raises 404 as usual).
+        """
+        return self.get_queryset().filter(pk=self.kwargs[self.pk_url_kwarg]).first()
+
+    def get(self, request, *args, **kwargs):
+        self.conditional_object = self.get_conditional_object()
+        if self.conditional_object is None:
+            return super().get(request, *args, **kwargs)
+        validators = self.get_validators(self.conditional_object)
+        response, etag, last_modified = not_modified_response(request, validators, request.user.pk)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return set_validator_headers(response, etag, last_modified)
+
+    def get_object(self, queryset=None):
+        if queryset is None and getattr(self, "conditional_object", None) is not None:
+            return self.conditional_object
+        return super().get_object(queryset)
@@ -0,0 +1,97 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+from django.conf import settings
+
+# PRAGMAs reported by the db_profile command, with the numbers SQLite reports for named values.
+SQLITE_PRAGMAS = ["journal_mode", "synchronous", "mmap_size", "cache_size", "busy_timeout", "temp_store"]
+SQLITE_PRAGMA_VALUES = {
+    "synchronous": {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3},
+    "temp_store": {"DEFAULT": 0, "FILE": 1, "MEMORY": 2},
+}
+
+
+def get_profile():
+    """
+    Returns the database performance profile selected by settings.DATABASE_PROFILE.
+    """
+    return settings.DATABASE_PROFILES[settings.DATABASE_PROFILE]
+
+
+def expected_pragma(name, value):
+    """
+    Returns a profile PRAGMA value the way SQLite reports it back.
+    """
+    if isinstance(value, str):
+        return SQLITE_PRAGMA_VALUES.get(name, {}).get(value.upper(), value.lower())
+    return value
+
+
+def tune_connection(sender, connection, **kwargs):
+    """
+    connection_created handler applying the profile's per-connection settings, and the SQLite journal
+    mode when the profile opts into changing the database file's.
+
+    Statements go through the raw DB-API connection, so they are not counted as the request's queries.
+    """
+    profile = get_profile()
+    cursor = connection.connection.cursor()
+    try:
+        if connection.vendor == "sqlite":
+            for name, value in profile["SQLITE_PRAGMAS"].items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+            if profile["SQLITE_JOURNAL_MODE"]:
+                cursor.execute(f"PRAGMA journal_mode = {profile['SQLITE_JOURNAL_MODE']}")
+        elif connection.vendor == "postgresql" and profile["STATEMENT_TIMEOUT_MS"] is not None:
+            cursor.execute("SET statement_timeout = %s", [profile["STATEMENT_TIMEOUT_MS"]])
+    finally:
+        cursor.close()
+
+
+def connection_report(connection):
+    """
+    Returns [(setting, expected, actual)] describing the settings in effect on a connection.
+
+    expected is None for settings the profile leaves at the engine's default; actual is None for
+    settings that do not apply to the database.
+    """
+    profile = get_profile()
+    settings_dict = connection.settings_dict
+    report = [
+        ("CONN_MAX_AGE", profile["CONN_MAX_AGE"], settings_dict["CONN_MAX_AGE"]),
+        ("CONN_HEALTH_CHECKS", profile["CONN_HEALTH_CHECKS"], settings_dict["CONN_HEALTH_CHECKS"]),
+    ]
+    connection.ensure_connection()
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            report.append(
+                (
+                    "transaction_mode",
+                    profile["SQLITE_TRANSACTION_MODE"],
+                    settings_dict.get("OPTIONS", {}).get("transaction_mode"),
+                )
+            )
+            for name in SQLITE_PRAGMAS:
+                cursor.execute(f"PRAGMA {name}")
+                # In-memory databases report nothing for file-only PRAGMAs such as mmap_size.
+                row = cursor.fetchone()
+                actual = row[0] if row else None
+                if name == "journal_mode":
+                    expected = profile["SQLITE_JOURNAL_MODE"]
+                else:
+                    expected = profile["SQLITE_PRAGMAS"].get(name)
+                report.append((name, None if expected is None else expected_pragma(name, expected), actual))
+        elif connection.vendor == "postgresql":
+            report.append(
+                (
+                    "DISABLE_SERVER_SIDE_CURSORS",
+                    False,
+                    settings_dict.get("DISABLE_SERVER_SIDE_CURSORS", False),
+                )
+            )
+            cursor.execute("SELECT setting FROM pg_settings WHERE name = 'statement_timeout'")
+            report.append(("statement_timeout", profile["STATEMENT_TIMEOUT_MS"], int(cursor.fetchone()[0])))
+    return report
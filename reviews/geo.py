@@ -0,0 +1,141 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import heapq
+import math
+from operator import itemgetter
+from django.conf import settings
+from django.db.models import Q
+
+# Geohash: the point's cell in a grid that halves in longitude and latitude alternately, five bits per
+# base32 character. Cells sharing a prefix are nested, so every point inside a cell has a geohash in the
+# index range [cell, cell + "~"), and nearby points are found with a few range scans of one index.
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 9
+# Sorts after every base32 character.
+RANGE_END = "~"
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """
+    Returns the geohash of a point with the given number of characters.
+    """
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """
+    Returns the (latitude, longitude) size in degrees of the cells of a geohash precision.
+    """
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """
+    Returns the great-circle distance between two points in kilometres.
+    """
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _steps(start, stop, step):
+    value = start
+    while value < stop:
+        yield value
+        value += step
+    yield stop
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Returns the geohash cells covering the bounding box of a circle.
+
+    The precision is the finest whose cells are at least as large as the radius, so the box spans at
+    most three cells each way and the search reads a handful of index ranges whatever the radius.
+    """
+    lat_delta = min(radius_km / KM_PER_DEGREE, 180.0)
+    cos_lat = math.cos(math.radians(min(abs(latitude) + lat_delta, 90.0)))
+    lng_delta = 180.0 if cos_lat < 1e-9 else min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    precision = 1
+    for candidate in range(PRECISION, 0, -1):
+        cell_lat, cell_lng = cell_size(candidate)
+        if cell_lat >= lat_delta and cell_lng >= lng_delta:
+            precision = candidate
+            break
+    cell_lat, cell_lng = cell_size(precision)
+    south, north = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+    west, east = longitude - lng_delta, longitude + lng_delta
+    cells = set()
+    for lat in _steps(south, north, cell_lat):
+        for lng in _steps(west, east, cell_lng):
+            # Wrap across the antimeridian.
+            cells.add(encode(lat, (lng + 180) % 360 - 180, precision))
+    return sorted(cells)
+
+
+def cells_filter(latitude, longitude, radius_km, field="geohash"):
+    """
+    Returns a Q matching the rows whose geohash lies in the cells covering the circle.
+    """
+    query = Q()
+    for cell in covering_cells(latitude, longitude, radius_km):
+        query |= Q(**{f"{field}__gte": cell, f"{field}__lt": cell + RANGE_END})
+    return query
+
+
+def nearest(items, latitude, longitude, radius_km, limit, position):
+    """
+    Returns [(distance_km, item)] for the items within radius_km of the point, nearest first, at most
+    limit of them. position(item) returns an item's (latitude, longitude).
+    """
+    found = []
+    for item in items:
+        distance = haversine_km(latitude, longitude, *position(item))
+        if distance <= radius_km:
+            found.append((distance, item))
+    return heapq.nsmallest(limit, found, key=itemgetter(0))
+
+
+def parse_near(near, radius=None):
+    """
+    Returns (latitude, longitude, radius_km) from "lat,lng" and an optional radius in km.
+
+    Raises ValueError for malformed or out of range values. The radius defaults to
+    settings.NEAR_DEFAULT_RADIUS_KM and may not exceed settings.NEAR_MAX_RADIUS_KM.
+    """
+    parts = near.split(",")
+    if len(parts) != 2:
+        raise ValueError("near must be latitude,longitude.")
+    latitude, longitude = float(parts[0]), float(parts[1])
+    radius_km = float(radius) if radius else settings.NEAR_DEFAULT_RADIUS_KM
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("near is outside the valid latitude and longitude ranges.")
+    if not 0 < radius_km <= settings.NEAR_MAX_RADIUS_KM:
+        raise ValueError(f"radius must be more than 0 and at most {settings.NEAR_MAX_RADIUS_KM} km.")
+    return latitude, longitude, radius_km
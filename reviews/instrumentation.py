@@ -0,0 +1,175 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import cProfile
+import glob
+import logging
+import os
+import random
+import re
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from .metrics import record_request
+from .querybudget import QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIX = ".prof"
+_UNSAFE_FILENAME = re.compile(r"[^\w.-]")
+
+# The timings of the request being handled on this thread, if it is instrumented.
+_current = ContextVar("reviews_request_timings", default=None)
+
+
+class RequestTimings:
+    """
+    Where one request's time went: database statements, template rendering and the rest (view code).
+    """
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.started = time.perf_counter()
+        self.template = 0.0
+
+    def server_timing(self):
+        """
+        Returns the Server-Timing header value, durations in milliseconds.
+
+        Queries run while a template renders (lazy querysets) count as database time, not template time,
+        so db + template + view adds up to the total. Template time is the rendering of the view's
+        TemplateResponse; templates the view renders itself count as view time.
+        """
+        total = time.perf_counter() - self.started
+        db = self.recorder.duration
+        view = max(total - db - self.template, 0.0)
+        return ", ".join(
+            [
+                f'db;dur={db * 1000:.1f};desc="{self.recorder.count} queries"',
+                f"template;dur={self.template * 1000:.1f}",
+                f"view;dur={view * 1000:.1f}",
+                f"total;dur={total * 1000:.1f}",
+            ]
+        )
+
+
+def time_template_response(timings, response):
+    """
+    Add the rendering of a TemplateResponse, which runs after its view returned, to the template time.
+    """
+    started, db_started = time.perf_counter(), timings.recorder.duration
+
+    def rendered(response):
+        timings.template += time.perf_counter() - started - (timings.recorder.duration - db_started)
+
+    response.add_post_render_callback(rendered)
+
+
+def profile_path(url_name):
+    """
+    Returns a new file path in settings.PROFILE_DIR for a profile of a request to the URL name.
+    """
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    name = _UNSAFE_FILENAME.sub("_", url_name or "unresolved")
+    return os.path.join(settings.PROFILE_DIR, f"{time.time_ns()}-{os.getpid()}-{name}{PROFILE_SUFFIX}")
+
+
+def prune_profiles():
+    """
+    Delete the oldest profiles in settings.PROFILE_DIR beyond the newest settings.PROFILE_MAX_FILES.
+    """
+    # The names start with the capture time in nanoseconds, so they sort oldest first.
+    paths = sorted(glob.glob(os.path.join(settings.PROFILE_DIR, f"*{PROFILE_SUFFIX}")))
+    for path in paths[: max(len(paths) - settings.PROFILE_MAX_FILES, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Another worker pruned it first.
+            pass
+
+
+class InstrumentationMiddleware:
+    """
+    Add a Server-Timing header to responses, record their metrics (reviews.metrics), and capture
+    cProfile profiles of chosen requests.
+
+    The header breaks the request down into database time with its query count, template rendering and
+    the remaining view and middleware time, so browser developer tools show where a slow page spent it.
+    It is sent, and the database statements recorded, only with settings.SERVER_TIMING_ENABLED. A request is
+    profiled when it is sampled (settings.PROFILE_SAMPLE_RATE), its URL name is in
+    settings.PROFILE_URL_NAMES, or a staff user asked with ?profile; its profile is written to
+    settings.PROFILE_DIR for `manage.py profile_summary`, which keeps the newest settings.PROFILE_MAX_FILES.
+
+    Under ASGI only request counts and latencies are recorded, as reviews.querybudget does not count
+    there either: the async ORM runs queries on threads the recorder does not see, and cProfile only
+    follows one thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Statements are only recorded, for the header and the database metrics, with SERVER_TIMING_ENABLED.
+        recorder = QueryRecorder() if settings.SERVER_TIMING_ENABLED else None
+        with recorder or nullcontext():
+            timings = RequestTimings(recorder)
+            token = _current.set(timings)
+            try:
+                response = self.get_response(request)
+            finally:
+                _current.reset(token)
+                profiler = getattr(request, "_profiler", None)
+                if profiler is not None:
+                    profiler.disable()
+        if profiler is not None:
+            path = profile_path(request.resolver_match.view_name if request.resolver_match else None)
+            profiler.dump_stats(path)
+            prune_profiles()
+            logger.info("Profiled %s to %s", request.path, path)
+            response["X-Profile"] = os.path.basename(path)
+        if recorder is not None:
+            response["Server-Timing"] = timings.server_timing()
+        record_request(request, response, time.perf_counter() - timings.started, recorder)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        record_request(request, response, time.perf_counter() - started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """
+        Start profiling here, once the URL is resolved and the user authenticated, if the request is chosen.
+        """
+        if _current.get() is not None and self.should_profile(request):
+            request._profiler = cProfile.Profile()
+            request._profiler.enable()
+
+    def process_template_response(self, request, response):
+        """
+        Time the rendering of the response; this middleware comes first, so this runs just before it.
+        """
+        timings = _current.get()
+        if timings is not None and timings.recorder is not None:
+            time_template_response(timings, response)
+        return response
+
+    def should_profile(self, request):
+        if settings.PROFILE_STAFF_FLAG and "profile" in request.GET and request.user.is_staff:
+            return True
+        if request.resolver_match.view_name in settings.PROFILE_URL_NAMES:
+            return True
+        return random.random() < settings.PROFILE_SAMPLE_RATE
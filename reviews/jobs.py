@@ -0,0 +1,201 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import logging
+import traceback
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .caching import RESTAURANT_LIST_VERSION, invalidate, invalidate_restaurants
+from django.contrib.auth.models import User
+from .models import (
+    DAILY_RATING_JOB,
+    DELETE_RESTAURANT_JOB,
+    DELETE_USER_JOB,
+    RANKING_JOB,
+    SIMILARITY_JOB,
+    DailyRating,
+    Job,
+    Restaurant,
+    RestaurantRanking,
+    Review,
+    SimilarRestaurant,
+)
+
+logger = logging.getLogger(__name__)
+
+# Job name -> handler(keys, using). A handler receives the keys of a batch of claimed jobs with the same name.
+HANDLERS = {}
+
+
+def handler(name):
+    """
+    Register the decorated function as the handler of the named jobs.
+    """
+
+    def register(function):
+        HANDLERS[name] = function
+        return function
+
+    return register
+
+
+@handler(RANKING_JOB)
+def recompute_rankings(keys, using):
+    """
+    Recompute the rankings of the restaurants whose reviews changed.
+    """
+    RestaurantRanking.objects.using(using).recompute([int(key) for key in keys])
+    invalidate(RESTAURANT_LIST_VERSION)
+
+
+@handler(DAILY_RATING_JOB)
+def recompute_daily_ratings(keys, using):
+    """
+    Recompute the daily rollups of the "restaurant_id:YYYY-MM-DD" keys.
+    """
+    days = set()
+    for key in keys:
+        restaurant_id, day = key.split(":")
+        days.add((int(restaurant_id), date.fromisoformat(day)))
+    DailyRating.objects.using(using).refresh_days(days)
+    # The statistics pages answer conditional requests from the restaurant's updated time.
+    restaurant_ids = {restaurant_id for restaurant_id, _ in days}
+    Restaurant.objects.using(using).filter(pk__in=restaurant_ids).update(updated=timezone.now())
+    invalidate_restaurants(restaurant_ids)
+
+
+@handler(SIMILARITY_JOB)
+def recompute_similar_restaurants(keys, using):
+    """
+    Recompute the similar restaurants of the restaurants whose reviews changed.
+    """
+    restaurant_ids = {int(key) for key in keys}
+    SimilarRestaurant.objects.using(using).recompute(restaurant_ids)
+    Restaurant.objects.using(using).filter(pk__in=restaurant_ids).update(updated=timezone.now())
+    invalidate_restaurants(restaurant_ids)
+
+
+@handler(DELETE_RESTAURANT_JOB)
+def delete_restaurants(keys, using):
+    """
+    Delete restaurants with their reviews; see delete_owners().
+    """
+    delete_owners(Restaurant, "restaurant", DELETE_RESTAURANT_JOB, keys, using)
+
+
+@handler(DELETE_USER_JOB)
+def delete_users(keys, using):
+    """
+    Delete users with their reviews; see delete_owners().
+    """
+    delete_owners(User, "user", DELETE_USER_JOB, keys, using)
+
+
+def delete_owners(model, field, name, keys, using):
+    """
+    Delete at most settings.REVIEW_DELETE_BATCH_SIZE reviews of the objects with the given keys, then
+    delete the objects left without reviews and queue the others again.
+
+    Each run is one short transaction, so a restaurant with a million reviews is deleted over many
+    runs without ever blocking review submissions for long, and the final cascade finds no reviews.
+    """
+    budget = settings.REVIEW_DELETE_BATCH_SIZE
+    remaining = []
+    for key in keys:
+        if budget:
+            reviews = Review.objects.using(using).filter(**{f"{field}_id": int(key)})
+            deleted = reviews.delete_batch(budget)
+            budget -= deleted
+            logger.info("Deleted %d reviews of %s %s", deleted, model._meta.verbose_name, key)
+            if budget:
+                model._default_manager.using(using).filter(pk=int(key)).delete()
+                continue
+        remaining.append(key)
+    Job.objects.using(using).enqueue((name, key) for key in remaining)
+
+
+def claim(batch_size, using="default"):
+    """
+    Claim up to batch_size due jobs sharing the name of the oldest due job.
+
+    Returns the claimed jobs, or an empty list when nothing is due. Claimed jobs are marked running, so
+    other workers skip them (on PostgreSQL without waiting, thanks to SKIP LOCKED).
+    """
+    now = timezone.now()
+    with transaction.atomic(using=using):
+        due = Job.objects.using(using).due(now).order_by("run_at", "id")
+        oldest = due.values_list("name", flat=True).first()
+        if oldest is None:
+            return []
+        jobs = list(due.filter(name=oldest).select_for_update(skip_locked=True)[:batch_size])
+        Job.objects.using(using).filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.RUNNING, locked_at=now, attempts=F("attempts") + 1
+        )
+    return jobs
+
+
+def retry_delay(attempts):
+    """
+    Returns how long to wait before retrying a job that failed for the given number of times.
+    """
+    return timedelta(seconds=settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1))
+
+
+def fail(jobs, error, using="default"):
+    """
+    Schedule failed jobs for a retry with exponential backoff, or mark them failed after
+    settings.JOB_MAX_ATTEMPTS attempts.
+    """
+    now = timezone.now()
+    for job in jobs:
+        attempts = job.attempts + 1
+        if attempts >= settings.JOB_MAX_ATTEMPTS:
+            Job.objects.using(using).filter(pk=job.pk).update(status=Job.FAILED, last_error=error, locked_at=None)
+            logger.error("Job %s failed %d times, giving up", job, attempts)
+            continue
+        try:
+            with transaction.atomic(using=using):
+                Job.objects.using(using).filter(pk=job.pk).update(
+                    status=Job.PENDING, run_at=now + retry_delay(attempts), last_error=error, locked_at=None
+                )
+        except IntegrityError:
+            # The same job was queued again while this one ran; the waiting one redoes the work.
+            Job.objects.using(using).filter(pk=job.pk).delete()
+
+
+def run_batch(batch_size=None, using="default"):
+    """
+    Claim and run one batch of jobs. Returns the number of jobs run, successfully or not.
+    """
+    jobs = claim(batch_size or settings.JOB_BATCH_SIZE, using)
+    if not jobs:
+        return 0
+    name = jobs[0].name
+    try:
+        if name not in HANDLERS:
+            raise LookupError(f"No handler registered for {name!r} jobs")
+        with transaction.atomic(using=using):
+            HANDLERS[name]([job.key for job in jobs], using)
+    except Exception:
+        logger.exception("%d %s jobs failed", len(jobs), name)
+        fail(jobs, traceback.format_exc(), using)
+    else:
+        Job.objects.using(using).filter(pk__in=[job.pk for job in jobs]).delete()
+        logger.debug("Ran %d %s jobs", len(jobs), name)
+    return len(jobs)
+
+
+def run_pending(batch_size=None, using="default"):
+    """
+    Run batches until no job is due. Returns the number of jobs run.
+    """
+    total = 0
+    while ran := run_batch(batch_size, using):
+        total += ran
+    return total
@@ -0,0 +1,35 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from reviews.caching import invalidate_all, invalidate_restaurants
+from reviews.models import DailyRating
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the daily rating rollups from the review history.
+    """
+
+    help = (
+        "Recompute the per-restaurant daily rating rollups from the review table, for example after a bulk "
+        "import that bypassed the incremental updates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("restaurant_ids", nargs="*", type=int, help="Only rebuild these restaurants.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Restaurants processed per transaction.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        restaurant_ids = options["restaurant_ids"] or None
+        written = DailyRating.objects.rebuild(restaurant_ids, batch_size=options["batch_size"])
+        if restaurant_ids:
+            invalidate_restaurants(restaurant_ids)
+        else:
+            invalidate_all()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily rollups in {time.perf_counter() - started:.1f}s."))
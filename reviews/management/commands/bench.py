@@ -0,0 +1,209 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import json
+import platform
+import statistics
+import subprocess
+import time
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from accounts import urls as accounts_urls
+from reviews import urls as reviews_urls
+from reviews.benchmarking import latency_summary
+from reviews.models import Restaurant, Review
+from reviews.querybudget import QueryRecorder
+
+# How each named route is requested: the URL arguments (filled from the dataset), query string, method,
+# who is logged in ("user" is any user, "author" the author of the review) and the expected status.
+# Streaming exports read every row, so they are run fewer times.
+ROUTES = {
+    "home": {},
+    "restaurant_detail": {"args": ["restaurant"]},
+    "restaurant_stats": {"args": ["restaurant"]},
+    "add_review": {"args": ["restaurant"], "login": "user"},
+    "review_detail": {"args": ["review"]},
+    "update_review": {"args": ["review"], "login": "author"},
+    "delete_review": {"args": ["review"], "login": "author"},
+    "search": {"query": {"q": "great food"}},
+    "user_reviews": {"args": ["user"]},
+    "metrics": {},
+    "api_restaurants": {},
+    "api_restaurants_export": {"max_iterations": 5},
+    "api_restaurant_typeahead": {"query": {"q": "gold"}},
+    "api_restaurant": {"args": ["restaurant"]},
+    "api_restaurant_reviews": {"args": ["restaurant"]},
+    "api_restaurant_reviews_export": {"args": ["restaurant"], "max_iterations": 5},
+    "accounts:login": {},
+    "accounts:logout": {"method": "post", "login": "user", "relogin": True, "status": 302},
+    "accounts:signup": {},
+}
+
+
+def route_names():
+    """
+    Returns the names of every named route in reviews/urls.py and accounts/urls.py.
+    """
+    names = [pattern.name for pattern in reviews_urls.urlpatterns if pattern.name]
+    names += [f"{accounts_urls.app_name}:{pattern.name}" for pattern in accounts_urls.urlpatterns if pattern.name]
+    return names
+
+
+def git_revision():
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+class Command(BaseCommand):
+    """
+    Benchmark every named route in-process and write the results as JSON for comparison between commits.
+    """
+
+    help = (
+        "Request every named route of the reviews and accounts apps through the test client and record "
+        "p50/p95/p99 latency, query counts and response size. Use --compare to fail on regressions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50, help="Timed requests per route.")
+        parser.add_argument("--warmup", type=int, default=3, help="Untimed requests per route first.")
+        parser.add_argument("--route", action="append", dest="routes", help="Only benchmark this route.")
+        parser.add_argument("--cold", action="store_true", help="Clear the cache before every request.")
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument("--compare", help="Compare with results from an earlier run.")
+        parser.add_argument(
+            "--threshold", type=float, default=0.25, help="Allowed p95 slowdown when comparing (0.25 = 25%%)."
+        )
+
+    def handle(self, *args, **options):
+        names = route_names()
+        missing = [name for name in names if name not in ROUTES]
+        if missing:
+            raise CommandError(f"No benchmark spec for {', '.join(missing)}; add them to ROUTES.")
+        if options["routes"]:
+            unknown = set(options["routes"]) - set(names)
+            if unknown:
+                raise CommandError(f"Unknown route(s): {', '.join(sorted(unknown))}")
+            names = [name for name in names if name in options["routes"]]
+
+        self.options = options
+        self.fixtures = self.load_fixtures()
+        results = {"meta": self.metadata(), "routes": {}}
+        # The metrics endpoint is served as to a scraper, without the token check in the way.
+        overrides = {
+            "ALLOWED_HOSTS": [*settings.ALLOWED_HOSTS, "testserver"],
+            "QUERY_BUDGET_ENABLED": False,
+            "METRICS_PUBLIC": True,
+        }
+        with override_settings(**overrides):
+            for name in names:
+                results["routes"][name] = self.bench_route(name, ROUTES[name])
+                self.report(name, results["routes"][name])
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        if options["compare"]:
+            self.compare(results)
+
+    def load_fixtures(self):
+        """
+        Returns the objects whose ids fill the URL arguments: the most reviewed restaurant and its newest review.
+        """
+        restaurant = Restaurant.objects.order_by("-review_count", "id").first()
+        review = restaurant and restaurant.reviews.select_related("user").first()
+        if review is None:
+            raise CommandError("The database has no reviews; run seed_bench first.")
+        return {"restaurant": restaurant, "review": review, "user": review.user}
+
+    def metadata(self):
+        return {
+            "revision": git_revision(),
+            "timestamp": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "restaurants": Restaurant.objects.count(),
+            "reviews": Review.objects.count(),
+            "users": User.objects.count(),
+            "iterations": self.options["iterations"],
+            "cold_cache": self.options["cold"],
+        }
+
+    def bench_route(self, name, spec):
+        client = Client()
+        if spec.get("login"):
+            client.force_login(self.fixtures["user"])
+        url = reverse(name, args=[self.fixtures[kind].pk for kind in spec.get("args", [])])
+        method = getattr(client, spec.get("method", "get"))
+        iterations = min(self.options["iterations"], spec.get("max_iterations", self.options["iterations"]))
+
+        latencies, query_counts, sizes = [], [], []
+        for iteration in range(self.options["warmup"] + iterations):
+            if self.options["cold"]:
+                cache.clear()
+            if spec.get("relogin"):
+                client.force_login(self.fixtures["user"])
+            with QueryRecorder() as recorder:
+                start = time.perf_counter()
+                response = method(url, spec.get("query", {}))
+                # Streaming responses are rendered while they are read, so reading is part of the request.
+                content = b"".join(response.streaming_content) if response.streaming else response.content
+                elapsed = time.perf_counter() - start
+            if response.status_code != spec.get("status", 200):
+                raise CommandError(f"{name} ({url}) returned {response.status_code}")
+            if iteration >= self.options["warmup"]:
+                latencies.append(elapsed)
+                query_counts.append(recorder.count)
+                sizes.append(len(content))
+        return {
+            "url": url,
+            "iterations": iterations,
+            **latency_summary(latencies),
+            "queries": round(statistics.median(query_counts)),
+            "max_queries": max(query_counts),
+            "bytes": round(statistics.median(sizes)),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:32} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+            f"p99 {result['p99_ms']:8.2f} ms  {result['queries']:3} queries  {result['bytes']:>9} bytes"
+        )
+
+    def compare(self, results):
+        """
+        Report routes that got slower (p95 beyond the threshold) or run more queries than the baseline.
+        """
+        try:
+            with open(self.options["compare"]) as baseline_file:
+                baseline = json.load(baseline_file)["routes"]
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Cannot read {self.options['compare']}: {exc}")
+        regressions = []
+        for name, result in results["routes"].items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if result["p95_ms"] > before["p95_ms"] * (1 + self.options["threshold"]):
+                regressions.append(f"{name}: p95 {before['p95_ms']:.2f} ms -> {result['p95_ms']:.2f} ms")
+            if result["queries"] > before["queries"]:
+                regressions.append(f"{name}: queries {before['queries']} -> {result['queries']}")
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
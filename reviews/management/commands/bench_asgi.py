@@ -0,0 +1,108 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from reviews.benchmarking import latency_summary
+from reviews.models import Restaurant, Review
+
+
+class Command(BaseCommand):
+    """
+    Compare the WSGI (sync views) and ASGI (async views) request paths under concurrent load.
+    """
+
+    help = (
+        "Benchmark the read pages through Django's WSGI and ASGI handlers in-process: WSGI requests run on a "
+        "thread pool like threaded workers, ASGI requests run as concurrent tasks on one event loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per mode.")
+        parser.add_argument("--concurrency", type=int, default=64, help="Requests in flight at once.")
+        parser.add_argument("--path", action="append", dest="paths", help="URL to request (repeatable).")
+        parser.add_argument("--mode", choices=["wsgi", "asgi", "both"], default="both")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or self.default_paths()
+        overrides = {
+            "ALLOWED_HOSTS": [*settings.ALLOWED_HOSTS, "testserver"],
+            "QUERY_BUDGET_ENABLED": False,
+        }
+        modes = ["wsgi", "asgi"] if options["mode"] == "both" else [options["mode"]]
+        self.stdout.write(f"{options['requests']} requests per mode, concurrency {options['concurrency']}: {paths}")
+        for mode in modes:
+            urlconf = "django_project.urls" if mode == "wsgi" else "django_project.urls_async"
+            with override_settings(ROOT_URLCONF=urlconf, **overrides):
+                run = self.run_wsgi if mode == "wsgi" else self.run_asgi
+                elapsed, latencies = run(paths, options["requests"], options["concurrency"])
+            self.report(mode, elapsed, latencies)
+
+    def default_paths(self):
+        restaurant = Restaurant.objects.order_by("-review_count").first()
+        review = Review.objects.order_by("-id").first()
+        if restaurant is None or review is None:
+            raise CommandError("Add some restaurants and reviews first, or pass --path.")
+        return [
+            reverse("home"),
+            reverse("restaurant_detail", args=[restaurant.pk]),
+            reverse("review_detail", args=[review.pk]),
+        ]
+
+    def run_wsgi(self, paths, total, concurrency):
+        local = threading.local()
+
+        def fetch(index):
+            # One client per thread, as each WSGI worker thread has its own handler state.
+            if not hasattr(local, "client"):
+                local.client = Client()
+            client = local.client
+            start = time.perf_counter()
+            response = client.get(paths[index % len(paths)])
+            if response.status_code != 200:
+                raise CommandError(f"{paths[index % len(paths)]} returned {response.status_code}")
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(fetch, range(len(paths))))
+            started = time.perf_counter()
+            latencies = list(pool.map(fetch, range(total)))
+        return time.perf_counter() - started, latencies
+
+    def run_asgi(self, paths, total, concurrency):
+        async def main():
+            client = AsyncClient()
+            limit = asyncio.Semaphore(concurrency)
+
+            async def fetch(index):
+                async with limit:
+                    start = time.perf_counter()
+                    response = await client.get(paths[index % len(paths)])
+                    if response.status_code != 200:
+                        raise CommandError(f"{paths[index % len(paths)]} returned {response.status_code}")
+                    return time.perf_counter() - start
+
+            await asyncio.gather(*(fetch(index) for index in range(len(paths))))
+            started = time.perf_counter()
+            latencies = await asyncio.gather(*(fetch(index) for index in range(total)))
+            return time.perf_counter() - started, latencies
+
+        return asyncio.run(main())
+
+    def report(self, mode, elapsed, latencies):
+        summary = latency_summary(latencies)
+        self.stdout.write(
+            f"{mode.upper():4}  {len(latencies) / elapsed:8.1f} req/s  "
+            f"mean {summary['mean_ms']:7.1f} ms  p50 {summary['p50_ms']:7.1f} ms  "
+            f"p95 {summary['p95_ms']:7.1f} ms  p99 {summary['p99_ms']:7.1f} ms"
+        )
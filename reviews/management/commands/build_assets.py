@@ -0,0 +1,56 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from reviews.assets import purge_css, used_tokens
+
+VENDOR_CSS = Path(settings.BASE_DIR) / "assets" / "vendor" / "bootstrap" / "bootstrap.min.css"
+TEMPLATES_DIR = Path(settings.BASE_DIR) / "templates"
+OUTPUT_DIR = Path(settings.BASE_DIR) / "static" / "css"
+
+# Classes bootstrap.min.js adds at run time (the navbar's collapse toggle), which no template mentions.
+SAFELIST = {"show", "collapsing", "collapsed"}
+
+# Templates whose markup is above the fold on every page; their rules are inlined into base.html.
+CRITICAL_TEMPLATES = ["base.html"]
+
+
+class Command(BaseCommand):
+    """
+    Build the site's stylesheets from the vendored Bootstrap CSS.
+    """
+
+    help = (
+        "Write static/css/site.css (Bootstrap without the rules no template uses) and static/css/critical.css "
+        "(the part base.html needs for first paint, inlined into every page). Rerun it after changing the "
+        "classes a template uses; --check fails if the files are out of date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report whether the built files are current.")
+
+    def handle(self, *args, **options):
+        css = VENDOR_CSS.read_text(encoding="utf-8")
+        templates = sorted(TEMPLATES_DIR.rglob("*.html"))
+        outputs = {
+            "site.css": purge_css(css, used_tokens(templates) | SAFELIST),
+            "critical.css": purge_css(css, used_tokens(TEMPLATES_DIR / name for name in CRITICAL_TEMPLATES)),
+        }
+        stale = []
+        for name, text in outputs.items():
+            path = OUTPUT_DIR / name
+            if path.exists() and path.read_text(encoding="utf-8") == text:
+                continue
+            stale.append(name)
+            if not options["check"]:
+                OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+                path.write_text(text, encoding="utf-8")
+            self.stdout.write(f"{name}: {len(text):,} bytes (vendored CSS: {len(css):,} bytes)")
+        if options["check"] and stale:
+            raise CommandError(f"Out of date: {', '.join(stale)}. Run python manage.py build_assets.")
+        self.stdout.write(self.style.SUCCESS("Assets are up to date." if not stale else "Assets built."))
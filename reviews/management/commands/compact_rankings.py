@@ -0,0 +1,32 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from reviews.models import RestaurantRanking
+
+
+class Command(BaseCommand):
+    """
+    Recompute the restaurant ranking table from scratch.
+    """
+
+    help = (
+        "Recompute the Bayesian prior and every restaurant's ranking. Review writes only recompute their own "
+        "restaurant's ranking, so run it periodically (for example nightly from cron) to follow the site-wide mean."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Restaurants processed per batch.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        ranked, prior_mean = RestaurantRanking.objects.compact(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ranked {ranked} restaurants (prior mean {prior_mean:.3f}) in {time.perf_counter() - started:.1f}s."
+            )
+        )
@@ -0,0 +1,46 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from reviews.caching import invalidate_all, invalidate_restaurants
+from reviews.models import Restaurant, SimilarRestaurant
+
+
+class Command(BaseCommand):
+    """
+    Recompute the similar restaurants shown on the restaurant pages.
+    """
+
+    help = (
+        "Recompute every restaurant's similar restaurants from the review table, or only those of the given "
+        "restaurants. Review writes queue their restaurant's recompute, so run the full rebuild after bulk "
+        "imports and periodically (for example nightly from cron) to follow the other restaurants' changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("restaurant_ids", nargs="*", type=int, help="Only recompute these restaurants.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Restaurants scored per matrix product.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        restaurant_ids = options["restaurant_ids"]
+        if restaurant_ids:
+            stored = SimilarRestaurant.objects.recompute(restaurant_ids)
+            restaurants = Restaurant.objects.filter(pk__in=restaurant_ids)
+        else:
+            stored = SimilarRestaurant.objects.rebuild(batch_size=options["batch_size"])
+            restaurants = Restaurant.objects.all()
+        # The restaurant pages answer conditional requests from the restaurant's updated time.
+        restaurants.update(updated=timezone.now())
+        if restaurant_ids:
+            invalidate_restaurants(restaurant_ids)
+        else:
+            invalidate_all()
+        self.stdout.write(
+            self.style.SUCCESS(f"Stored {stored} similar restaurants in {time.perf_counter() - started:.1f}s.")
+        )
@@ -0,0 +1,39 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from reviews.dbtuning import connection_report
+
+
+class Command(BaseCommand):
+    """
+    Report the database performance profile and the settings actually in effect on each connection.
+    """
+
+    help = "Show the selected DJANGO_DB_PROFILE and the connection settings in effect for each database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", action="append", help="Only report this alias (repeatable).")
+        parser.add_argument("--check", action="store_true", help="Fail if a setting differs from the profile.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Profile: {settings.DATABASE_PROFILE}")
+        mismatches = []
+        for alias in options["database"] or list(connections):
+            connection = connections[alias]
+            self.stdout.write(f"\n{alias} ({connection.vendor}, {connection.settings_dict['NAME']})")
+            for name, expected, actual in connection_report(connection):
+                matches = expected is None or actual is None or str(expected).lower() == str(actual).lower()
+                note = "" if matches else f"   (profile: {expected})"
+                self.stdout.write(f"  {name:28} {'n/a' if actual is None else actual}{note}")
+                if not matches:
+                    mismatches.append(f"{alias}.{name}")
+        if options["check"] and mismatches:
+            raise CommandError(
+                f"Settings differ from the {settings.DATABASE_PROFILE!r} profile: {', '.join(mismatches)}"
+            )
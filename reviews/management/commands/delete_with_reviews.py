@@ -0,0 +1,59 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from reviews.models import Restaurant, Review
+
+
+class Command(BaseCommand):
+    """
+    Delete restaurants or users together with their reviews, in batches.
+    """
+
+    help = (
+        "Delete the given restaurants and users after removing their reviews in short transactions, so "
+        "review submissions keep going meanwhile. Aggregates, rankings, rollups and caches stay consistent; "
+        "run_worker applies the queued ranking and rollup recomputes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurant", type=int, action="append", default=[], help="Restaurant id.")
+        parser.add_argument("--user", action="append", default=[], help="Username.")
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.REVIEW_DELETE_BATCH_SIZE, help="Reviews per transaction."
+        )
+        parser.add_argument(
+            "--pause", type=float, default=settings.REVIEW_DELETE_PAUSE_SECONDS, help="Seconds between batches."
+        )
+        parser.add_argument("--reviews-only", action="store_true", help="Keep the restaurants and users.")
+
+    def handle(self, *args, **options):
+        owners = list(Restaurant.objects.filter(pk__in=options["restaurant"]))
+        owners += User.objects.filter(username__in=options["user"])
+        missing = set(options["restaurant"]) - {owner.pk for owner in owners if isinstance(owner, Restaurant)}
+        missing |= set(options["user"]) - {owner.username for owner in owners if isinstance(owner, User)}
+        if missing:
+            raise CommandError(f"Not found: {', '.join(map(str, sorted(missing, key=str)))}")
+        for owner in owners:
+            self.delete(owner, options)
+
+    def delete(self, owner, options):
+        started = time.perf_counter()
+        if isinstance(owner, Restaurant):
+            label, reviews, total = f"Restaurant {owner}", owner.reviews.all(), owner.review_count
+        else:
+            label, reviews = f"User {owner}", Review.objects.filter(user=owner)
+            total = reviews.count()
+        deleted = 0
+        for deleted in reviews.delete_in_batches(options["batch_size"], options["pause"]):
+            self.stdout.write(f"{label}: {deleted:,} of {total:,} reviews deleted")
+        self.stdout.write(f"{label}: {deleted:,} reviews deleted in {time.perf_counter() - started:.1f}s")
+        if not options["reviews_only"]:
+            owner.delete()
+            self.stdout.write(self.style.SUCCESS(f"{label} deleted."))
@@ -0,0 +1,244 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import csv
+import io
+import json
+import sys
+import time
+from datetime import timezone as dt_timezone
+from contextlib import contextmanager
+from itertools import islice
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from reviews.caching import RESTAURANT_NAMES_VERSION, invalidate, invalidate_all
+from reviews.models import Restaurant, RestaurantRanking, Review
+
+# Resolved user and restaurant ids are cached between batches; a cache is dropped when it grows past
+# this many entries so memory stays bounded on very large imports.
+LOOKUP_CACHE_LIMIT = 200_000
+
+
+class RowError(Exception):
+    """
+    Raised for an input row that cannot be imported.
+    """
+
+
+def parse_rating(value):
+    """
+    Returns a rating given as a JSON integer or a string of digits; raises ValueError for anything else,
+    such as 4.5 or true, rather than truncating it.
+    """
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise ValueError(value)
+
+
+class Command(BaseCommand):
+    """
+    Stream reviews from a JSONL or CSV file into the database with batched bulk inserts.
+    """
+
+    help = (
+        "Import reviews from JSONL or CSV with the fields restaurant, user, rating, body and optionally "
+        "created (ISO 8601). Use '-' to read standard input."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or '-' for standard input.")
+        parser.add_argument("--format", choices=["jsonl", "csv"], help="Input format (default: from the extension).")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows inserted per transaction.")
+        parser.add_argument("--create-users", action="store_true", help="Create unknown users (unusable password).")
+        parser.add_argument("--create-restaurants", action="store_true", help="Create unknown restaurants.")
+        parser.add_argument("--strict", action="store_true", help="Abort on the first invalid row.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.user_ids = {}
+        self.restaurant_ids = {}
+        self.rejected = 0
+        input_format = options["format"] or self.guess_format(options["path"])
+
+        started = time.perf_counter()
+        imported = 0
+        with self.open_input(options["path"]) as stream:
+            rows = self.read_rows(stream, input_format)
+            while batch := list(islice(rows, options["batch_size"])):
+                imported += self.import_batch(batch)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{imported} reviews imported ({imported / elapsed:,.0f}/s)")
+
+        # Review.objects.bulk_create adjusted the restaurant aggregates once per restaurant per batch and
+        # the search index is maintained by its triggers; cached pages are invalidated once at the end.
+        invalidate_all()
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {imported} reviews in {elapsed:.1f}s ({imported / elapsed:,.0f}/s); "
+                f"{self.rejected} row(s) rejected."
+            )
+        )
+
+    @contextmanager
+    def open_input(self, path):
+        if path == "-":
+            yield io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+            return
+        try:
+            stream = open(path, encoding="utf-8", newline="")
+        except OSError as exc:
+            raise CommandError(f"Cannot open {path}: {exc}")
+        with stream:
+            yield stream
+
+    def guess_format(self, path):
+        if path.endswith(".csv"):
+            return "csv"
+        if path.endswith((".jsonl", ".ndjson")):
+            return "jsonl"
+        raise CommandError("Cannot tell the input format from the file name; pass --format.")
+
+    def read_rows(self, stream, input_format):
+        """
+        Yield (line_number, row) pairs one at a time, so memory does not grow with the input size.
+        """
+        if input_format == "csv":
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as exc:
+                self.reject(line_number, f"invalid JSON: {exc}")
+                continue
+            yield line_number, row
+
+    def reject(self, line_number, reason):
+        if self.options["strict"]:
+            raise CommandError(f"Line {line_number}: {reason}")
+        self.rejected += 1
+        if self.rejected <= 20:
+            self.stderr.write(f"Line {line_number}: {reason}")
+
+    def import_batch(self, batch):
+        """
+        Validate a batch, resolve its users and restaurants with one query each and insert it in one transaction.
+        """
+        parsed = []
+        for line_number, row in batch:
+            try:
+                parsed.append((line_number, self.parse_row(row)))
+            except RowError as exc:
+                self.reject(line_number, str(exc))
+        with transaction.atomic():
+            user_ids = self.resolve(
+                self.user_ids, {values["user"] for _, values in parsed}, self.lookup_users, self.create_users
+            )
+            restaurant_ids = self.resolve(
+                self.restaurant_ids,
+                {values["restaurant"] for _, values in parsed},
+                self.lookup_restaurants,
+                self.create_restaurants,
+            )
+            reviews = []
+            for line_number, values in parsed:
+                if values["user"] not in user_ids:
+                    self.reject(line_number, f"unknown user {values['user']!r}")
+                elif values["restaurant"] not in restaurant_ids:
+                    self.reject(line_number, f"unknown restaurant {values['restaurant']!r}")
+                else:
+                    review = Review(
+                        user_id=user_ids[values["user"]],
+                        restaurant_id=restaurant_ids[values["restaurant"]],
+                        rating=values["rating"],
+                        body=values["body"],
+                        created=values["created"],
+                        updated=values["created"],
+                    )
+                    # Inserted with the original times instead of auto_now(_add)'s.
+                    review.keep_timestamps = True
+                    reviews.append(review)
+            Review.objects.bulk_create(reviews)
+        return len(reviews)
+
+    def parse_row(self, row):
+        """
+        Returns the cleaned values of one input row, applying the model's rating validators.
+        """
+        missing = [name for name in ("restaurant", "user", "rating", "body") if not str(row.get(name) or "").strip()]
+        if missing:
+            raise RowError(f"missing {', '.join(missing)}")
+        try:
+            rating = parse_rating(row["rating"])
+            Review._meta.get_field("rating").run_validators(rating)
+        except (TypeError, ValueError, ValidationError):
+            raise RowError(f"invalid rating {row['rating']!r}")
+        created = timezone.now()
+        if row.get("created"):
+            created = parse_datetime(str(row["created"]))
+            if created is None:
+                raise RowError(f"invalid created time {row['created']!r}")
+            if timezone.is_naive(created):
+                created = timezone.make_aware(created, dt_timezone.utc)
+        return {
+            "restaurant": str(row["restaurant"]).strip(),
+            "user": str(row["user"]).strip(),
+            "rating": rating,
+            "body": str(row["body"]),
+            "created": created,
+        }
+
+    def resolve(self, cache, keys, lookup, create):
+        """
+        Returns {key: id} for the keys, looking up uncached ones in one query and creating missing ones if allowed.
+        """
+        if len(cache) > LOOKUP_CACHE_LIMIT:
+            cache.clear()
+        unknown = keys - cache.keys()
+        if unknown:
+            cache.update(lookup(unknown))
+            missing = unknown - cache.keys()
+            if missing:
+                cache.update(create(missing))
+        return {key: cache[key] for key in keys if key in cache}
+
+    def lookup_users(self, usernames):
+        return dict(User.objects.filter(username__in=usernames).values_list("username", "id"))
+
+    def create_users(self, usernames):
+        if not self.options["create_users"]:
+            return {}
+        users = [User(username=username) for username in usernames]
+        for user in users:
+            user.set_unusable_password()
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        return self.lookup_users(usernames)
+
+    def lookup_restaurants(self, names):
+        return dict(Restaurant.objects.filter(name__in=names).order_by("-id").values_list("name", "id"))
+
+    def create_restaurants(self, names):
+        if not self.options["create_restaurants"]:
+            return {}
+        Restaurant.objects.bulk_create([Restaurant(name=name) for name in names])
+        created = self.lookup_restaurants(names)
+        # bulk_create skips the post_save handlers that rank a new restaurant and update the name index.
+        RestaurantRanking.objects.recompute(created.values())
+        invalidate(RESTAURANT_NAMES_VERSION)
+        return created
@@ -0,0 +1,46 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import glob
+import os
+import pstats
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from reviews.instrumentation import PROFILE_SUFFIX
+
+SORT_KEYS = ["cumulative", "tottime", "ncalls"]
+
+
+class Command(BaseCommand):
+    """
+    Summarize the request profiles captured by reviews.instrumentation.
+    """
+
+    help = (
+        "Merge the cProfile profiles in PROFILE_DIR (or --dir) and print the hottest functions across them. "
+        "Profiles are captured for sampled requests, PROFILE_URL_NAMES and staff requests with ?profile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", help="Directory of .prof files (default: settings.PROFILE_DIR).")
+        parser.add_argument("--url-name", help="Only profiles of requests to this URL name.")
+        parser.add_argument("--sort", choices=SORT_KEYS, default="cumulative", help="Order of the functions.")
+        parser.add_argument("--limit", type=int, default=30, help="Functions listed.")
+        parser.add_argument("--clear", action="store_true", help="Delete the summarized profiles afterwards.")
+
+    def handle(self, *args, **options):
+        directory = options["dir"] or settings.PROFILE_DIR
+        # Profile files are named <time>-<pid>-<url name>.prof.
+        url_name = options["url_name"].replace(":", "_") if options["url_name"] else "*"
+        paths = sorted(glob.glob(os.path.join(directory, f"*-*-{url_name}{PROFILE_SUFFIX}")))
+        if not paths:
+            raise CommandError(f"No profiles found in {directory}.")
+        stats = pstats.Stats(*paths, stream=self.stdout)
+        self.stdout.write(f"{len(paths)} profiles, {stats.total_calls} calls in {stats.total_tt:.3f}s\n")
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["limit"])
+        if options["clear"]:
+            for path in paths:
+                os.remove(path)
@@ -0,0 +1,31 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from reviews.models import Restaurant
+
+
+class Command(BaseCommand):
+    """
+    Recompute the stored rating aggregates of every restaurant from the review table.
+    """
+
+    help = "Recompute (or with --check, verify) the denormalized restaurant rating aggregates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Report stale aggregates without fixing them.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Restaurants processed per batch.")
+
+    def handle(self, *args, **options):
+        mismatched = Restaurant.objects.recompute_aggregates(
+            batch_size=options["batch_size"], check_only=options["check"]
+        )
+        if options["check"]:
+            if mismatched:
+                raise CommandError(f"{len(mismatched)} restaurant(s) have stale aggregates: {mismatched[:20]}")
+            self.stdout.write(self.style.SUCCESS("All restaurant aggregates are consistent."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Recomputed aggregates; {len(mismatched)} restaurant(s) fixed."))
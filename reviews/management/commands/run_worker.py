@@ -0,0 +1,60 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from reviews.jobs import run_batch
+from reviews.models import Job
+
+
+class Command(BaseCommand):
+    """
+    Run the queued background jobs.
+    """
+
+    help = (
+        "Run the jobs queued by review writes (ranking and rollup recomputes), polling the queue until "
+        "stopped with SIGINT or SIGTERM. Start as many workers as needed; they claim separate batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.JOB_BATCH_SIZE, help="Jobs claimed at once.")
+        parser.add_argument(
+            "--poll", type=float, default=settings.JOB_POLL_SECONDS, help="Seconds to sleep when the queue is empty."
+        )
+        parser.add_argument("--once", action="store_true", help="Run the due jobs, then exit.")
+        parser.add_argument("--status", action="store_true", help="Print the queue depth and exit.")
+
+    def handle(self, *args, **options):
+        if options["status"]:
+            self.print_depth()
+            return
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        total = 0
+        while not self.stopping:
+            ran = run_batch(options["batch_size"])
+            total += ran
+            if ran:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["poll"])
+        self.stdout.write(self.style.SUCCESS(f"Ran {total} jobs."))
+
+    def stop(self, signum, frame):
+        # Finish the current batch rather than leaving its jobs running until their lock times out.
+        self.stopping = True
+
+    def print_depth(self):
+        depth = Job.objects.depth()
+        for name, (count, oldest) in sorted(depth.items()):
+            self.stdout.write(f"{name}: {count} waiting, oldest {oldest:.1f}s")
+        failed = Job.objects.filter(status=Job.FAILED).count()
+        self.stdout.write(f"{sum(count for count, _ in depth.values())} waiting, {failed} failed")
@@ -0,0 +1,146 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from reviews.caching import invalidate_all
+from reviews.models import DailyRating, Restaurant, RestaurantRanking, Review, ReviewerStats, SimilarRestaurant
+
+ADJECTIVES = [
+    "Golden", "Blue", "Rustic", "Little", "Grand", "Spicy", "Smoky", "Sunny", "Old", "Royal",
+    "Green", "Hidden", "Lucky", "Urban", "Corner", "Crispy", "Salty", "Sweet", "Wild", "Happy",
+]  # fmt: skip
+NOUNS = [
+    "Spoon", "Fork", "Kitchen", "Table", "Garden", "Bistro", "Diner", "Grill", "Noodle", "Taco",
+    "Dragon", "Olive", "Harbor", "Oven", "Lantern", "Pepper", "Barrel", "Bakery", "Cantina", "Cafe",
+]  # fmt: skip
+# Restaurants are scattered around this point (latitude, longitude), about CITY_SPREAD degrees apart.
+CITY_CENTER = (34.05, -118.24)
+CITY_SPREAD = 0.15
+WORDS = (
+    "the food was great good bad slow fast friendly rude service staff menu pasta pizza burger soup "
+    "salad spicy fresh cold warm portion price cheap expensive dessert coffee wine beer table wait "
+    "booking atmosphere music loud quiet clean dirty delicious bland tasty crispy soggy sauce bread "
+    "would come back again never recommend highly amazing awful decent okay lovely brunch dinner lunch"
+).split()
+
+
+class Command(BaseCommand):
+    """
+    Fill the database with a synthetic, repeatable dataset for benchmarking.
+    """
+
+    help = (
+        "Generate restaurants, users and reviews with Zipf-skewed restaurant popularity. Run it against an "
+        "empty, migrated database (for example DATABASE_URL=sqlite:////tmp/bench.sqlite3)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurants", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=50_000)
+        parser.add_argument("--reviews", type=int, default=5_000_000)
+        parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of restaurant popularity.")
+        parser.add_argument("--days", type=int, default=730, help="Spread review times over this many days.")
+        parser.add_argument("--batch-size", type=int, default=20_000, help="Rows inserted per transaction.")
+        parser.add_argument("--seed", type=int, default=218, help="Random seed, so datasets are repeatable.")
+
+    def handle(self, *args, **options):
+        if Review.objects.exists():
+            raise CommandError("The database already has reviews; seed_bench needs an empty database.")
+        self.random = random.Random(options["seed"])
+        started = time.perf_counter()
+        restaurant_ids = self.create_restaurants(options["restaurants"], options["batch_size"])
+        user_ids = self.create_users(options["users"], options["batch_size"])
+        self.create_reviews(restaurant_ids, user_ids, options)
+        # The inserts bypassed the queued ranking, rollup and similarity recomputes and the reviewer
+        # statistics, so build them once.
+        RestaurantRanking.objects.compact()
+        DailyRating.objects.rebuild()
+        ReviewerStats.objects.rebuild()
+        SimilarRestaurant.objects.rebuild()
+        invalidate_all()
+        self.stdout.write(self.style.SUCCESS(f"Seeded the benchmark dataset in {time.perf_counter() - started:.1f}s."))
+
+    def create_restaurants(self, count, batch_size):
+        restaurants = []
+        for number in range(1, count + 1):
+            latitude = round(self.random.gauss(CITY_CENTER[0], CITY_SPREAD), 6)
+            longitude = round(self.random.gauss(CITY_CENTER[1], CITY_SPREAD), 6)
+            restaurants.append(
+                Restaurant(
+                    name=f"{self.random.choice(ADJECTIVES)} {self.random.choice(NOUNS)} {number}",
+                    latitude=latitude,
+                    longitude=longitude,
+                    # bulk_create skips save(), which sets the geohash.
+                    geohash=Restaurant.location_geohash(latitude, longitude),
+                )
+            )
+        Restaurant.objects.bulk_create(restaurants, batch_size=batch_size)
+        self.stdout.write(f"{count} restaurants created")
+        return list(Restaurant.objects.order_by("id").values_list("id", flat=True))
+
+    def create_users(self, count, batch_size):
+        # Every generated user shares one unusable password hash; hashing per user would dominate the run.
+        password = make_password(None)
+        users = [User(username=f"bench-{number}", password=password) for number in range(1, count + 1)]
+        User.objects.bulk_create(users, batch_size=batch_size, ignore_conflicts=True)
+        self.stdout.write(f"{count} users created")
+        return list(User.objects.filter(username__startswith="bench-").values_list("id", flat=True))
+
+    def create_reviews(self, restaurant_ids, user_ids, options):
+        """
+        Insert the reviews batch by batch, then apply the rating aggregates with one UPDATE per restaurant.
+        """
+        rng = self.random
+        # Popularity follows a Zipf law over a shuffled ranking, so popular restaurants are spread over ids.
+        ranked = restaurant_ids[:]
+        rng.shuffle(ranked)
+        cumulative = list(accumulate(1 / rank ** options["skew"] for rank in range(1, len(ranked) + 1)))
+        # Each restaurant has its own typical rating, so averages and histograms vary between restaurants.
+        quality = {restaurant_id: rng.uniform(1.5, 4.8) for restaurant_id in restaurant_ids}
+        now = timezone.now()
+        span = options["days"] * 86400
+
+        deltas = {}
+        remaining = options["reviews"]
+        inserted = 0
+        started = time.perf_counter()
+        while remaining > 0:
+            size = min(options["batch_size"], remaining)
+            reviews = []
+            for restaurant_id in rng.choices(ranked, cum_weights=cumulative, k=size):
+                rating = min(5, max(1, round(rng.gauss(quality[restaurant_id], 1.0))))
+                created = now - timedelta(seconds=rng.random() * span)
+                review = Review(
+                    restaurant_id=restaurant_id,
+                    user_id=rng.choice(user_ids),
+                    rating=rating,
+                    body=" ".join(rng.choices(WORDS, k=rng.randint(8, 60))).capitalize() + ".",
+                    created=created,
+                    updated=created,
+                )
+                # Inserted with its generated times instead of auto_now(_add)'s.
+                review.keep_timestamps = True
+                reviews.append(review)
+                histogram = deltas.setdefault(restaurant_id, {})
+                histogram[rating] = histogram.get(rating, 0) + 1
+            # The base manager skips ReviewQuerySet.bulk_create's per-batch aggregate updates; the
+            # totals for the whole run are applied once below.
+            with transaction.atomic():
+                Review._base_manager.bulk_create(reviews)
+            remaining -= size
+            inserted += size
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{inserted} reviews inserted ({inserted / elapsed:,.0f}/s)")
+        with transaction.atomic():
+            Restaurant.objects.apply_bulk_deltas(deltas)
@@ -0,0 +1,47 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    """
+    Stand-in replication for local testing: copy the primary SQLite database over each SQLite replica.
+    """
+
+    help = (
+        "Copy the primary SQLite database into every SQLite replica alias with SQLite's online backup API. "
+        "With --interval, keep copying every N seconds to simulate a lagging replica."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, help="Copy repeatedly, this many seconds apart.")
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        replicas = [connections[alias] for alias in settings.DATABASE_REPLICAS]
+        if primary.vendor != "sqlite" or not replicas or any(replica.vendor != "sqlite" for replica in replicas):
+            raise CommandError("sync_replica needs a SQLite primary and SQLite replicas (set DATABASE_REPLICA_URL).")
+        while True:
+            started = time.perf_counter()
+            for replica in replicas:
+                self.copy(primary, replica)
+            self.stdout.write(
+                f"Copied to {', '.join(replica.alias for replica in replicas)} in {time.perf_counter() - started:.2f}s"
+            )
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+    def copy(self, primary, replica):
+        # Copied through Django's connections, so in-memory test databases and the connection settings
+        # of both aliases are honoured.
+        primary.ensure_connection()
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
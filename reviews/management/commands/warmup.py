@@ -0,0 +1,33 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from reviews.warmup import warm_up
+
+
+class Command(BaseCommand):
+    """
+    Run the startup warmup and report what each step cost.
+    """
+
+    help = (
+        "Compile every template and URL pattern and open the database connections, as gunicorn.conf.py does "
+        "at startup, and print the time each step took; run in a fresh process to measure a cold start."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--urlconf", action="append", help="URLconf to compile (repeatable; default: ROOT_URLCONF)."
+        )
+        parser.add_argument("--no-databases", action="store_true", help="Do not open the database connections.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        report = warm_up(options["urlconf"], databases=not options["no_databases"])
+        for name, result, elapsed in report:
+            self.stdout.write(f"  {name:12} {result:>6}  {elapsed * 1000:8.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Warmed up in {(time.perf_counter() - started) * 1000:.1f} ms."))
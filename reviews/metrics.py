@@ -0,0 +1,121 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import hmac
+import os
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views import View
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+# Request, database and cache metrics, served in the Prometheus text format by MetricsView (/metrics).
+#
+# Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to an empty directory before the workers start: each
+# process then keeps its values in memory-mapped files there, updates only take that value's own lock,
+# and a scrape of any worker merges the files of all of them. Without it the values are per process.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21, 50, 100)
+QUERY_DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+REQUESTS = Counter("django_requests", "Requests by URL name, method and status.", ["route", "method", "status"])
+REQUEST_DURATION = Histogram(
+    "django_request_duration_seconds", "Request latency by URL name.", ["route"], buckets=LATENCY_BUCKETS
+)
+DB_QUERIES = Histogram(
+    "django_request_db_queries", "Database queries per request by URL name.", ["route"], buckets=QUERY_COUNT_BUCKETS
+)
+DB_DURATION = Histogram(
+    "django_request_db_duration_seconds",
+    "Database time per request by URL name.",
+    ["route"],
+    buckets=QUERY_DURATION_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "django_cache_lookups", "Page fragment cache lookups by fragment and result.", ["cache", "result"]
+)
+
+
+def route_name(request):
+    """
+    Returns the URL name a request resolved to; paths are not used, as every id would be its own series.
+    """
+    return request.resolver_match.view_name if request.resolver_match else "unresolved"
+
+
+def record_request(request, response, duration, recorder=None):
+    """
+    Record a finished request, with its database statements when a QueryRecorder saw them.
+    """
+    route = route_name(request)
+    REQUESTS.labels(route, request.method, response.status_code).inc()
+    REQUEST_DURATION.labels(route).observe(duration)
+    if recorder is not None:
+        DB_QUERIES.labels(route).observe(recorder.count)
+        DB_DURATION.labels(route).observe(recorder.duration)
+
+
+def record_cache_lookup(name, hit):
+    """
+    Record a lookup in the named cache.
+    """
+    CACHE_LOOKUPS.labels(name, "hit" if hit else "miss").inc()
+
+
+class JobQueueCollector:
+    """
+    Reports the background job queue depth (see reviews.jobs), read from the database at scrape time.
+    """
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        # Imported here: reviews.models imports this module through reviews.caching.
+        from .models import Job
+
+        waiting = GaugeMetricFamily("job_queue_waiting", "Pending background jobs by name.", labels=["name"])
+        oldest = GaugeMetricFamily(
+            "job_queue_oldest_age_seconds", "Age of the oldest pending background job by name.", labels=["name"]
+        )
+        for name, (count, age) in Job.objects.depth().items():
+            waiting.add_metric([name], count)
+            oldest.add_metric([name], age)
+        yield waiting
+        yield oldest
+
+
+def exposition():
+    """
+    Returns every metric in the Prometheus text format, merged across processes when they share a directory.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    jobs = CollectorRegistry()
+    jobs.register(JobQueueCollector())
+    return generate_latest(registry) + generate_latest(jobs)
+
+
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint. With settings.METRICS_TOKEN set, requests must send it as a bearer token;
+    without one it is hidden, unless settings.DEBUG or settings.METRICS_PUBLIC is on.
+    """
+
+    http_method_names = ["get", "head"]
+
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        if not token and not (settings.DEBUG or settings.METRICS_PUBLIC):
+            raise Http404("Metrics are disabled without METRICS_TOKEN.")
+        if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return HttpResponse("Unauthorized.\n", status=401, content_type="text/plain")
+        return HttpResponse(exposition(), content_type=CONTENT_TYPE_LATEST)
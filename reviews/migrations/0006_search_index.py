@@ -0,0 +1,99 @@
+# Full-text search index for restaurant names and review bodies (see reviews/search.py).
+#
+# SQLite: external-content FTS5 tables whose rowids are the restaurant/review ids, kept in sync by
+# triggers, so bulk inserts and raw deletes are indexed too. PostgreSQL: GIN expression indexes over
+# the same to_tsvector() expressions reviews.search filters on.
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE reviews_restaurant_fts USING fts5(
+        name, content='reviews_restaurant', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE reviews_review_fts USING fts5(
+        body, content='reviews_review', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER reviews_restaurant_fts_insert AFTER INSERT ON reviews_restaurant BEGIN
+        INSERT INTO reviews_restaurant_fts(rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER reviews_restaurant_fts_delete AFTER DELETE ON reviews_restaurant BEGIN
+        INSERT INTO reviews_restaurant_fts(reviews_restaurant_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END
+    """,
+    """
+    CREATE TRIGGER reviews_restaurant_fts_update AFTER UPDATE OF name ON reviews_restaurant BEGIN
+        INSERT INTO reviews_restaurant_fts(reviews_restaurant_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO reviews_restaurant_fts(rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER reviews_review_fts_insert AFTER INSERT ON reviews_review BEGIN
+        INSERT INTO reviews_review_fts(rowid, body) VALUES (new.id, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER reviews_review_fts_delete AFTER DELETE ON reviews_review BEGIN
+        INSERT INTO reviews_review_fts(reviews_review_fts, rowid, body) VALUES ('delete', old.id, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER reviews_review_fts_update AFTER UPDATE OF body ON reviews_review BEGIN
+        INSERT INTO reviews_review_fts(reviews_review_fts, rowid, body) VALUES ('delete', old.id, old.body);
+        INSERT INTO reviews_review_fts(rowid, body) VALUES (new.id, new.body);
+    END
+    """,
+    "INSERT INTO reviews_restaurant_fts(reviews_restaurant_fts) VALUES ('rebuild')",
+    "INSERT INTO reviews_review_fts(reviews_review_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS reviews_restaurant_fts_insert",
+    "DROP TRIGGER IF EXISTS reviews_restaurant_fts_delete",
+    "DROP TRIGGER IF EXISTS reviews_restaurant_fts_update",
+    "DROP TRIGGER IF EXISTS reviews_review_fts_insert",
+    "DROP TRIGGER IF EXISTS reviews_review_fts_delete",
+    "DROP TRIGGER IF EXISTS reviews_review_fts_update",
+    "DROP TABLE IF EXISTS reviews_restaurant_fts",
+    "DROP TABLE IF EXISTS reviews_review_fts",
+]
+
+POSTGRESQL_FORWARD = [
+    "CREATE INDEX reviews_restaurant_name_tsv ON reviews_restaurant "
+    "USING gin (to_tsvector('english'::regconfig, COALESCE(name, '')))",
+    "CREATE INDEX reviews_review_body_tsv ON reviews_review "
+    "USING gin (to_tsvector('english'::regconfig, COALESCE(body, '')))",
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS reviews_restaurant_name_tsv",
+    "DROP INDEX IF EXISTS reviews_review_body_tsv",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            run_for_vendor({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRESQL_BACKWARD}),
+        ),
+    ]
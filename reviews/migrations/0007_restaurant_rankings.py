@@ -0,0 +1,49 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+from reviews import ranking
+
+
+def backfill_rankings(apps, schema_editor):
+    ranking.compact(
+        apps.get_model('reviews', 'Restaurant'),
+        apps.get_model('reviews', 'Review'),
+        apps.get_model('reviews', 'RestaurantRanking'),
+        apps.get_model('reviews', 'RankingPrior'),
+        using=schema_editor.connection.alias,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingPrior',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mean', models.FloatField()),
+                ('weight', models.FloatField()),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RestaurantRanking',
+            fields=[
+                ('restaurant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='reviews.restaurant')),
+                ('bayesian_score', models.FloatField(default=0)),
+                ('trending_score', models.FloatField(default=-1000000000.0)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['-bayesian_score', '-restaurant'], name='ranking_bayesian_idx'),
+                    models.Index(fields=['-trending_score', '-restaurant'], name='ranking_trending_idx'),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_rankings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+from reviews import rollups
+
+
+def backfill_daily_ratings(apps, schema_editor):
+    rollups.rebuild(
+        apps.get_model('reviews', 'DailyRating'),
+        apps.get_model('reviews', 'Review'),
+        using=schema_editor.connection.alias,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0007_restaurant_rankings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_1_count', models.PositiveIntegerField(default=0)),
+                ('rating_2_count', models.PositiveIntegerField(default=0)),
+                ('rating_3_count', models.PositiveIntegerField(default=0)),
+                ('rating_4_count', models.PositiveIntegerField(default=0)),
+                ('rating_5_count', models.PositiveIntegerField(default=0)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_ratings', to='reviews.restaurant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurant', 'day'), name='daily_rating_restaurant_day_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_ratings, migrations.RunPython.noop),
+    ]
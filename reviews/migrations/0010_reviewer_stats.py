@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_reviewer_stats(apps, schema_editor):
+    ReviewerStats = apps.get_model('reviews', 'ReviewerStats')
+    Review = apps.get_model('reviews', 'Review')
+    using = schema_editor.connection.alias
+    rows = (
+        Review.objects.using(using)
+        .order_by()
+        .values_list('user_id')
+        .annotate(models.Count('id'), models.Sum('rating'))
+    )
+    ReviewerStats.objects.using(using).bulk_create(
+        (ReviewerStats(user_id=user_id, review_count=count, rating_sum=rating_sum) for user_id, count, rating_sum in rows),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0009_job_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewerStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', '-created', '-id'], name='review_user_created_idx'),
+        ),
+        migrations.RunPython(backfill_reviewer_stats, migrations.RunPython.noop),
+    ]
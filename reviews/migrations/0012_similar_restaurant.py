@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0011_restaurant_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRestaurant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('restaurant', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='similar_restaurants', to='reviews.restaurant')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reviews.restaurant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['restaurant', '-score'], name='similar_restaurant_score_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0012_similar_restaurant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='deleted',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
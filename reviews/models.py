@@ -4,9 +4,165 @@ CIS 218: Django Project
 Date: October 10, 2024
 """
 
-from django.db import models
+import time
+from datetime import timedelta
+from operator import attrgetter
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils import timezone
+from django.db.models import Count, F, Min, Q, Sum
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .caching import RESTAURANT_LIST_VERSION, invalidate, invalidate_restaurants
+from . import geo, ranking, rollups
+
+RATING_CHOICES = range(1, 6)
+
+
+def rating_count_field(rating):
+    """
+    Returns the name of the histogram field that counts reviews with the given rating.
+    """
+    return f"rating_{rating}_count"
+
+
+class RestaurantQuerySet(models.QuerySet):
+    """
+    QuerySet for restaurants with helpers for the denormalized rating aggregates.
+    """
+
+    def apply_rating_delta(self, restaurant_id, rating, sign):
+        """
+        Atomically add (sign=1) or remove (sign=-1) one review with the given rating.
+        """
+        return self.filter(pk=restaurant_id).update(
+            review_count=F("review_count") + sign,
+            rating_sum=F("rating_sum") + sign * rating,
+            updated=timezone.now(),
+            **{rating_count_field(rating): F(rating_count_field(rating)) + sign},
+        )
+
+    def move_rating(self, restaurant_id, old_rating, new_rating):
+        """
+        Atomically change one review's rating from old_rating to new_rating within the same restaurant.
+
+        The restaurant's updated timestamp is touched even when the rating is unchanged, so it always
+        reflects the latest write to the restaurant or any of its reviews.
+        """
+        updates = {"updated": timezone.now()}
+        if old_rating != new_rating:
+            updates.update(
+                {
+                    "rating_sum": F("rating_sum") + new_rating - old_rating,
+                    rating_count_field(old_rating): F(rating_count_field(old_rating)) - 1,
+                    rating_count_field(new_rating): F(rating_count_field(new_rating)) + 1,
+                }
+            )
+        return self.filter(pk=restaurant_id).update(**updates)
+
+    def apply_bulk_deltas(self, deltas):
+        """
+        Apply a {restaurant_id: {rating: count}} mapping of added reviews with one UPDATE per restaurant.
+        """
+        for restaurant_id, histogram in deltas.items():
+            updates = {
+                "updated": timezone.now(),
+                "review_count": F("review_count") + sum(histogram.values()),
+                "rating_sum": F("rating_sum") + sum(rating * count for rating, count in histogram.items()),
+            }
+            for rating, count in histogram.items():
+                updates[rating_count_field(rating)] = F(rating_count_field(rating)) + count
+            self.filter(pk=restaurant_id).update(**updates)
+
+    def visible(self):
+        """
+        Returns the restaurants that are not hidden while an admin deletion removes their reviews.
+        """
+        return self.filter(deleted__isnull=True)
+
+    def near(self, latitude, longitude, radius_km):
+        """
+        Returns the restaurants in the geohash cells around a point: every restaurant within radius_km,
+        and some further away, found with a few range scans of the geohash index.
+        """
+        return self.filter(geo.cells_filter(latitude, longitude, radius_km))
+
+    def nearest(self, latitude, longitude, radius_km, limit):
+        """
+        Returns up to limit restaurants within radius_km of a point, nearest first, with distance_km set.
+        """
+        return self._by_distance(self.near(latitude, longitude, radius_km), latitude, longitude, radius_km, limit)
+
+    async def anearest(self, latitude, longitude, radius_km, limit):
+        """
+        Async version of nearest().
+        """
+        candidates = [restaurant async for restaurant in self.near(latitude, longitude, radius_km)]
+        return self._by_distance(candidates, latitude, longitude, radius_km, limit)
+
+    @staticmethod
+    def _by_distance(candidates, latitude, longitude, radius_km, limit):
+        position = attrgetter("latitude", "longitude")
+        found = geo.nearest(candidates, latitude, longitude, radius_km, limit, position)
+        for distance, restaurant in found:
+            restaurant.distance_km = distance
+        return [restaurant for _, restaurant in found]
+
+    def computed_aggregates(self, restaurant_ids):
+        """
+        Returns {restaurant_id: {field: value}} computed from the review table for the given restaurants.
+        """
+        rows = (
+            Review.objects.filter(restaurant_id__in=restaurant_ids)
+            .order_by()
+            .values("restaurant_id")
+            .annotate(
+                review_count=Count("id"),
+                rating_sum=Sum("rating"),
+                **{rating_count_field(rating): Count("id", filter=Q(rating=rating)) for rating in RATING_CHOICES},
+            )
+        )
+        computed = {restaurant_id: Restaurant.empty_aggregates() for restaurant_id in restaurant_ids}
+        for row in rows:
+            computed[row.pop("restaurant_id")] = row
+        return computed
+
+    def recompute_aggregates(self, batch_size=1000, check_only=False):
+        """
+        Recompute the rating aggregates for every restaurant in the queryset.
+
+        Returns the list of restaurant ids whose stored aggregates were wrong. When check_only
+        is True nothing is written.
+        """
+        mismatched = []
+        fields = list(Restaurant.empty_aggregates())
+        restaurants = self.order_by("pk").only("pk", "updated", *fields).iterator(chunk_size=batch_size)
+        batch = []
+        for restaurant in restaurants:
+            batch.append(restaurant)
+            if len(batch) >= batch_size:
+                mismatched += self._recompute_batch(batch, fields, check_only)
+                batch = []
+        if batch:
+            mismatched += self._recompute_batch(batch, fields, check_only)
+        return mismatched
+
+    def _recompute_batch(self, batch, fields, check_only):
+        computed = self.computed_aggregates([restaurant.pk for restaurant in batch])
+        stale = []
+        for restaurant in batch:
+            values = computed[restaurant.pk]
+            if any(getattr(restaurant, field) != values[field] for field in fields):
+                for field in fields:
+                    setattr(restaurant, field, values[field])
+                restaurant.updated = timezone.now()
+                stale.append(restaurant)
+        if stale and not check_only:
+            with transaction.atomic(using=self.db):
+                Restaurant.objects.using(self.db).bulk_update(stale, fields + ["updated"])
+                invalidate_restaurants([restaurant.pk for restaurant in stale])
+        return [restaurant.pk for restaurant in stale]
 
 
 class Restaurant(models.Model):
@@ -17,6 +173,26 @@ class Restaurant(models.Model):
     name = models.CharField(max_length=200)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Derived from the coordinates by save() (see reviews.geo); NULL without a location. Nullable so the
+    # column is added without SQLite rebuilding the table, which would drop the search index triggers.
+    geohash = models.CharField(max_length=geo.PRECISION, null=True, blank=True, editable=False)
+    # Set when an admin deletes the restaurant; the pages and APIs stop showing it at once, while the
+    # deletion job removes its reviews in batches (see BatchedDeletionMixin in reviews.admin).
+    deleted = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Denormalized rating aggregates, kept in step with the review table by reviews.signals. Every
+    # review write also touches updated, so it doubles as the last-modified time of the restaurant page.
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RestaurantQuerySet.as_manager()
 
     def __str__(self):
         """
@@ -24,14 +200,183 @@ class Restaurant(models.Model):
         """
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Save the restaurant without writing the aggregate fields, which only the review hooks maintain.
+
+        Otherwise saving an instance loaded before a review was posted would overwrite the newer counts.
+        The geohash is recomputed from the coordinates.
+        """
+        self.geohash = self.location_geohash(self.latitude, self.longitude)
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            aggregates = set(self.empty_aggregates())
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in aggregates
+            ]
+        super().save(*args, **kwargs)
+
     def average_rating(self):
         """
-        Calculate and return the average rating for the restaurant.
+        Return the average rating for the restaurant, or None if it has no reviews.
         """
-        return self.reviews.aggregate(Avg("rating"))["rating__avg"]
+        if not self.review_count:
+            return None
+        return self.rating_sum / self.review_count
+
+    def rating_histogram(self):
+        """
+        Return a list of (rating, count) pairs from 5 stars down to 1.
+        """
+        return [(rating, getattr(self, rating_count_field(rating))) for rating in reversed(RATING_CHOICES)]
+
+    @staticmethod
+    def location_geohash(latitude, longitude):
+        """
+        Returns the geohash stored for the given coordinates, or None without a location.
+        """
+        if latitude is None or longitude is None:
+            return None
+        return geo.encode(latitude, longitude)
+
+    @staticmethod
+    def empty_aggregates():
+        """
+        Returns the aggregate field values of a restaurant without reviews.
+        """
+        values = {"review_count": 0, "rating_sum": 0}
+        values.update({rating_count_field(rating): 0 for rating in RATING_CHOICES})
+        return values
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            # Keyset pagination of the restaurant list seeks on (name, id).
+            models.Index(fields=["name", "id"], name="restaurant_name_id_idx"),
+            # "Near me" searches scan the ranges of the cells around the point.
+            models.Index(fields=["geohash"], name="restaurant_geohash_idx"),
+        ]
+
+
+class ReviewQuerySet(models.QuerySet):
+    """
+    QuerySet for reviews that keeps restaurant aggregates correct on bulk writes.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Create the reviews and add them to their restaurants' aggregates, one UPDATE per restaurant.
+        """
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            deltas = {}
+            for review in created:
+                histogram = deltas.setdefault(review.restaurant_id, {})
+                histogram[review.rating] = histogram.get(review.rating, 0) + 1
+            Restaurant.objects.using(self.db).apply_bulk_deltas(deltas)
+            ReviewerStats.objects.using(self.db).apply_deltas(
+                reviewer_deltas((review.user_id, review.rating, 1) for review in created)
+            )
+            Job.objects.using(self.db).enqueue_review_jobs((review.restaurant_id, review.created) for review in created)
+            invalidate_restaurants(deltas)
+        return created
+
+    def update(self, **kwargs):
+        """
+        Update the reviews, then recompute the aggregates of every restaurant and author whose ratings may
+        have changed and touch the restaurants and authors whose pages show the updated reviews.
+        """
+        with transaction.atomic(using=self.db):
+            new_restaurant = kwargs.get("restaurant_id", kwargs.get("restaurant"))
+            if isinstance(new_restaurant, Restaurant):
+                new_restaurant = new_restaurant.pk
+            reviewed = list(self.order_by().values_list("pk", "restaurant_id", "created", "user_id"))
+            affected = {restaurant_id for _, restaurant_id, _, _ in reviewed}
+            authors = {user_id for _, _, _, user_id in reviewed}
+            rows = super().update(**kwargs)
+            new_user = kwargs.get("user_id", kwargs.get("user"))
+            if new_user is not None:
+                authors.add(new_user.pk if isinstance(new_user, User) else new_user)
+            reviewer_stats = ReviewerStats.objects.using(self.db)
+            if "rating" in kwargs or new_user is not None:
+                reviewer_stats.recompute(authors)
+            else:
+                reviewer_stats.filter(user_id__in=authors).update(updated=timezone.now())
+            if new_restaurant is not None:
+                affected.add(new_restaurant)
+            restaurants = Restaurant.objects.using(self.db).filter(pk__in=affected)
+            if "rating" in kwargs or new_restaurant is not None:
+                restaurants.recompute_aggregates()
+            if {"rating", "created"} & kwargs.keys() or new_restaurant is not None:
+                # The rankings and rollups of the reviews' old and new restaurants and days are recomputed.
+                moved = Review.objects.using(self.db).filter(pk__in=[pk for pk, _, _, _ in reviewed])
+                Job.objects.using(self.db).enqueue_review_jobs(
+                    [(restaurant_id, created) for _, restaurant_id, created, _ in reviewed]
+                    + list(moved.values_list("restaurant_id", "created"))
+                )
+            restaurants.update(updated=timezone.now())
+            invalidate_restaurants(affected)
+        return rows
+
+    def delete_batch(self, batch_size=None):
+        """
+        Delete up to batch_size of the reviews in one short transaction, and return how many were deleted.
+
+        Unlike delete(), no instances are loaded and no signals are sent per review: the restaurant and
+        reviewer aggregates take one UPDATE per restaurant and author, and the ranking and rollup
+        recomputes are queued. The batch is whichever rows the filter's index yields first, so no sort is
+        needed.
+        """
+        batch_size = batch_size or settings.REVIEW_DELETE_BATCH_SIZE
+        with transaction.atomic(using=self.db):
+            fields = ("pk", "restaurant_id", "rating", "created", "user_id")
+            rows = list(self.order_by().values_list(*fields)[:batch_size])
+            if not rows:
+                return 0
+            Review.objects.using(self.db).filter(pk__in=[row[0] for row in rows])._raw_delete(self.db)
+            deltas = {}
+            for _, restaurant_id, rating, _, _ in rows:
+                histogram = deltas.setdefault(restaurant_id, {})
+                histogram[rating] = histogram.get(rating, 0) - 1
+            Restaurant.objects.using(self.db).apply_bulk_deltas(deltas)
+            ReviewerStats.objects.using(self.db).apply_deltas(
+                reviewer_deltas((user_id, rating, -1) for _, _, rating, _, user_id in rows)
+            )
+            Job.objects.using(self.db).enqueue_review_jobs(
+                (restaurant_id, created) for _, restaurant_id, _, created, _ in rows
+            )
+            invalidate_restaurants(deltas)
+        return len(rows)
+
+    def delete_in_batches(self, batch_size=None, pause=None):
+        """
+        Delete all the reviews with delete_batch(), pausing between batches so other writers get the
+        write lock. Yields the number of reviews deleted so far after each batch.
+        """
+        pause = settings.REVIEW_DELETE_PAUSE_SECONDS if pause is None else pause
+        deleted = 0
+        while batch := self.delete_batch(batch_size):
+            deleted += batch
+            yield deleted
+            time.sleep(pause)
+
+
+class TimestampField(models.DateTimeField):
+    """
+    auto_now / auto_now_add DateTimeField that keeps the value given on an instance whose
+    keep_timestamps attribute is true, so imported reviews are inserted with their original times.
+    """
+
+    def pre_save(self, model_instance, add):
+        if getattr(model_instance, "keep_timestamps", False):
+            return getattr(model_instance, self.attname)
+        return super().pre_save(model_instance, add)
+
+    def deconstruct(self):
+        # Nothing changes in the database, so migrations see the plain field.
+        name, _, args, kwargs = super().deconstruct()
+        return name, "django.db.models.DateTimeField", args, kwargs
 
 
 class Review(models.Model):
@@ -43,8 +388,34 @@ class Review(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     body = models.TextField()
-    created = models.DateTimeField(auto_now_add=True)
-    updated = models.DateTimeField(auto_now=True)
+    created = TimestampField(auto_now_add=True)
+    updated = TimestampField(auto_now=True)
+
+    objects = ReviewQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember the rating and restaurant as loaded, so saves can adjust the aggregates by the difference.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance.remember_aggregate_state()
+        return instance
+
+    def remember_aggregate_state(self):
+        """
+        Record the stored rating, restaurant and author of this review.
+        """
+        self._stored_rating = self.__dict__.get("rating")
+        self._stored_restaurant_id = self.__dict__.get("restaurant_id")
+        self._stored_user_id = self.__dict__.get("user_id")
+
+    def save(self, *args, **kwargs):
+        """
+        Save the review and update the restaurant aggregates in the same transaction.
+        """
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         """
@@ -54,3 +425,421 @@ class Review(models.Model):
 
     class Meta:
         ordering = ["-created"]
+        indexes = [
+            # Keyset pagination of a restaurant's reviews seeks on (created, id), newest first.
+            models.Index(fields=["restaurant", "-created", "-id"], name="review_restaurant_created_idx"),
+            # The same for a user's reviews on their profile page.
+            models.Index(fields=["user", "-created", "-id"], name="review_user_created_idx"),
+        ]
+
+
+def reviewer_deltas(changes):
+    """
+    Returns the {user_id: (review_count, rating_sum)} deltas of (user_id, rating, sign) review changes.
+    """
+    deltas = {}
+    for user_id, rating, sign in changes:
+        count, rating_sum = deltas.get(user_id, (0, 0))
+        deltas[user_id] = (count + sign, rating_sum + sign * rating)
+    return deltas
+
+
+class ReviewerStatsQuerySet(models.QuerySet):
+    """
+    QuerySet for per-user review statistics, kept in step with the review table like the restaurant
+    aggregates.
+    """
+
+    def apply_deltas(self, deltas):
+        """
+        Apply a {user_id: (review_count, rating_sum)} mapping of changes with one UPDATE per user.
+
+        A user without a row yet gets one computed from the review table, which already has the change.
+        Every call touches the updated time, the profile page's last-modified time.
+        """
+        now = timezone.now()
+        missing = []
+        for user_id, (count, rating_sum) in deltas.items():
+            rows = self.filter(user_id=user_id).update(
+                review_count=F("review_count") + count, rating_sum=F("rating_sum") + rating_sum, updated=now
+            )
+            if not rows:
+                missing.append(user_id)
+        if missing:
+            self.recompute(missing)
+
+    def recompute(self, user_ids):
+        """
+        Recompute the statistics of the given users from the review table, creating missing rows.
+        """
+        user_ids = set(user_ids)
+        computed = {user_id: (0, 0) for user_id in user_ids}
+        rows = (
+            Review.objects.using(self.db)
+            .filter(user_id__in=user_ids)
+            .order_by()
+            .values_list("user_id")
+            .annotate(Count("id"), Sum("rating"))
+        )
+        for user_id, count, rating_sum in rows:
+            computed[user_id] = (count, rating_sum)
+        stats = [
+            ReviewerStats(user_id=user_id, review_count=count, rating_sum=rating_sum)
+            for user_id, (count, rating_sum) in sorted(computed.items())
+        ]
+        self.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["review_count", "rating_sum", "updated"],
+        )
+
+    def rebuild(self, batch_size=1000):
+        """
+        Recompute every user's statistics, for example after inserts that bypassed the review hooks.
+        """
+        user_ids = User.objects.using(self.db).order_by("pk").values_list("pk", flat=True)
+        batch = []
+        for user_id in user_ids.iterator(chunk_size=batch_size):
+            batch.append(user_id)
+            if len(batch) >= batch_size:
+                self.recompute(batch)
+                batch = []
+        if batch:
+            self.recompute(batch)
+
+
+class ReviewerStats(models.Model):
+    """
+    A user's review count and rating sum, maintained by the review hooks, so the profile page shows
+    them without aggregating the user's reviews.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="review_stats")
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    # Touched by every write to the user's reviews: the last-modified time of the profile page.
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = ReviewerStatsQuerySet.as_manager()
+
+    def __str__(self):
+        """
+        Returns a string representation of the statistics.
+        """
+        return f"Review statistics of user {self.user_id}"
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Returns the user's statistics, or empty ones for a user who never reviewed.
+        """
+        try:
+            return user.review_stats
+        except cls.DoesNotExist:
+            return cls(user=user, updated=user.date_joined)
+
+    def average_rating(self):
+        """
+        Return the user's average rating, or None if they have no reviews.
+        """
+        if not self.review_count:
+            return None
+        return self.rating_sum / self.review_count
+
+
+class RankingPrior(models.Model):
+    """
+    The prior used by the Bayesian ranking: the site-wide mean rating and its weight in reviews.
+
+    A single row, recomputed by the compact_rankings command.
+    """
+
+    mean = models.FloatField()
+    weight = models.FloatField()
+    updated = models.DateTimeField(auto_now=True)
+
+    CACHE_KEY = "reviews:ranking-prior"
+
+    @classmethod
+    def current(cls, using="default"):
+        """
+        Returns (mean, weight), from the cache when possible.
+        """
+        prior = cache.get(cls.CACHE_KEY)
+        if prior is None:
+            row = cls.objects.using(using).filter(pk=1).values_list("mean", "weight").first()
+            prior = row or (settings.RANKING_PRIOR_MEAN, settings.RANKING_PRIOR_WEIGHT)
+            cache.set(cls.CACHE_KEY, prior, timeout=None)
+        return prior
+
+
+class RankingQuerySet(models.QuerySet):
+    """
+    QuerySet for restaurant rankings with incremental and full recomputation.
+    """
+
+    def recompute(self, restaurant_ids):
+        """
+        Recompute the rankings of the given restaurants from their aggregates and recent reviews.
+
+        Rows are created as needed; the review jobs (reviews.jobs) call this for the restaurants whose
+        reviews changed.
+        """
+        restaurants = Restaurant.objects.using(self.db).filter(pk__in=restaurant_ids).order_by("pk")
+        batch = list(restaurants.values_list("pk", "rating_sum", "review_count"))
+        prior_mean, prior_weight = RankingPrior.current(self.db)
+        return ranking.rank_batch(Review, RestaurantRanking, batch, prior_mean, prior_weight, self.db)
+
+    def compact(self, batch_size=500):
+        """
+        Recompute every ranking and the prior from scratch, dropping drift from incremental updates.
+        """
+        ranked, prior_mean = ranking.compact(Restaurant, Review, RestaurantRanking, RankingPrior, self.db, batch_size)
+        cache.delete(RankingPrior.CACHE_KEY)
+        invalidate(RESTAURANT_LIST_VERSION)
+        return ranked, prior_mean
+
+
+class RestaurantRanking(models.Model):
+    """
+    Precomputed sort keys for the ranked restaurant lists, one row per restaurant.
+
+    The home page's top-N queries walk one of the two indexes below and join at most a page of
+    restaurants by primary key, so their cost does not depend on the number of reviews.
+    """
+
+    restaurant = models.OneToOneField(Restaurant, on_delete=models.CASCADE, primary_key=True, related_name="ranking")
+    bayesian_score = models.FloatField(default=0)
+    # Log-space, time-decayed review count; see reviews.ranking.
+    trending_score = models.FloatField(default=ranking.NO_TREND)
+
+    objects = RankingQuerySet.as_manager()
+
+    def __str__(self):
+        """
+        Returns a string representation of the ranking.
+        """
+        return f"Ranking of restaurant {self.restaurant_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-bayesian_score", "-restaurant"], name="ranking_bayesian_idx"),
+            models.Index(fields=["-trending_score", "-restaurant"], name="ranking_trending_idx"),
+        ]
+
+
+class DailyRatingQuerySet(models.QuerySet):
+    """
+    QuerySet for daily rating rollups with incremental and full recomputation.
+    """
+
+    def refresh_days(self, days):
+        """
+        Recompute the rollups of the given (restaurant_id, day) pairs from the review table.
+        """
+        return rollups.refresh_days(DailyRating, Review, days, self.db)
+
+    def rebuild(self, restaurant_ids=None, batch_size=500):
+        """
+        Recompute the rollups of the given restaurants (or all) from the review table.
+        """
+        return rollups.rebuild(DailyRating, Review, restaurant_ids, self.db, batch_size)
+
+
+class DailyRating(models.Model):
+    """
+    Per-restaurant, per-day review count, rating sum and rating histogram.
+
+    Kept in step with the review table by the jobs reviews.signals queues, so the statistics page reads
+    one row per day with reviews instead of scanning the restaurant's reviews.
+    """
+
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name="daily_ratings")
+    day = models.DateField()
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
+    objects = DailyRatingQuerySet.as_manager()
+
+    def __str__(self):
+        """
+        Returns a string representation of the rollup.
+        """
+        return f"Ratings of restaurant {self.restaurant_id} on {self.day}"
+
+    class Meta:
+        constraints = [
+            # Also the index the statistics page reads a restaurant's days from, in order.
+            models.UniqueConstraint(fields=["restaurant", "day"], name="daily_rating_restaurant_day_uniq"),
+        ]
+
+
+class SimilarRestaurantQuerySet(models.QuerySet):
+    """
+    QuerySet for the precomputed similar restaurants, with incremental and full recomputation.
+    """
+
+    def for_restaurant(self, restaurant_id, limit=None):
+        """
+        Returns a restaurant's most similar restaurants, best first, with the similar restaurant joined.
+        """
+        rows = self.filter(restaurant_id=restaurant_id, similar__deleted__isnull=True).select_related("similar")
+        rows = rows.order_by("-score", "similar_id")
+        return rows[: limit or settings.SIMILAR_RESTAURANTS]
+
+    def recompute(self, restaurant_ids):
+        """
+        Recompute the neighbours of the given restaurants; the similarity jobs (reviews.jobs) call this
+        for the restaurants whose reviews changed.
+        """
+        # Imported here so numpy and scipy are only loaded by the processes that compute similarities.
+        from . import similarity
+
+        return similarity.recompute(SimilarRestaurant, Restaurant, Review, restaurant_ids, self.db)
+
+    def rebuild(self, batch_size=500):
+        """
+        Recompute the neighbours of every restaurant from one rating matrix of the whole review table.
+        """
+        from . import similarity
+
+        return similarity.rebuild(SimilarRestaurant, Review, self.db, batch_size)
+
+
+class SimilarRestaurant(models.Model):
+    """
+    One of a restaurant's top settings.SIMILAR_RESTAURANTS neighbours by item-item collaborative
+    filtering (reviews.similarity), so the restaurant page reads them with one index range scan.
+    """
+
+    # Covered by the (restaurant, -score) index.
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, related_name="similar_restaurants", db_index=False
+    )
+    similar = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+
+    objects = SimilarRestaurantQuerySet.as_manager()
+
+    def __str__(self):
+        """
+        Returns a string representation of the neighbour.
+        """
+        return f"Restaurant {self.similar_id} similar to {self.restaurant_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["restaurant", "-score"], name="similar_restaurant_score_idx"),
+        ]
+
+
+# Names of the jobs queued by review writes and admin deletes; their handlers are in reviews.jobs.
+RANKING_JOB = "rankings"
+DAILY_RATING_JOB = "daily_ratings"
+DELETE_RESTAURANT_JOB = "delete_restaurant"
+DELETE_USER_JOB = "delete_user"
+SIMILARITY_JOB = "similar_restaurants"
+
+
+class JobQuerySet(models.QuerySet):
+    """
+    QuerySet for the background job queue.
+    """
+
+    def enqueue(self, jobs):
+        """
+        Queue (name, key) jobs, with one INSERT.
+
+        A job still waiting with the same name and key absorbs the new one, so many writes to one
+        restaurant queue a single recompute. Queued inside the caller's transaction, the jobs only
+        become visible to workers once the write that needs them commits. Similarity jobs wait
+        settings.SIMILARITY_REFRESH_DELAY_SECONDS, so a busy restaurant is recomputed at most that often.
+        """
+        now = timezone.now()
+        delays = {SIMILARITY_JOB: timedelta(seconds=settings.SIMILARITY_REFRESH_DELAY_SECONDS)}
+        jobs = {(name, str(key)) for name, key in jobs}
+        self.bulk_create(
+            [Job(name=name, key=key, run_at=now + delays.get(name, timedelta())) for name, key in sorted(jobs)],
+            ignore_conflicts=True,
+        )
+
+    def enqueue_review_jobs(self, reviews):
+        """
+        Queue the ranking, daily rollup and similarity recomputes for reviews given as (restaurant_id,
+        created) pairs.
+        """
+        jobs = []
+        for restaurant_id, created in reviews:
+            jobs.append((RANKING_JOB, restaurant_id))
+            jobs.append((SIMILARITY_JOB, restaurant_id))
+            jobs.append((DAILY_RATING_JOB, f"{restaurant_id}:{rollups.review_day(created).isoformat()}"))
+        if jobs:
+            self.enqueue(jobs)
+
+    def due(self, now=None):
+        """
+        Returns the jobs a worker may run now: waiting jobs whose time has come, and running jobs whose
+        worker has held them longer than settings.JOB_LOCK_TIMEOUT_SECONDS (it probably died).
+        """
+        now = now or timezone.now()
+        abandoned = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT_SECONDS)
+        return self.filter(Q(status=Job.PENDING, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=abandoned))
+
+    def depth(self):
+        """
+        Returns {name: (waiting jobs, age in seconds of the oldest)} for the pending jobs.
+        """
+        now = timezone.now()
+        rows = (
+            self.filter(status=Job.PENDING).order_by().values("name").annotate(count=Count("id"), oldest=Min("created"))
+        )
+        return {row["name"]: (row["count"], (now - row["oldest"]).total_seconds()) for row in rows}
+
+
+class Job(models.Model):
+    """
+    A unit of deferred work, run by the run_worker command.
+
+    The name selects the handler (see reviews.jobs) and the key what it works on, for example a
+    restaurant id. Handlers recompute state from the database, so a job that runs twice or late is harmless.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (RUNNING, "Running"), (FAILED, "Failed")]
+
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=200)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = JobQuerySet.as_manager()
+
+    def __str__(self):
+        """
+        Returns a string representation of the job.
+        """
+        return f"{self.name}:{self.key} ({self.status})"
+
+    class Meta:
+        constraints = [
+            # Coalescing: at most one waiting job per name and key.
+            models.UniqueConstraint(
+                fields=["name", "key"], condition=Q(status="pending"), name="job_pending_name_key_uniq"
+            ),
+        ]
+        indexes = [
+            # Workers claim the oldest due jobs.
+            models.Index(fields=["status", "run_at"], name="job_status_run_at_idx"),
+        ]
@@ -0,0 +1,220 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import base64
+import binascii
+import datetime
+import json
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Max, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder that keeps full microsecond precision, which DjangoJSONEncoder truncates.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class InvalidCursor(Exception):
+    """
+    Raised when a pagination cursor cannot be decoded.
+    """
+
+
+class KeysetPage:
+    """
+    One page of results from a KeysetPaginator.
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by seeking past the last row seen instead of using OFFSET.
+
+    The ordering must be unique (end it with the primary key) and should be backed by a
+    composite index, so every page costs one index range scan no matter how deep it is.
+    Items may be model instances or dicts from values().
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip("-") for name in self.ordering]
+
+    def page(self, cursor=None):
+        """
+        Return the page after (or before, for a previous-page cursor) the given cursor.
+        """
+        direction, values, queryset = self.page_queryset(cursor)
+        return self.build_page(list(queryset), direction, values)
+
+    async def apage(self, cursor=None):
+        """
+        Async version of page(), for views using the async ORM.
+        """
+        direction, values, queryset = self.page_queryset(cursor)
+        return self.build_page([item async for item in queryset], direction, values)
+
+    def page_queryset(self, cursor):
+        direction, values = self.decode_cursor(cursor) if cursor else ("next", None)
+        ordering = self.ordering if direction == "next" else self.reversed_ordering()
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.seek_filter(ordering, values))
+        # One extra row tells whether there is another page in this direction.
+        return direction, values, queryset[: self.per_page + 1]
+
+    def build_page(self, items, direction, values):
+        has_more = len(items) > self.per_page
+        items = items[: self.per_page]
+        if direction == "previous":
+            items.reverse()
+        if not items:
+            return KeysetPage(items, None, None)
+        if direction == "next":
+            next_cursor = self.encode_cursor("next", items[-1]) if has_more else None
+            previous_cursor = self.encode_cursor("previous", items[0]) if values is not None else None
+        else:
+            next_cursor = self.encode_cursor("next", items[-1])
+            previous_cursor = self.encode_cursor("previous", items[0]) if has_more else None
+        return KeysetPage(items, next_cursor, previous_cursor)
+
+    def reversed_ordering(self):
+        return tuple(name[1:] if name.startswith("-") else f"-{name}" for name in self.ordering)
+
+    def seek_filter(self, ordering, values):
+        """
+        Build the lexicographic "row comes after values" filter for the given ordering.
+        """
+        condition = Q()
+        equal = {}
+        for name, value in zip(ordering, values):
+            field = name.lstrip("-")
+            lookup = "lt" if name.startswith("-") else "gt"
+            condition |= Q(**equal, **{f"{field}__{lookup}": value})
+            equal[field] = value
+        return condition
+
+    def key_values(self, item):
+        if isinstance(item, dict):
+            return [item[field] for field in self.fields]
+        return [getattr(item, field) for field in self.fields]
+
+    def encode_cursor(self, direction, item):
+        payload = json.dumps([direction, self.key_values(item)], cls=CursorEncoder, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            direction, raw_values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if direction not in ("next", "previous") or len(raw_values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            model = self.queryset.model
+            values = [
+                model._meta.get_field(field).to_python(value) if field in self.model_fields() else value
+                for field, value in zip(self.fields, raw_values)
+            ]
+        except (ValueError, TypeError, binascii.Error, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+        return direction, values
+
+    def model_fields(self):
+        names = set()
+        for field in self.queryset.model._meta.concrete_fields:
+            names.update((field.name, field.attname))
+        return names
+
+
+def paginate_or_404(paginator, cursor):
+    """
+    Return paginator.page(cursor), turning a bad cursor into a 404 like Django's Paginator does.
+    """
+    try:
+        return paginator.page(cursor)
+    except InvalidCursor:
+        raise Http404("Invalid page cursor.")
+
+
+async def apaginate_or_404(paginator, cursor):
+    """
+    Async version of paginate_or_404().
+    """
+    try:
+        return await paginator.apage(cursor)
+    except InvalidCursor:
+        raise Http404("Invalid page cursor.")
+
+
+def estimated_row_count(model, using="default"):
+    """
+    Returns a cheap estimate of the model's table size, or None if the database has none.
+
+    PostgreSQL reads the planner's statistics; SQLite reads the largest primary key, an upper bound
+    that counts deleted rows too.
+    """
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+            row = cursor.fetchone()
+        # reltuples is -1 for a table that was never vacuumed or analyzed.
+        return int(row[0]) if row and row[0] >= 0 else None
+    if connection.vendor == "sqlite":
+        return model._default_manager.using(using).aggregate(largest=Max("pk"))["largest"] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for very large tables, which never counts more than exact_limit rows.
+
+    An unfiltered list larger than exact_limit reports the table's estimated size. A filtered list
+    is counted exactly up to exact_limit; past that the count stops there, so only the first
+    exact_limit rows get page links.
+    """
+
+    exact_limit = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.has_filters():
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.exact_limit:
+                return estimate
+        return queryset[: self.exact_limit].count()
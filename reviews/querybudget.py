@@ -0,0 +1,143 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger(__name__)
+
+# A statement shape repeated this many times within one request is reported as an N+1 suspect.
+N_PLUS_ONE_THRESHOLD = 3
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:\?|%s)(?:, ?(?:\?|%s))*\)", re.IGNORECASE)
+
+
+def sql_shape(sql):
+    """
+    Returns the SQL with literals and IN lists replaced by placeholders, so repeated statements compare equal.
+    """
+    shape = _STRING_LITERAL.sub("?", sql)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    return _IN_LIST.sub("IN (...)", shape)
+
+
+class QueryRecorder:
+    """
+    Context manager that records every statement run on any database connection.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated_shapes(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """
+        Returns {shape: count} for statement shapes run at least threshold times.
+        """
+        shapes = Counter(sql_shape(sql) for sql, _ in self.queries)
+        return {shape: count for shape, count in shapes.items() if count >= threshold}
+
+
+def get_budget(url_name):
+    """
+    Returns the configured query ceiling for a URL name, or None if it has no budget.
+    """
+    return getattr(settings, "QUERY_BUDGETS", {}).get(url_name)
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the queries each request runs and log them against the budget for its URL name.
+
+    Active when settings.QUERY_BUDGET_ENABLED is true (it defaults to DEBUG). Requests over budget
+    and statement shapes repeated within one request (likely N+1 queries) are logged as warnings.
+
+    Under ASGI requests pass through uncounted: the async ORM runs queries on worker threads whose
+    connections the recorder cannot wrap, and a sync-only middleware would push every request onto
+    a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "QUERY_BUDGET_ENABLED", settings.DEBUG)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        if not self.enabled:
+            return self.get_response(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        url_name = request.resolver_match.view_name if request.resolver_match else request.path
+        budget = get_budget(url_name)
+        logger.debug("%s ran %d queries in %.1f ms", url_name, recorder.count, recorder.duration * 1000)
+        if budget is not None and recorder.count > budget:
+            logger.warning("%s ran %d queries, over its budget of %d", url_name, recorder.count, budget)
+        for shape, count in recorder.repeated_shapes().items():
+            logger.warning("%s repeated a query %d times (possible N+1): %s", url_name, count, shape)
+        response["X-Query-Count"] = str(recorder.count)
+        return response
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin for asserting that a view stays within the query budget for its URL name.
+    """
+
+    def assertWithinQueryBudget(self, url_name, request, budget=None):
+        """
+        Run request() (for example lambda: self.client.get(url)) and fail if it exceeds the budget.
+        """
+        budget = get_budget(url_name) if budget is None else budget
+        if budget is None:
+            self.fail(f"No query budget configured for {url_name!r}")
+        with CaptureQueriesContext(connections["default"]) as captured:
+            response = request()
+        queries = [query["sql"] for query in captured.captured_queries]
+        self.assertLessEqual(
+            len(queries),
+            budget,
+            f"{url_name} ran {len(queries)} queries, over its budget of {budget}:\n" + "\n".join(queries),
+        )
+        return response
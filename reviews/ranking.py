@@ -0,0 +1,121 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+# Trending scores are stored as log(sum of exp(rate * (created - TRENDING_EPOCH)))), which is the decayed
+# review count shifted by a factor shared by every restaurant. The order never needs rescaling as time
+# passes, so a restaurant's score only changes when its reviews do, and the values stay small (about 36 per
+# year with a 7 day half-life).
+TRENDING_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+# Stored trending score of a restaurant without recent reviews (the log of zero).
+NO_TREND = -1.0e9
+
+# Reviews older than this many half-lives add less than a millionth each and are left out of compaction.
+TRENDING_HORIZON_HALF_LIVES = 20
+
+
+def decay_rate():
+    """
+    Returns the trending decay rate per second for settings.TRENDING_HALF_LIFE_DAYS.
+    """
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_DAYS * 86400)
+
+
+def trend_exponent(created):
+    """
+    Returns the log-space weight of a review created at the given time.
+    """
+    return decay_rate() * (created - TRENDING_EPOCH).total_seconds()
+
+
+def log_add(total, exponent):
+    """
+    Returns log(exp(total) + exp(exponent)) without overflow.
+    """
+    if total <= NO_TREND:
+        return exponent
+    high, low = max(total, exponent), min(total, exponent)
+    return high + math.log1p(math.exp(low - high))
+
+
+def trending_now(score, now=None):
+    """
+    Returns the decayed review count a stored trending score stands for at the given time.
+    """
+    if score <= NO_TREND:
+        return 0.0
+    return math.exp(score - trend_exponent(now or timezone.now()))
+
+
+def bayesian_score(rating_sum, review_count, prior_mean, prior_weight):
+    """
+    Returns the average rating shrunk towards the prior mean, as if prior_weight average reviews were added.
+    """
+    return (prior_weight * prior_mean + rating_sum) / (prior_weight + review_count)
+
+
+def compact(Restaurant, Review, RestaurantRanking, RankingPrior, using="default", batch_size=500):
+    """
+    Recompute the prior and every restaurant's ranking from the aggregates and recent reviews.
+
+    Takes the model classes so the initial migration can run it with historical models. Returns
+    (restaurants ranked, prior mean).
+    """
+    totals = Restaurant.objects.using(using).aggregate(rating_sum=Sum("rating_sum"), review_count=Sum("review_count"))
+    prior_weight = settings.RANKING_PRIOR_WEIGHT
+    prior_mean = (
+        totals["rating_sum"] / totals["review_count"] if totals["review_count"] else settings.RANKING_PRIOR_MEAN
+    )
+    RankingPrior.objects.using(using).update_or_create(pk=1, defaults={"mean": prior_mean, "weight": prior_weight})
+
+    restaurants = Restaurant.objects.using(using).order_by("pk").values_list("pk", "rating_sum", "review_count")
+    ranked = 0
+    batch = []
+    for row in restaurants.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            ranked += rank_batch(Review, RestaurantRanking, batch, prior_mean, prior_weight, using)
+            batch = []
+    if batch:
+        ranked += rank_batch(Review, RestaurantRanking, batch, prior_mean, prior_weight, using)
+    return ranked, prior_mean
+
+
+def rank_batch(Review, RestaurantRanking, batch, prior_mean, prior_weight, using="default"):
+    """
+    Recompute and store the rankings of a batch of (restaurant_id, rating_sum, review_count) rows.
+
+    The result only depends on the restaurants' current aggregates and reviews, so running it twice,
+    or late, is harmless.
+    """
+    horizon = timezone.now() - timedelta(days=settings.TRENDING_HALF_LIFE_DAYS * TRENDING_HORIZON_HALF_LIVES)
+    trending = {}
+    recent = Review.objects.using(using).filter(restaurant_id__in=[row[0] for row in batch], created__gte=horizon)
+    for restaurant_id, created in recent.values_list("restaurant_id", "created").iterator():
+        trending[restaurant_id] = log_add(trending.get(restaurant_id, NO_TREND), trend_exponent(created))
+    rankings = [
+        RestaurantRanking(
+            restaurant_id=restaurant_id,
+            bayesian_score=bayesian_score(rating_sum, review_count, prior_mean, prior_weight),
+            trending_score=trending.get(restaurant_id, NO_TREND),
+        )
+        for restaurant_id, rating_sum, review_count in batch
+    ]
+    with transaction.atomic(using=using):
+        RestaurantRanking.objects.using(using).bulk_create(
+            rankings,
+            update_conflicts=True,
+            unique_fields=["restaurant"],
+            update_fields=["bayesian_score", "trending_score"],
+        )
+    return len(rankings)
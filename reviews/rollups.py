@@ -0,0 +1,139 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+RATINGS = range(1, 6)
+
+# Downsampling periods of the statistics page: ?period= value -> (label, truncation of DailyRating.day).
+PERIODS = {
+    "day": ("Daily", None),
+    "week": ("Weekly", TruncWeek),
+    "month": ("Monthly", TruncMonth),
+}
+
+
+def review_day(created):
+    """
+    Returns the rollup day of a review created at the given time (a date in settings.TIME_ZONE).
+    """
+    return timezone.localdate(created)
+
+
+def day_range(day):
+    """
+    Returns the [start, end) datetimes of a rollup day.
+    """
+    return (
+        timezone.make_aware(datetime.combine(day, time.min)),
+        timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min)),
+    )
+
+
+def daily_totals(reviews):
+    """
+    Returns the rollup field values of the given reviews, grouped by restaurant and day.
+    """
+    return (
+        reviews.annotate(day=TruncDate("created"))
+        .order_by()
+        .values("restaurant_id", "day")
+        .annotate(
+            review_count=Count("id"),
+            rating_sum=Sum("rating"),
+            **{f"rating_{rating}_count": Count("id", filter=Q(rating=rating)) for rating in RATINGS},
+        )
+        .iterator()
+    )
+
+
+def refresh_days(DailyRating, Review, days, using="default"):
+    """
+    Recompute the rollups of the given (restaurant_id, day) pairs from the review table.
+
+    Each day is a range scan of the (restaurant, created) review index. Days left without reviews lose
+    their row. Returns the number of rollup rows written.
+    """
+    days = set(days)
+    if not days:
+        return 0
+    reviewed = Q()
+    for restaurant_id, day in days:
+        start, end = day_range(day)
+        reviewed |= Q(restaurant_id=restaurant_id, created__gte=start, created__lt=end)
+    rollups = [DailyRating(**row) for row in daily_totals(Review.objects.using(using).filter(reviewed))]
+    empty = Q()
+    for restaurant_id, day in days - {(rollup.restaurant_id, rollup.day) for rollup in rollups}:
+        empty |= Q(restaurant_id=restaurant_id, day=day)
+    with transaction.atomic(using=using):
+        if empty:
+            DailyRating.objects.using(using).filter(empty).delete()
+        DailyRating.objects.using(using).bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=["restaurant", "day"],
+            update_fields=["review_count", "rating_sum", *(f"rating_{rating}_count" for rating in RATINGS)],
+        )
+    return len(rollups)
+
+
+def rebuild(DailyRating, Review, restaurant_ids=None, using="default", batch_size=500):
+    """
+    Recompute the daily rollups from the review table, one batch of restaurants per transaction.
+
+    Takes the model classes so the migration can run it with historical models. Returns the number
+    of rollup rows written.
+    """
+    if restaurant_ids is None:
+        restaurant_ids = (
+            Review.objects.using(using).order_by("restaurant_id").values_list("restaurant_id", flat=True).distinct()
+        )
+        # Rollups of restaurants that lost all their reviews are removed too.
+        reviewed = Review.objects.using(using).values("restaurant_id")
+        DailyRating.objects.using(using).exclude(restaurant_id__in=reviewed).delete()
+    restaurant_ids = list(restaurant_ids)
+    written = 0
+    for start in range(0, len(restaurant_ids), batch_size):
+        batch = restaurant_ids[start : start + batch_size]
+        rollups = [
+            DailyRating(**row) for row in daily_totals(Review.objects.using(using).filter(restaurant_id__in=batch))
+        ]
+        with transaction.atomic(using=using):
+            DailyRating.objects.using(using).filter(restaurant_id__in=batch).delete()
+            DailyRating.objects.using(using).bulk_create(rollups, batch_size=1000)
+        written += len(rollups)
+    return written
+
+
+def rating_series(rollups, period="day"):
+    """
+    Returns the restaurant's rating history from its daily rollups, downsampled to the given period.
+
+    Each item is a dict with the period start, that period's review count and average, and the
+    cumulative average up to the end of the period. The database groups the rows, so this reads one
+    rollup row per day and returns one row per period.
+    """
+    truncate = PERIODS[period][1]
+    rollups = rollups.filter(review_count__gt=0).values(period=truncate("day") if truncate else F("day"))
+    rows = rollups.order_by("period").annotate(count=Sum("review_count"), total=Sum("rating_sum"))
+    series = []
+    running_count = running_total = 0
+    for row in rows:
+        running_count += row["count"]
+        running_total += row["total"]
+        series.append(
+            {
+                "period": row["period"],
+                "review_count": row["count"],
+                "average": row["total"] / row["count"] if row["count"] else None,
+                "cumulative_average": running_total / running_count if running_count else None,
+            }
+        )
+    return series
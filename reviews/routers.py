@@ -0,0 +1,124 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import Resolver404, resolve
+
+# Set for the duration of a request that may read from a replica; everything else (management commands,
+# the shell, write requests) reads from the primary.
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Allow (or with enabled=False, forbid) replica reads inside the block.
+    """
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def reading_from_replica():
+    """
+    Returns True when reads currently go to a replica.
+
+    Reads inside a transaction on the primary stay on the primary, so read-modify-write code sees its
+    own uncommitted rows.
+    """
+    return (
+        _replica_reads.get()
+        and bool(getattr(settings, "DATABASE_REPLICAS", []))
+        and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+    )
+
+
+def pinned_to_primary(request):
+    """
+    Returns True when the client wrote recently, so its reads must see the primary's data.
+    """
+    return settings.REPLICA_PIN_COOKIE in request.COOKIES
+
+
+class PrimaryReplicaRouter:
+    """
+    Send writes to the primary ("default") and, where allowed, reads to a random replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        if reading_from_replica():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the primary's rows, so objects from any alias may be related.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema from the primary.
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPinMiddleware:
+    """
+    Route a request's reads to a replica when its view allows it and the client has not written recently.
+
+    Views opt in with ``read_from_replica = True``. After a request with an unsafe method (a review
+    form, login, signup, the admin), the client gets a short-lived cookie that pins its reads to the
+    primary, so authors see their own writes even while the replicas lag behind.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(self.allows_replica(request)):
+            response = self.get_response(request)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        with replica_reads(self.allows_replica(request)):
+            response = await self.get_response(request)
+        return self.pin(request, response)
+
+    def allows_replica(self, request):
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            return False
+        if pinned_to_primary(request):
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return getattr(getattr(match.func, "view_class", None), "read_from_replica", False)
+
+    def pin(self, request, response):
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
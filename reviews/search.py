@@ -0,0 +1,265 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import re
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from .models import Restaurant, Review
+
+# Highlight markers put around matched terms by the database, swapped for <mark> after escaping.
+MARK_START, MARK_END = "\x02", "\x03"
+
+# Deepest result page served; ranked search pages by offset, so this keeps the worst case bounded.
+MAX_SEARCH_PAGE = 50
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(query):
+    """
+    Returns the words of a user query, ignoring punctuation and search-syntax characters.
+    """
+    return _WORD.findall(query)[:16]
+
+
+def highlight(snippet):
+    """
+    Returns the snippet as safe HTML, with matched terms wrapped in <mark>.
+    """
+    return mark_safe(escape(snippet).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>"))
+
+
+class SearchResults:
+    """
+    One page of ranked search results.
+    """
+
+    def __init__(self, restaurants, reviews, page, has_next):
+        self.restaurants = restaurants
+        self.reviews = reviews
+        self.page = page
+        self.has_next = has_next
+
+    @property
+    def has_previous(self):
+        return self.page > 1
+
+
+class SQLiteSearchBackend:
+    """
+    Ranked search over the FTS5 tables created by migration 0006.
+    """
+
+    def match_expression(self, terms):
+        # Every term must match; the last one also matches as a prefix, for search-as-you-type.
+        quoted = ['"' + term.replace('"', '""') + '"' for term in terms]
+        quoted[-1] += "*"
+        return " ".join(quoted)
+
+    def ranked_rows(self, sql, params, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def matching_restaurants(self, terms):
+        return RawSQL(
+            "SELECT rowid FROM reviews_restaurant_fts WHERE reviews_restaurant_fts MATCH %s",
+            [self.match_expression(terms)],
+        )
+
+    def matching_reviews(self, terms):
+        return RawSQL(
+            "SELECT rowid FROM reviews_review_fts WHERE reviews_review_fts MATCH %s", [self.match_expression(terms)]
+        )
+
+    def search_restaurants(self, terms, limit, using):
+        rows = self.ranked_rows(
+            "SELECT rowid FROM reviews_restaurant_fts WHERE reviews_restaurant_fts MATCH %s ORDER BY rank LIMIT %s",
+            [self.match_expression(terms), limit],
+            using,
+        )
+        return [row[0] for row in rows]
+
+    def search_reviews(self, terms, limit, offset, using):
+        rows = self.ranked_rows(
+            "SELECT rowid, snippet(reviews_review_fts, 0, %s, %s, '…', 16) FROM reviews_review_fts "
+            "WHERE reviews_review_fts MATCH %s ORDER BY rank LIMIT %s OFFSET %s",
+            [MARK_START, MARK_END, self.match_expression(terms), limit, offset],
+            using,
+        )
+        return [(row[0], row[1]) for row in rows]
+
+
+class PostgreSQLSearchBackend:
+    """
+    Ranked search using to_tsvector() expressions served by the GIN indexes from migration 0006.
+    """
+
+    config = "english"
+
+    def query(self, terms):
+        from django.contrib.postgres.search import SearchQuery
+
+        return SearchQuery(" & ".join(f"{term}:*" for term in terms), config=self.config, search_type="raw")
+
+    def matching_restaurants(self, terms):
+        from django.contrib.postgres.search import SearchVector
+
+        vector = SearchVector("name", config=self.config)
+        return Restaurant.objects.annotate(search=vector).filter(search=self.query(terms)).values("id")
+
+    def matching_reviews(self, terms):
+        from django.contrib.postgres.search import SearchVector
+
+        vector = SearchVector("body", config=self.config)
+        return Review.objects.annotate(search=vector).filter(search=self.query(terms)).values("id")
+
+    def search_restaurants(self, terms, limit, using):
+        from django.contrib.postgres.search import SearchRank, SearchVector
+
+        vector = SearchVector("name", config=self.config)
+        query = self.query(terms)
+        return list(
+            Restaurant.objects.using(using)
+            .visible()
+            .annotate(search=vector, rank=SearchRank(vector, query))
+            .filter(search=query)
+            .order_by("-rank", "id")
+            .values_list("id", flat=True)[:limit]
+        )
+
+    def search_reviews(self, terms, limit, offset, using):
+        from django.contrib.postgres.search import SearchHeadline, SearchRank, SearchVector
+
+        vector = SearchVector("body", config=self.config)
+        query = self.query(terms)
+        rows = (
+            Review.objects.using(using)
+            .annotate(
+                search=vector,
+                rank=SearchRank(vector, query),
+                snippet=SearchHeadline(
+                    "body", query, config=self.config, start_sel=MARK_START, stop_sel=MARK_END, max_words=16
+                ),
+            )
+            .filter(search=query)
+            .order_by("-rank", "id")
+            .values_list("id", "snippet")[offset : offset + limit]
+        )
+        return list(rows)
+
+
+class SubstringSearchBackend:
+    """
+    Fallback for databases without a search index: every term must be a case-insensitive substring.
+
+    The matches are unranked, restaurants by name and reviews newest first, and each query scans the table.
+    """
+
+    snippet_length = 120
+
+    def condition(self, field, terms):
+        return Q(*(Q(**{f"{field}__icontains": term}) for term in terms))
+
+    def matching_restaurants(self, terms):
+        return Restaurant.objects.filter(self.condition("name", terms)).values("id")
+
+    def matching_reviews(self, terms):
+        return Review.objects.filter(self.condition("body", terms)).values("id")
+
+    def search_restaurants(self, terms, limit, using):
+        restaurants = Restaurant.objects.using(using).visible().filter(self.condition("name", terms))
+        return list(restaurants.order_by("name", "id").values_list("id", flat=True)[:limit])
+
+    def search_reviews(self, terms, limit, offset, using):
+        reviews = Review.objects.using(using).filter(self.condition("body", terms)).order_by("-id")
+        return [
+            (pk, self.snippet(body, terms)) for pk, body in reviews.values_list("id", "body")[offset : offset + limit]
+        ]
+
+    def snippet(self, body, terms):
+        """
+        Returns the part of body around the first match, with the terms between the highlight markers.
+        """
+        pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+        match = pattern.search(body)
+        start = max(0, match.start() - self.snippet_length // 2) if match else 0
+        stop = start + self.snippet_length
+        text = pattern.sub(lambda found: MARK_START + found.group(0) + MARK_END, body[start:stop])
+        return ("…" if start else "") + text + ("…" if stop < len(body) else "")
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgreSQLSearchBackend,
+}
+
+
+def get_backend(using="default"):
+    """
+    Returns the search backend for the database vendor behind the given alias, falling back to
+    substring matching on databases without one.
+    """
+    return BACKENDS.get(connections[using].vendor, SubstringSearchBackend)()
+
+
+def filter_restaurants(queryset, query):
+    """
+    Returns the restaurants of a queryset whose name matches the query, using the search index.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+    return queryset.filter(pk__in=get_backend(queryset.db).matching_restaurants(terms))
+
+
+def filter_reviews(queryset, query):
+    """
+    Returns the reviews of a queryset whose body or restaurant name matches the query, using the search
+    indexes, or whose author's username is exactly the query.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+    backend = get_backend(queryset.db)
+    return queryset.filter(
+        Q(pk__in=backend.matching_reviews(terms))
+        | Q(restaurant_id__in=backend.matching_restaurants(terms))
+        | Q(user_id__in=User.objects.filter(username=query.strip()).values("pk"))
+    )
+
+
+def search(query, page=1, per_page=20, restaurant_limit=10, using="default"):
+    """
+    Search restaurant names and review bodies, returning one page of ranked results.
+
+    Restaurants are only listed on the first page; reviews are paginated. Each backend reads from an
+    inverted index, so the cost depends on the number of matches returned rather than the table size.
+    """
+    terms = search_terms(query)
+    page = max(1, min(page, MAX_SEARCH_PAGE))
+    if not terms:
+        return SearchResults([], [], page, False)
+    backend = get_backend(using)
+    restaurants = []
+    if page == 1:
+        ids = backend.search_restaurants(terms, restaurant_limit, using)
+        found = Restaurant.objects.using(using).visible().in_bulk(ids)
+        restaurants = [found[pk] for pk in ids if pk in found]
+    rows = backend.search_reviews(terms, per_page + 1, (page - 1) * per_page, using)
+    has_next = len(rows) > per_page and page < MAX_SEARCH_PAGE
+    rows = rows[:per_page]
+    found = Review.objects.using(using).select_related("restaurant", "user").in_bulk([pk for pk, _ in rows])
+    reviews = []
+    for pk, snippet in rows:
+        if pk in found and found[pk].restaurant.deleted is None:
+            found[pk].snippet = highlight(snippet)
+            reviews.append(found[pk])
+    return SearchResults(restaurants, reviews, page, has_next)
@@ -0,0 +1,96 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.contrib.auth.models import User
+from .models import Job, Restaurant, RestaurantRanking, Review, ReviewerStats, reviewer_deltas
+from .caching import RESTAURANT_NAMES_VERSION, invalidate, invalidate_restaurants
+
+
+@receiver(post_save, sender=Review)
+def update_aggregates_on_save(sender, instance, created, using, **kwargs):
+    """
+    Add a new review to its restaurant's aggregates, or move an edited review's rating.
+
+    The restaurant's ranking and daily rollup are recomputed by queued jobs (reviews.jobs).
+    """
+    restaurants = Restaurant.objects.using(using)
+    jobs = Job.objects.using(using)
+    if created:
+        restaurants.apply_rating_delta(instance.restaurant_id, instance.rating, 1)
+        jobs.enqueue_review_jobs([(instance.restaurant_id, instance.created)])
+    elif not hasattr(instance, "_stored_rating") or instance._stored_rating is None:
+        # The instance was not loaded from the database, so the old rating is unknown.
+        affected = {instance.restaurant_id, getattr(instance, "_stored_restaurant_id", None)} - {None}
+        restaurants.filter(pk__in=affected).recompute_aggregates()
+        restaurants.filter(pk__in=affected).update(updated=timezone.now())
+        jobs.enqueue_review_jobs((restaurant_id, instance.created) for restaurant_id in affected)
+    elif instance._stored_restaurant_id == instance.restaurant_id:
+        restaurants.move_rating(instance.restaurant_id, instance._stored_rating, instance.rating)
+        if instance._stored_rating != instance.rating:
+            jobs.enqueue_review_jobs([(instance.restaurant_id, instance.created)])
+    else:
+        restaurants.apply_rating_delta(instance._stored_restaurant_id, instance._stored_rating, -1)
+        restaurants.apply_rating_delta(instance.restaurant_id, instance.rating, 1)
+        jobs.enqueue_review_jobs(
+            [(instance._stored_restaurant_id, instance.created), (instance.restaurant_id, instance.created)]
+        )
+    invalidate_restaurants({instance.restaurant_id, getattr(instance, "_stored_restaurant_id", None)} - {None})
+    update_reviewer_stats(instance, created, using)
+    instance.remember_aggregate_state()
+
+
+def update_reviewer_stats(instance, created, using):
+    """
+    Apply a saved review to its author's statistics, touching them even when only the body changed.
+    """
+    stats = ReviewerStats.objects.using(using)
+    stored_rating = getattr(instance, "_stored_rating", None)
+    stored_user_id = getattr(instance, "_stored_user_id", None)
+    if created:
+        stats.apply_deltas({instance.user_id: (1, instance.rating)})
+    elif stored_rating is None or stored_user_id is None:
+        stats.recompute({instance.user_id, stored_user_id} - {None})
+    else:
+        changes = [(stored_user_id, stored_rating, -1), (instance.user_id, instance.rating, 1)]
+        stats.apply_deltas(reviewer_deltas(changes))
+
+
+@receiver(post_delete, sender=Review)
+def update_aggregates_on_delete(sender, instance, using, origin=None, **kwargs):
+    """
+    Remove a deleted review from its restaurant's and its author's aggregates.
+    """
+    rating = getattr(instance, "_stored_rating", None) or instance.rating
+    restaurant_id = getattr(instance, "_stored_restaurant_id", None) or instance.restaurant_id
+    Restaurant.objects.using(using).apply_rating_delta(restaurant_id, rating, -1)
+    # When the author is being deleted, their statistics go too; recreating them would break the cascade.
+    if not isinstance(origin, User) and getattr(origin, "model", None) is not User:
+        user_id = getattr(instance, "_stored_user_id", None) or instance.user_id
+        ReviewerStats.objects.using(using).apply_deltas({user_id: (-1, -rating)})
+    Job.objects.using(using).enqueue_review_jobs([(restaurant_id, instance.created)])
+    invalidate_restaurants([restaurant_id])
+
+
+@receiver(post_save, sender=Restaurant)
+def create_ranking(sender, instance, created, using, **kwargs):
+    """
+    Give a new restaurant its ranking row, so it shows up in the ranked lists before its first review.
+    """
+    if created:
+        RestaurantRanking.objects.using(using).recompute([instance.pk])
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def invalidate_restaurant_pages(sender, instance, **kwargs):
+    """
+    Invalidate the cached pages showing a restaurant that was saved or deleted, and the name index.
+    """
+    invalidate_restaurants([instance.pk])
+    invalidate(RESTAURANT_NAMES_VERSION)
@@ -0,0 +1,135 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+# Item-item collaborative filtering. Each restaurant is a column of the sparse user x restaurant rating
+# matrix; two restaurants are similar when the same users rated both, and rated them alike:
+#
+#   score(a, b) = cosine(column a, column b) * n / (n + SIMILARITY_SHRINKAGE)
+#
+# where n is the number of users who reviewed both, so a couple of shared reviewers count for less
+# than hundreds. Similarities are computed a batch of restaurants at a time with sparse matrix
+# products, and the top SIMILAR_RESTAURANTS of each are stored in SimilarRestaurant.
+
+
+def rating_matrix(rows):
+    """
+    Returns (matrix, restaurant_ids): the CSR user x restaurant matrix of (user_id, restaurant_id, rating)
+    rows, and the sorted restaurant ids of its columns.
+
+    A user's several reviews of one restaurant make one entry, the root of the sum of their squared
+    ratings, so each column's norm is still the one recompute() derives from the rating histogram.
+    """
+    triples = np.fromiter((value for row in rows for value in row), dtype=np.int64).reshape(-1, 3)
+    _, user_index = np.unique(triples[:, 0], return_inverse=True)
+    restaurant_ids, restaurant_index = np.unique(triples[:, 1], return_inverse=True)
+    shape = (int(user_index.max(initial=-1)) + 1, len(restaurant_ids))
+    squares = triples[:, 2].astype(np.float32) ** 2
+    # Converting to CSR sums the entries of duplicate (user, restaurant) pairs.
+    matrix = sparse.csr_matrix((squares, (user_index, restaurant_index)), shape=shape)
+    matrix.data = np.sqrt(matrix.data)
+    return matrix, restaurant_ids
+
+
+def column_norms(matrix):
+    """
+    Returns the Euclidean norm of every column.
+    """
+    return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+
+
+def top_neighbours(matrix, norms, targets, limit):
+    """
+    Returns (neighbours, scores): for each target column, the indexes and scores of its best scoring
+    other columns, best first. Rows are padded with -1 and 0 where fewer columns score above zero.
+    """
+    columns = matrix.tocsc()[:, targets]
+    binary = matrix.copy()
+    binary.data[:] = 1
+    dots = (columns.T @ matrix).toarray()
+    common = (binary.tocsc()[:, targets].T @ binary).toarray()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = dots / np.outer(norms[targets], norms) * common / (common + settings.SIMILARITY_SHRINKAGE)
+    scores[~np.isfinite(scores) | (common < settings.SIMILARITY_MIN_COMMON_REVIEWERS)] = 0
+    scores[np.arange(len(targets)), targets] = 0
+    limit = min(limit, scores.shape[1])
+    if limit == 0:
+        return np.empty((len(targets), 0), dtype=np.int64), np.empty((len(targets), 0))
+    best = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    best, best_scores = np.take_along_axis(best, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+    best[best_scores <= 0] = -1
+    return best, best_scores
+
+
+def store(SimilarRestaurant, restaurant_ids, rows, using="default"):
+    """
+    Replace the stored neighbours of the given restaurants with (restaurant_id, similar_id, score) rows.
+    """
+    with transaction.atomic(using=using):
+        SimilarRestaurant.objects.using(using).filter(restaurant_id__in=restaurant_ids).delete()
+        SimilarRestaurant.objects.using(using).bulk_create(
+            SimilarRestaurant(restaurant_id=restaurant_id, similar_id=similar_id, score=score)
+            for restaurant_id, similar_id, score in rows
+        )
+
+
+def _neighbour_rows(matrix, norms, column_ids, targets, limit):
+    neighbours, scores = top_neighbours(matrix, norms, targets, limit)
+    for target, row, row_scores in zip(targets, neighbours, scores):
+        for column, score in zip(row, row_scores):
+            if column >= 0:
+                yield int(column_ids[target]), int(column_ids[column]), float(score)
+
+
+def rebuild(SimilarRestaurant, Review, using="default", batch_size=500):
+    """
+    Recompute every restaurant's neighbours from one rating matrix of the whole review table.
+
+    Returns the number of neighbour rows stored.
+    """
+    reviews = Review.objects.using(using).order_by().values_list("user_id", "restaurant_id", "rating")
+    matrix, restaurant_ids = rating_matrix(reviews.iterator(chunk_size=10_000))
+    norms = column_norms(matrix)
+    stored = 0
+    for start in range(0, len(restaurant_ids), batch_size):
+        targets = np.arange(start, min(start + batch_size, len(restaurant_ids)))
+        rows = list(_neighbour_rows(matrix, norms, restaurant_ids, targets, settings.SIMILAR_RESTAURANTS))
+        store(SimilarRestaurant, [int(restaurant_id) for restaurant_id in restaurant_ids[targets]], rows, using)
+        stored += len(rows)
+    # Restaurants whose reviews are all gone keep no neighbours.
+    SimilarRestaurant.objects.using(using).exclude(restaurant__reviews__isnull=False).delete()
+    return stored
+
+
+def recompute(SimilarRestaurant, Restaurant, Review, restaurant_ids, using="default"):
+    """
+    Recompute the neighbours of the given restaurants from the reviews of their reviewers only.
+
+    Every restaurant sharing a reviewer with a target is in that slice with all its shared ratings, so
+    the dot products are exact; the norms come from the restaurants' stored rating histograms.
+    Returns the number of neighbour rows stored.
+    """
+    restaurant_ids = sorted(set(restaurant_ids))
+    reviewers = Review.objects.using(using).filter(restaurant_id__in=restaurant_ids).values("user_id")
+    reviews = Review.objects.using(using).filter(user_id__in=reviewers).order_by()
+    matrix, column_ids = rating_matrix(reviews.values_list("user_id", "restaurant_id", "rating").iterator())
+    histograms = Restaurant.objects.using(using).filter(pk__in=column_ids.tolist())
+    squares = {
+        pk: sum(rating * rating * count for rating, count in enumerate(counts, start=1))
+        for pk, *counts in histograms.values_list("pk", *(f"rating_{rating}_count" for rating in range(1, 6)))
+    }
+    norms = np.sqrt(np.array([squares.get(int(pk), 0) for pk in column_ids], dtype=np.float64))
+    known = set(column_ids.tolist())
+    targets = np.searchsorted(column_ids, [pk for pk in restaurant_ids if pk in known])
+    rows = list(_neighbour_rows(matrix, norms, column_ids, targets, settings.SIMILAR_RESTAURANTS))
+    store(SimilarRestaurant, restaurant_ids, rows, using)
+    return len(rows)
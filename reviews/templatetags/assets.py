@@ -0,0 +1,32 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+from functools import cache
+from django import template
+from django.contrib.staticfiles import finders
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+@cache
+def read_static(path):
+    """
+    Returns the text of a static file, read once per process.
+    """
+    absolute = finders.find(path)
+    if absolute is None:
+        raise template.TemplateSyntaxError(f"Static file {path!r} not found; run python manage.py build_assets.")
+    with open(absolute, encoding="utf-8") as file:
+        return file.read()
+
+
+@register.simple_tag
+def inline_static(path):
+    """
+    Inline a static file into the page, for the critical CSS in base.html.
+    """
+    return mark_safe(read_static(path))
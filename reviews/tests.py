@@ -4,11 +4,47 @@ CIS 218: Django Project
 Date: October 10, 2024
 """
 
-from django.test import TestCase, Client
+import json
+import math
+import os
+import random
+import runpy
+import sqlite3
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import TestCase, SimpleTestCase, TransactionTestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import Restaurant, Review
-from django.core.exceptions import ValidationError
+from . import assets, geo, ranking, typeahead, warmup
+from .api import JsonApiView
+from .caching import CATALOG_VERSION, RESTAURANT_NAMES_VERSION, get_versions
+from .dbtuning import tune_connection
+from .jobs import HANDLERS, run_batch, run_pending
+from .models import (
+    DELETE_RESTAURANT_JOB,
+    SIMILARITY_JOB,
+    DailyRating,
+    Job,
+    Restaurant,
+    RestaurantRanking,
+    Review,
+    ReviewerStats,
+    SimilarRestaurant,
+)
+from .pagination import EstimatedCountPaginator, KeysetPaginator, estimated_row_count
+from .search import filter_reviews, search
+from .querybudget import QueryBudgetTestMixin, QueryRecorder, sql_shape
+from .routers import PrimaryReplicaRouter, ReplicaPinMiddleware, replica_reads
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import call_command, CommandError
+from django.core.cache import cache
+from django.db import connection, connections
 
 
 class ModelTests(TestCase):
@@ -148,3 +184,1583 @@ class FormTests(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertFalse(Review.objects.exists())
+
+
+class AggregateTests(TestCase):
+    """Test denormalized rating aggregates"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+        cls.other = Restaurant.objects.create(name="Other Restaurant")
+
+    def assertAggregates(self, restaurant, count, total, histogram):
+        restaurant.refresh_from_db()
+        self.assertEqual(restaurant.review_count, count)
+        self.assertEqual(restaurant.rating_sum, total)
+        self.assertEqual(
+            [
+                restaurant.rating_1_count,
+                restaurant.rating_2_count,
+                restaurant.rating_3_count,
+                restaurant.rating_4_count,
+                restaurant.rating_5_count,
+            ],
+            histogram,
+        )
+
+    def test_create_update_delete(self):
+        """Test aggregates follow single review writes"""
+
+        review = Review.objects.create(restaurant=self.restaurant, user=self.user, rating=4, body="Good")
+        Review.objects.create(restaurant=self.restaurant, user=self.user, rating=2, body="Meh")
+        self.assertAggregates(self.restaurant, 2, 6, [0, 1, 0, 1, 0])
+        self.assertEqual(self.restaurant.average_rating(), 3)
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 5
+        review.save()
+        self.assertAggregates(self.restaurant, 2, 7, [0, 1, 0, 0, 1])
+
+        review.restaurant = self.other
+        review.save()
+        self.assertAggregates(self.restaurant, 1, 2, [0, 1, 0, 0, 0])
+        self.assertAggregates(self.other, 1, 5, [0, 0, 0, 0, 1])
+
+        review.delete()
+        self.assertAggregates(self.other, 0, 0, [0, 0, 0, 0, 0])
+
+    def test_bulk_paths(self):
+        """Test aggregates follow bulk_create, update and queryset delete"""
+
+        Review.objects.bulk_create(
+            [Review(restaurant=self.restaurant, user=self.user, rating=rating, body="Bulk") for rating in (1, 3, 3)]
+        )
+        self.assertAggregates(self.restaurant, 3, 7, [1, 0, 2, 0, 0])
+        Review.objects.filter(rating=3).update(rating=4)
+        self.assertAggregates(self.restaurant, 3, 9, [1, 0, 0, 2, 0])
+        Review.objects.filter(rating=4).delete()
+        self.assertAggregates(self.restaurant, 1, 1, [1, 0, 0, 0, 0])
+
+    def test_stale_save_keeps_aggregates(self):
+        """Test saving a restaurant loaded before a review was posted keeps the newer aggregates"""
+
+        stale = Restaurant.objects.get(pk=self.restaurant.pk)
+        Review.objects.create(restaurant=self.restaurant, user=self.user, rating=5, body="Great")
+        stale.name = "Renamed Restaurant"
+        stale.save()
+        self.assertAggregates(self.restaurant, 1, 5, [0, 0, 0, 0, 1])
+        self.assertEqual(self.restaurant.name, "Renamed Restaurant")
+
+    def test_views_update_aggregates(self):
+        """Test aggregates follow the review views"""
+
+        self.client.login(username="testuser", password="12345")
+        self.client.post(reverse("add_review", args=[self.restaurant.id]), {"rating": 4, "body": "Great place!"})
+        review = Review.objects.get()
+        self.client.post(reverse("update_review", args=[review.id]), {"rating": 2, "body": "Worse"})
+        self.assertAggregates(self.restaurant, 1, 2, [0, 1, 0, 0, 0])
+        self.client.post(reverse("delete_review", args=[review.id]))
+        self.assertAggregates(self.restaurant, 0, 0, [0, 0, 0, 0, 0])
+
+    def test_recompute_command(self):
+        """Test the recompute_ratings command detects and fixes drift"""
+
+        Review.objects.create(restaurant=self.restaurant, user=self.user, rating=5, body="Great")
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(review_count=10)
+        with self.assertRaises(CommandError):
+            call_command("recompute_ratings", "--check", stdout=StringIO())
+        call_command("recompute_ratings", stdout=StringIO())
+        self.assertAggregates(self.restaurant, 1, 5, [0, 0, 0, 0, 1])
+        call_command("recompute_ratings", "--check", stdout=StringIO())
+
+
+class PaginationTests(TestCase):
+    """Test keyset pagination"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+        Restaurant.objects.bulk_create([Restaurant(name=f"Place {i:02}") for i in range(30)])
+        Review.objects.bulk_create(
+            [Review(restaurant=cls.restaurant, user=cls.user, rating=3, body=f"Review {i}") for i in range(25)]
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_paginator_walks_forward_and_back(self):
+        """Test pages cover every row once in both directions"""
+
+        paginator = KeysetPaginator(Restaurant.objects.all(), ("name", "id"), 7)
+        seen = []
+        page = paginator.page()
+        self.assertFalse(page.has_previous())
+        while True:
+            seen += [restaurant.name for restaurant in page]
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(seen, list(Restaurant.objects.values_list("name", flat=True)))
+        previous = paginator.page(page.previous_cursor)
+        self.assertEqual([restaurant.name for restaurant in previous], seen[-10:-3])
+
+    def test_home_view_pages(self):
+        """Test home view pagination"""
+
+        response = self.client.get(reverse("home"))
+        self.assertEqual(len(response.context["restaurants"]), 24)
+        response = self.client.get(reverse("home"), {"cursor": response.context["page_obj"].next_cursor})
+        self.assertEqual(len(response.context["restaurants"]), 7)
+        self.assertEqual(self.client.get(reverse("home"), {"cursor": "garbage"}).status_code, 404)
+
+    def test_restaurant_detail_pages_reviews(self):
+        """Test restaurant detail review pagination"""
+
+        response = self.client.get(reverse("restaurant_detail", args=[self.restaurant.id]))
+        first = response.context["reviews"]
+        self.assertEqual(len(first), 20)
+        response = self.client.get(
+            reverse("restaurant_detail", args=[self.restaurant.id]),
+            {"cursor": response.context["reviews_page"].next_cursor},
+        )
+        second = response.context["reviews"]
+        self.assertEqual(len(second), 5)
+        self.assertFalse({review.pk for review in first} & {review.pk for review in second})
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Test every reviews view stays within its query budget"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        others = User.objects.bulk_create([User(username=f"user{i}") for i in range(10)])
+        Restaurant.objects.bulk_create([Restaurant(name=f"Place {i:02}") for i in range(30)])
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+        Review.objects.bulk_create(
+            [Review(restaurant=cls.restaurant, user=others[i % 10], rating=4, body="Fine") for i in range(30)]
+        )
+        cls.review = Review.objects.create(restaurant=cls.restaurant, user=cls.user, rating=3, body="Good")
+
+    def setUp(self):
+        self.client.login(username="testuser", password="12345")
+
+    def test_read_views(self):
+        """Test read views budgets"""
+
+        self.assertWithinQueryBudget("home", lambda: self.client.get(reverse("home")))
+        self.assertWithinQueryBudget(
+            "restaurant_detail", lambda: self.client.get(reverse("restaurant_detail", args=[self.restaurant.id]))
+        )
+        self.assertWithinQueryBudget(
+            "review_detail", lambda: self.client.get(reverse("review_detail", args=[self.review.id]))
+        )
+
+    def test_write_views(self):
+        """Test write views budgets"""
+
+        self.assertWithinQueryBudget(
+            "add_review", lambda: self.client.get(reverse("add_review", args=[self.restaurant.id]))
+        )
+        self.assertWithinQueryBudget(
+            "add_review",
+            lambda: self.client.post(reverse("add_review", args=[self.restaurant.id]), {"rating": 4, "body": "Yum"}),
+        )
+        self.assertWithinQueryBudget(
+            "update_review", lambda: self.client.get(reverse("update_review", args=[self.review.id]))
+        )
+        self.assertWithinQueryBudget(
+            "update_review",
+            lambda: self.client.post(reverse("update_review", args=[self.review.id]), {"rating": 5, "body": "Yes"}),
+        )
+        self.assertWithinQueryBudget(
+            "delete_review", lambda: self.client.get(reverse("delete_review", args=[self.review.id]))
+        )
+        self.assertWithinQueryBudget(
+            "delete_review", lambda: self.client.post(reverse("delete_review", args=[self.review.id]))
+        )
+
+    def test_recorder_flags_repeated_shapes(self):
+        """Test N+1 detection"""
+
+        with QueryRecorder() as recorder:
+            for review in Review.objects.all()[:5]:
+                review.user.username
+        self.assertEqual(recorder.count, 6)
+        self.assertEqual(len(recorder.repeated_shapes()), 1)
+        self.assertEqual(
+            sql_shape("SELECT 1 FROM t WHERE a = 'x' AND b IN (1, 2)"), "SELECT ? FROM t WHERE a = ? AND b IN (...)"
+        )
+
+
+class CacheTests(TestCase):
+    """Test versioned fragment caching"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(CACHES={"default": settings.CACHE_BACKENDS["locmem"]})
+    def test_cached_pages_skip_the_database(self):
+        """Test a cache hit renders without queries"""
+
+        for url in (reverse("home"), reverse("restaurant_detail", args=[self.restaurant.id])):
+            self.client.get(url)
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertContains(response, "Test Restaurant")
+
+    @override_settings(CACHES={"default": settings.CACHE_BACKENDS["locmem"]})
+    def test_cached_validators(self):
+        """Test a cache hit answers conditional GETs from the validators stored with the fragment"""
+
+        url = reverse("restaurant_detail", args=[self.restaurant.id])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response["ETag"], etag)
+        Review.objects.create(restaurant=self.restaurant, user=self.user, rating=4, body="Tasty noodles")
+        self.assertEqual(self.client.get(url, headers={"if-none-match": etag}).status_code, 200)
+
+    def test_writes_invalidate_pages(self):
+        """Test review and restaurant writes invalidate cached pages"""
+
+        detail = reverse("restaurant_detail", args=[self.restaurant.id])
+        self.assertContains(self.client.get(detail), "No reviews yet")
+        self.assertContains(self.client.get(reverse("home")), "No ratings yet")
+        Review.objects.create(restaurant=self.restaurant, user=self.user, rating=4, body="Tasty noodles")
+        self.assertContains(self.client.get(detail), "Tasty noodles")
+        self.assertContains(self.client.get(reverse("home")), "Average rating: 4.0")
+        self.restaurant.name = "Renamed Restaurant"
+        self.restaurant.save()
+        self.assertContains(self.client.get(reverse("home")), "Renamed Restaurant")
+
+    def test_user_specific_parts_stay_uncached(self):
+        """Test the nav bar is rendered per user around a cached fragment"""
+
+        self.client.get(reverse("home"))
+        self.client.login(username="testuser", password="12345")
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, "Welcome, testuser")
+        self.assertContains(response, "Test Restaurant")
+
+
+class ConditionalGetTests(TestCase):
+    """Test ETag / Last-Modified handling"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+        cls.review = Review.objects.create(restaurant=cls.restaurant, user=cls.user, rating=4, body="Good")
+
+    def test_not_modified(self):
+        """Test matching validators return 304 after at most a single query"""
+
+        # The restaurant page's validators are cached with its fragment.
+        for url, queries in (
+            (reverse("restaurant_detail", args=[self.restaurant.id]), 0),
+            (reverse("review_detail", args=[self.review.id]), 1),
+        ):
+            response = self.client.get(url)
+            self.assertTrue(response.has_header("ETag"))
+            self.assertTrue(response.has_header("Last-Modified"))
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, headers={"if-none-match": response["ETag"]})
+            self.assertEqual(response.status_code, 304)
+
+    def test_review_edit_changes_etag(self):
+        """Test a review edit changes both pages' validators"""
+
+        detail = reverse("restaurant_detail", args=[self.restaurant.id])
+        etag = self.client.get(detail)["ETag"]
+        review = Review.objects.get(pk=self.review.pk)
+        review.body = "Edited"
+        review.save()
+        response = self.client.get(detail, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Edited")
+
+    def test_etag_varies_by_user(self):
+        """Test the logged-in user gets a different ETag"""
+
+        url = reverse("review_detail", args=[self.review.id])
+        etag = self.client.get(url)["ETag"]
+        self.client.login(username="testuser", password="12345")
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Update Review")
+
+    def test_missing_object_is_404(self):
+        """Test validators for missing objects fall through to 404"""
+
+        self.assertEqual(self.client.get(reverse("restaurant_detail", args=[999])).status_code, 404)
+
+
+class SearchTests(QueryBudgetTestMixin, TestCase):
+    """Test full-text search"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.noodles = Restaurant.objects.create(name="Noodle House")
+        cls.tacos = Restaurant.objects.create(name="Taco Stand")
+        Review.objects.create(
+            restaurant=cls.tacos, user=cls.user, rating=5, body="Best noodles outside the noodle house"
+        )
+        Review.objects.create(restaurant=cls.tacos, user=cls.user, rating=4, body="Crispy café tacos")
+
+    def test_search_finds_names_and_bodies(self):
+        """Test search matches restaurant names and review bodies"""
+
+        results = search("noodle")
+        self.assertEqual(results.restaurants, [self.noodles])
+        self.assertEqual(len(results.reviews), 1)
+        self.assertIn("<mark>", results.reviews[0].snippet)
+
+    def test_index_follows_writes(self):
+        """Test the index follows updates, deletes and accent folding"""
+
+        self.assertEqual(len(search("cafe").reviews), 1)
+        self.tacos.name = "Burrito Stand"
+        self.tacos.save()
+        self.assertEqual(search("burrito").restaurants, [self.tacos])
+        self.assertEqual(search("taco").restaurants, [])
+        Review.objects.filter(body__contains="tacos").delete()
+        self.assertEqual(search("crispy").reviews, [])
+
+    def test_search_view(self):
+        """Test search view"""
+
+        response = self.assertWithinQueryBudget("search", lambda: self.client.get(reverse("search"), {"q": "noodle"}))
+        self.assertContains(response, "Noodle House")
+        self.assertContains(self.client.get(reverse("search"), {"q": '"(*'}), "No matching reviews")
+
+    def test_substring_fallback(self):
+        """Test databases without a search backend fall back to substring matches"""
+
+        with mock.patch.object(connection, "vendor", "mysql"):
+            results = search("NOODLE")
+            self.assertEqual(results.restaurants, [self.noodles])
+            self.assertEqual(
+                str(results.reviews[0].snippet), "Best <mark>noodle</mark>s outside the <mark>noodle</mark> house"
+            )
+            self.assertEqual(list(filter_reviews(Review.objects.all(), "crispy tacos")), [Review.objects.get(rating=4)])
+
+
+class ImportReviewsTests(TestCase):
+    """Test the import_reviews command"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+
+    def write_input(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, "w") as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_jsonl(self):
+        """Test JSONL import validates rows and keeps derived state consistent"""
+
+        path = self.write_input(
+            ".jsonl",
+            "\n".join(
+                [
+                    '{"restaurant": "Test Restaurant", "user": "testuser", "rating": 5, "body": "Superb ramen",'
+                    ' "created": "2020-01-02T03:04:05"}',
+                    '{"restaurant": "Test Restaurant", "user": "testuser", "rating": 9, "body": "Too high"}',
+                    '{"restaurant": "Test Restaurant", "user": "testuser", "rating": 4.5, "body": "Fractional"}',
+                    '{"restaurant": "Test Restaurant", "user": "testuser", "rating": true, "body": "Boolean"}',
+                    '{"restaurant": "Test Restaurant", "user": "nobody", "rating": 3, "body": "Unknown user"}',
+                    "not json",
+                    '{"restaurant": "New Place", "user": "testuser", "rating": 2, "body": "Cold"}',
+                ]
+            ),
+        )
+        out = StringIO()
+        names_version = get_versions(RESTAURANT_NAMES_VERSION)
+        call_command("import_reviews", path, "--batch-size", "2", "--create-restaurants", stdout=out, stderr=StringIO())
+        self.assertIn("Imported 2 reviews", out.getvalue())
+        self.assertIn("5 row(s) rejected", out.getvalue())
+        review = Review.objects.get(body="Superb ramen")
+        self.assertEqual((review.created.year, review.updated.year), (2020, 2020))
+        self.restaurant.refresh_from_db()
+        self.assertEqual((self.restaurant.review_count, self.restaurant.rating_sum), (1, 5))
+        self.assertEqual(Restaurant.objects.get(name="New Place").review_count, 1)
+        # Created restaurants are ranked and in the typeahead before the queued jobs run.
+        self.assertTrue(RestaurantRanking.objects.filter(restaurant__name="New Place").exists())
+        self.assertNotEqual(get_versions(RESTAURANT_NAMES_VERSION), names_version)
+        self.assertEqual(search("ramen").reviews, [review])
+        call_command("recompute_ratings", "--check", stdout=StringIO())
+        # Other writes still get auto_now(_add)'s times.
+        later = Review.objects.create(restaurant=self.restaurant, user=self.user, rating=3, body="Later")
+        self.assertGreater(later.created, review.created)
+
+    def test_import_csv_creates_users(self):
+        """Test CSV import with --create-users"""
+
+        path = self.write_input(
+            ".csv", "restaurant,user,rating,body\nTest Restaurant,newbie,4,Nice\nTest Restaurant,newbie,4.5,Half\n"
+        )
+        call_command("import_reviews", path, "--create-users", stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(User.objects.get(username="newbie").has_usable_password())
+        self.assertEqual(Review.objects.get().rating, 4)
+
+    def test_strict_mode(self):
+        """Test --strict aborts on invalid rows"""
+
+        path = self.write_input(".csv", "restaurant,user,rating,body\nTest Restaurant,testuser,0,Bad\n")
+        with self.assertRaises(CommandError):
+            call_command("import_reviews", path, "--strict", stdout=StringIO())
+
+
+class ApiTests(QueryBudgetTestMixin, TestCase):
+    """Test the read-only JSON API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+        Restaurant.objects.bulk_create([Restaurant(name=f"Place {i:02}") for i in range(25)])
+        Review.objects.bulk_create(
+            [Review(restaurant=cls.restaurant, user=cls.user, rating=i % 5 + 1, body=f"Review {i}") for i in range(30)]
+        )
+
+    def test_restaurant_list_pages_and_fields(self):
+        """Test restaurant list pagination and sparse fields"""
+
+        url = reverse("api_restaurants")
+        data = self.assertWithinQueryBudget("api_restaurants", lambda: self.client.get(url)).json()
+        self.assertEqual(len(data["results"]), 20)
+        self.assertEqual(set(data["results"][0]), {"id", "name", "review_count", "average_rating"})
+        data = self.client.get(url, {"cursor": data["next"], "fields": "name"}).json()
+        self.assertEqual(len(data["results"]), 6)
+        self.assertEqual(data["results"][-1], {"name": "Test Restaurant"})
+        self.assertIsNone(data["next"])
+        self.assertEqual(self.client.get(url, {"fields": "password"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"cursor": "bogus"}).status_code, 400)
+
+    def test_restaurant_detail(self):
+        """Test restaurant detail"""
+
+        url = reverse("api_restaurant", args=[self.restaurant.id])
+        data = self.assertWithinQueryBudget("api_restaurant", lambda: self.client.get(url)).json()
+        self.assertEqual(data["review_count"], 30)
+        self.assertEqual(data["average_rating"], 3.0)
+        self.assertEqual(data["rating_histogram"], {str(rating): 6 for rating in range(1, 6)})
+        self.assertEqual(self.client.get(reverse("api_restaurant", args=[999])).status_code, 404)
+
+    def test_reviews_list_and_export(self):
+        """Test review list and streaming export"""
+
+        url = reverse("api_restaurant_reviews", args=[self.restaurant.id])
+        data = self.assertWithinQueryBudget(
+            "api_restaurant_reviews", lambda: self.client.get(url, {"limit": 25})
+        ).json()
+        self.assertEqual(len(data["results"]), 25)
+        self.assertEqual(data["results"][0]["user"], "testuser")
+        response = self.assertWithinQueryBudget(
+            "api_restaurant_reviews_export",
+            lambda: self.client.get(reverse("api_restaurant_reviews_export", args=[self.restaurant.id])),
+        )
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 30)
+
+    def test_default_queryset(self):
+        """Test API views serve their queryset or every row of their model"""
+
+        self.assertEqual(JsonApiView(model=Restaurant).get_queryset().count(), Restaurant.objects.count())
+        self.assertEqual(JsonApiView(queryset=Review.objects.none()).get_queryset().count(), 0)
+        with self.assertRaises(ImproperlyConfigured):
+            JsonApiView().get_queryset()
+
+
+@override_settings(ROOT_URLCONF="django_project.urls_async")
+class AsyncViewTests(TestCase):
+    """Test the async read views served under ASGI"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+        cls.review = Review.objects.create(restaurant=cls.restaurant, user=cls.user, rating=4, body="Good")
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_home_view(self):
+        """Test the async home view"""
+
+        response = await self.async_client.get(reverse("home"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.resolver_match.func.view_class.__name__, "AsyncHomeView")
+        self.assertContains(response, "Test Restaurant")
+        response = await self.async_client.get(reverse("home"), {"near": "0,0"})
+        self.assertContains(response, "No restaurants nearby.")
+
+    async def test_restaurant_detail_view(self):
+        """Test the async restaurant detail view and its cached fragment"""
+
+        url = reverse("restaurant_detail", args=[self.restaurant.id])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.resolver_match.func.view_class.__name__, "AsyncRestaurantDetailView")
+        self.assertContains(response, "Good")
+        self.assertContains(response, "Average Rating: 4.0")
+        response = await self.async_client.get(url, headers={"if-none-match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        cached = await self.async_client.get(url)
+        self.assertContains(cached, "Good")
+        self.assertEqual((await self.async_client.get(reverse("restaurant_detail", args=[999]))).status_code, 404)
+
+    async def test_review_detail_view(self):
+        """Test the async review detail view shows author links to the author"""
+
+        url = reverse("review_detail", args=[self.review.id])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.resolver_match.func.view_class.__name__, "AsyncReviewDetailView")
+        self.assertNotContains(response, "Update Review")
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(url)
+        self.assertContains(response, "Update Review")
+
+
+class BenchmarkCommandTests(TestCase):
+    """Test the seed_bench and bench commands"""
+
+    def test_seed_and_bench(self):
+        """Test seeding a small dataset and benchmarking every route"""
+
+        out = StringIO()
+        call_command("seed_bench", restaurants=20, users=10, reviews=500, batch_size=200, stdout=out)
+        self.assertEqual(Review.objects.count(), 500)
+        self.assertEqual(Restaurant.objects.recompute_aggregates(check_only=True), [])
+        with self.assertRaises(CommandError):
+            call_command("seed_bench", stdout=out)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "bench.json")
+            call_command("bench", iterations=2, warmup=0, output=output, stdout=out)
+            with open(output) as results_file:
+                results = json.load(results_file)
+            call_command("bench", iterations=2, warmup=0, compare=output, threshold=1000, stdout=out)
+        self.assertEqual(results["meta"]["reviews"], 500)
+        self.assertIn("accounts:signup", results["routes"])
+        self.assertEqual(results["routes"]["home"]["iterations"], 2)
+
+
+class DatabaseProfileTests(TestCase):
+    """Test the database performance profiles"""
+
+    def test_pragmas_applied(self):
+        """Test the web profile's PRAGMAs are set on new connections"""
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(connection.settings_dict["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+
+    def test_db_profile_command(self):
+        """Test the db_profile command reports the settings in effect"""
+
+        out = StringIO()
+        call_command("db_profile", database=["default"], stdout=out)
+        self.assertIn("Profile: web", out.getvalue())
+        self.assertIn("busy_timeout", out.getvalue())
+
+    def test_journal_mode_opt_in(self):
+        """Test only the wal profile, which the served processes use, changes the journal mode of the file"""
+
+        with tempfile.TemporaryDirectory() as directory:
+            database = sqlite3.connect(os.path.join(directory, "db.sqlite3"))
+            wrapper = mock.Mock(vendor="sqlite", connection=database)
+            tune_connection(None, wrapper)
+            self.assertEqual(database.execute("PRAGMA journal_mode").fetchone()[0], "delete")
+            with override_settings(DATABASE_PROFILE="wal"):
+                tune_connection(None, wrapper)
+            self.assertEqual(database.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            database.close()
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Test primary/replica routing and the read-your-writes pin"""
+
+    def run_middleware(self, request):
+        seen = {}
+
+        def get_response(request):
+            seen["alias"] = PrimaryReplicaRouter().db_for_read(Review)
+            return HttpResponse()
+
+        response = ReplicaPinMiddleware(get_response)(request)
+        return seen["alias"], response
+
+    def test_router(self):
+        """Test reads go to a replica only when allowed and writes always go to the primary"""
+
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Review), "default")
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Review), "replica")
+            self.assertEqual(router.db_for_write(Review), "default")
+        self.assertFalse(router.allow_migrate("replica", "reviews"))
+
+    def test_read_only_views_use_replica(self):
+        """Test only opted-in views read from the replica"""
+
+        factory = RequestFactory()
+        self.assertEqual(self.run_middleware(factory.get(reverse("home")))[0], "replica")
+        self.assertEqual(self.run_middleware(factory.get(reverse("review_detail", args=[1])))[0], "replica")
+        self.assertEqual(self.run_middleware(factory.get(reverse("update_review", args=[1])))[0], "default")
+        self.assertEqual(self.run_middleware(factory.get(reverse("accounts:signup")))[0], "default")
+        self.assertEqual(self.run_middleware(factory.get("/admin/"))[0], "default")
+
+    def test_write_pins_reads_to_primary(self):
+        """Test a write sets the pin cookie and pinned reads use the primary"""
+
+        factory = RequestFactory()
+        alias, response = self.run_middleware(factory.post(reverse("add_review", args=[1])))
+        self.assertEqual(alias, "default")
+        self.assertEqual(response.cookies[settings.REPLICA_PIN_COOKIE]["max-age"], settings.REPLICA_PIN_SECONDS)
+        request = factory.get(reverse("home"))
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = "1"
+        self.assertEqual(self.run_middleware(request)[0], "default")
+
+
+@override_settings(DATABASE_REPLICAS=["replica"], CACHES={"default": settings.CACHE_BACKENDS["locmem"]})
+class ReplicaCacheTests(TransactionTestCase):
+    """Test cached fragments with a lagging SQLite replica kept by sync_replica"""
+
+    def setUp(self):
+        cache.clear()
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        connections.settings["replica"] = {**connections["default"].settings_dict, "NAME": f"{directory}/replica"}
+        self.addCleanup(connections.settings.pop, "replica")
+        self.addCleanup(connections.__delitem__, "replica")
+        # Connected here: the test case only lets connections it knows about open on demand.
+        connections["replica"].connect()
+        self.addCleanup(connections["replica"].close)
+        User.objects.create_user(username="testuser", password="12345")
+        self.restaurant = Restaurant.objects.create(name="Test Restaurant")
+        call_command("sync_replica", stdout=StringIO())
+
+    def test_author_sees_own_review(self):
+        """Test the author's pinned reads bypass fragments rendered from the lagging replica"""
+
+        url = reverse("restaurant_detail", args=[self.restaurant.id])
+        self.assertContains(self.client.get(url), "No reviews yet")
+        author = Client()
+        author.login(username="testuser", password="12345")
+        author.post(reverse("add_review", args=[self.restaurant.id]), {"rating": 4, "body": "Tasty noodles"})
+        # The replica has not caught up, and the page it renders is not stored under the new version.
+        self.assertContains(self.client.get(url), "No reviews yet")
+        self.assertContains(author.get(url), "Tasty noodles")
+        call_command("sync_replica", stdout=StringIO())
+        self.assertContains(self.client.get(url), "Tasty noodles")
+
+
+class RankingTests(QueryBudgetTestMixin, TestCase):
+    """Test the Bayesian and trending rankings"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.one_review = Restaurant.objects.create(name="One Perfect Review")
+        cls.many_reviews = Restaurant.objects.create(name="Many Good Reviews")
+        cls.quiet = Restaurant.objects.create(name="Quiet Place")
+        Review.objects.create(restaurant=cls.one_review, user=cls.user, rating=5, body="Perfect")
+        Review.objects.bulk_create(
+            [Review(restaurant=cls.many_reviews, user=cls.user, rating=5, body="Good") for _ in range(40)]
+        )
+        old = Review.objects.create(restaurant=cls.quiet, user=cls.user, rating=3, body="Fine")
+        Review.objects.filter(pk=old.pk).update(created=timezone.now() - timedelta(days=60))
+        RestaurantRanking.objects.compact()
+        run_pending()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_log_space_helpers(self):
+        """Test log-space adding"""
+
+        self.assertEqual(ranking.log_add(ranking.NO_TREND, 2.0), 2.0)
+        total = ranking.log_add(ranking.log_add(ranking.NO_TREND, 2.0), 3.0)
+        self.assertAlmostEqual(total, math.log(math.exp(2.0) + math.exp(3.0)))
+
+    def test_incremental_matches_compaction(self):
+        """Test the queued ranking recomputes agree with a full recompute"""
+
+        review = Review.objects.filter(restaurant=self.many_reviews).first()
+        review.rating = 1
+        review.save()
+        Review.objects.filter(restaurant=self.one_review).delete()
+        run_pending()
+        incremental = dict(RestaurantRanking.objects.values_list("restaurant_id", "trending_score"))
+        RestaurantRanking.objects.compact()
+        compacted = dict(RestaurantRanking.objects.values_list("restaurant_id", "trending_score"))
+        self.assertEqual(incremental[self.one_review.pk], ranking.NO_TREND)
+        self.assertAlmostEqual(incremental[self.many_reviews.pk], compacted[self.many_reviews.pk], places=6)
+        self.assertAlmostEqual(incremental[self.quiet.pk], compacted[self.quiet.pk], places=6)
+
+    def test_home_sort_modes(self):
+        """Test top rated and trending sorts on the home page"""
+
+        url = reverse("home")
+        response = self.assertWithinQueryBudget("home", lambda: self.client.get(url, {"sort": "top"}))
+        names = [restaurant.name for restaurant in response.context["restaurants"]]
+        self.assertEqual(names, ["Many Good Reviews", "One Perfect Review", "Quiet Place"])
+        response = self.client.get(url, {"sort": "trending"})
+        self.assertEqual(response.context["restaurants"][-1].name, "Quiet Place")
+        response = self.client.get(url, {"sort": "bogus"})
+        self.assertEqual(response.context["sort"], "name")
+        self.assertEqual(response.context["restaurants"][0].name, "Many Good Reviews")
+
+    def test_ranked_pagination(self):
+        """Test cursor pagination through the ranking table"""
+
+        paginator = KeysetPaginator(RestaurantRanking.objects.all(), ("-bayesian_score", "-restaurant_id"), 2)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        self.assertEqual([row.restaurant_id for row in first], [self.many_reviews.pk, self.one_review.pk])
+        self.assertEqual([row.restaurant_id for row in second], [self.quiet.pk])
+
+
+class DailyRatingTests(QueryBudgetTestMixin, TestCase):
+    """Test the daily rating rollups and the statistics page"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+        cls.other = Restaurant.objects.create(name="Other Restaurant")
+        now = timezone.now()
+        reviews = [Review(restaurant=cls.restaurant, user=cls.user, rating=rating, body="Ok") for rating in (2, 4, 5)]
+        created = Review.objects.bulk_create(reviews)
+        # Spread the reviews over two months; ReviewQuerySet.update queues the old and new days.
+        Review.objects.filter(pk=created[0].pk).update(created=now - timedelta(days=40))
+        Review.objects.filter(pk=created[1].pk).update(created=now - timedelta(days=1))
+        run_pending()
+
+    def rollups(self):
+        return {
+            (row["restaurant_id"], row["day"]): row
+            for row in DailyRating.objects.filter(review_count__gt=0).values(
+                "restaurant_id", "day", "review_count", "rating_sum", "rating_2_count", "rating_5_count"
+            )
+        }
+
+    def test_incremental_matches_rebuild(self):
+        """Test the queued rollup recomputes agree with a rebuild from history"""
+
+        review = Review.objects.create(restaurant=self.restaurant, user=self.user, rating=3, body="Meh")
+        review.rating = 5
+        review.save()
+        moved = Review.objects.get(restaurant=self.restaurant, rating=2)
+        moved.restaurant = self.other
+        moved.save()
+        Review.objects.filter(restaurant=self.restaurant, rating=4).delete()
+        run_pending()
+        incremental = self.rollups()
+        DailyRating.objects.rebuild()
+        self.assertEqual(incremental, self.rollups())
+        today = DailyRating.objects.get(restaurant=self.restaurant, day=timezone.localdate())
+        self.assertEqual((today.review_count, today.rating_sum, today.rating_5_count), (2, 10, 2))
+        self.assertTrue(DailyRating.objects.filter(restaurant=self.other, rating_2_count=1).exists())
+
+    def test_backfill_command(self):
+        """Test the backfill command rebuilds rollups from the review table"""
+
+        DailyRating.objects.all().delete()
+        out = StringIO()
+        catalog_version = get_versions(CATALOG_VERSION)
+        # A full backfill invalidates every page with one version bump, not one per restaurant.
+        with mock.patch("reviews.management.commands.backfill_daily_ratings.invalidate_restaurants") as invalidate:
+            call_command("backfill_daily_ratings", stdout=out)
+        invalidate.assert_not_called()
+        self.assertNotEqual(get_versions(CATALOG_VERSION), catalog_version)
+        self.assertIn("Wrote 3 daily rollups", out.getvalue())
+        self.assertEqual(DailyRating.objects.filter(restaurant=self.restaurant).count(), 3)
+
+    def test_stats_page(self):
+        """Test the statistics page downsamples the rating history"""
+
+        url = reverse("restaurant_stats", args=[self.restaurant.pk])
+        response = self.assertWithinQueryBudget("restaurant_stats", lambda: self.client.get(url))
+        self.assertEqual(response.status_code, 200)
+        series = response.context["series"]
+        self.assertEqual([row["review_count"] for row in series], [1, 1, 1])
+        self.assertEqual([row["cumulative_average"] for row in series], [2, 3, 11 / 3])
+        response = self.client.get(url, {"period": "month"})
+        self.assertEqual(sum(row["review_count"] for row in response.context["series"]), 3)
+        self.assertLessEqual(len(response.context["series"]), 3)
+        self.assertEqual(self.client.get(url, {"period": "bogus"}).context["period"], "day")
+
+
+class JobQueueTests(TestCase):
+    """Test the background job queue"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+
+    def test_review_writes_coalesce(self):
+        """Test many reviews of one restaurant queue one recompute per kind"""
+
+        for rating in (3, 4, 5):
+            Review.objects.create(restaurant=self.restaurant, user=self.user, rating=rating, body="Ok")
+        self.assertEqual(Job.objects.count(), 3)
+        self.assertEqual(Job.objects.depth()["rankings"][0], 1)
+        self.assertFalse(DailyRating.objects.exists())
+        self.assertEqual(run_pending(), 2)
+        # The similarity recompute waits for SIMILARITY_REFRESH_DELAY_SECONDS.
+        self.assertEqual(list(Job.objects.values_list("name", flat=True)), [SIMILARITY_JOB])
+        self.assertEqual(DailyRating.objects.get().rating_sum, 12)
+
+    def test_retry_with_backoff(self):
+        """Test failed jobs are retried later, then marked failed"""
+
+        calls = []
+
+        def flaky(keys, using):
+            calls.append(keys)
+            raise RuntimeError("boom")
+
+        HANDLERS["flaky"] = flaky
+        self.addCleanup(HANDLERS.pop, "flaky")
+        Job.objects.enqueue([("flaky", 1), ("flaky", 2), ("flaky", 1)])
+        with self.assertLogs("reviews.jobs", "ERROR"):
+            self.assertEqual(run_batch(), 2)
+        self.assertEqual(calls, [["1", "2"]])
+        job = Job.objects.get(key="1")
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn("boom", job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertEqual(run_batch(), 0)
+        with override_settings(JOB_MAX_ATTEMPTS=2):
+            Job.objects.update(run_at=timezone.now())
+            with self.assertLogs("reviews.jobs", "ERROR"):
+                run_batch()
+        self.assertEqual(set(Job.objects.values_list("status", flat=True)), {Job.FAILED})
+
+    def test_run_worker_command(self):
+        """Test run_worker runs the due jobs and reports the queue depth"""
+
+        Review.objects.create(restaurant=self.restaurant, user=self.user, rating=4, body="Ok")
+        out = StringIO()
+        call_command("run_worker", "--status", stdout=out)
+        self.assertIn("3 waiting, 0 failed", out.getvalue())
+        out = StringIO()
+        call_command("run_worker", "--once", stdout=out)
+        self.assertIn("Ran 2 jobs", out.getvalue())
+        self.assertEqual(DailyRating.objects.get().review_count, 1)
+
+
+class AssetTests(SimpleTestCase):
+    """Test the static asset pipeline"""
+
+    def test_purge_css(self):
+        """Test unused rules, selectors and keyframes are removed"""
+
+        css = (
+            "/*! License */:root{--x:1}.btn,.unused{color:red}.nav:not(.gone){margin:0}"
+            "@media (min-width:576px){.unused{top:0}.btn{top:1px}}"
+            "[data-theme=dark]{--x:2}.spin{animation:spin 1s}@keyframes spin{to{transform:rotate(1turn)}}"
+            'a[href="x;y"]{b:c}'
+        )
+        purged = assets.purge_css(css, {"btn", "nav", "href"})
+        self.assertEqual(
+            purged,
+            "/*! License */\n:root{--x:1}.btn{color:red}.nav:not(.gone){margin:0}"
+            "@media (min-width:576px){.btn{top:1px}}"
+            'a[href="x;y"]{b:c}',
+        )
+
+    def test_built_assets_current(self):
+        """Test the committed stylesheets match the templates"""
+
+        call_command("build_assets", "--check", stdout=StringIO())
+
+    def test_pages_use_local_assets(self):
+        """Test pages inline the critical CSS and load the rest from static files"""
+
+        response = self.client.get(reverse("accounts:login"))
+        self.assertContains(response, ":root{--bs-blue:")
+        self.assertContains(response, 'href="/static/css/site.css"')
+        self.assertContains(response, 'src="/static/vendor/bootstrap/bootstrap.min.js"')
+        self.assertNotContains(response, "cdn.jsdelivr.net")
+
+
+class AdminTests(TestCase):
+    """Test the review admin on large tables"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username="admin", password="12345")
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.noodles = Restaurant.objects.create(name="Noodle House")
+        cls.tacos = Restaurant.objects.create(name="Taco Stand")
+        Review.objects.create(restaurant=cls.noodles, user=cls.user, rating=5, body="Great broth")
+        Review.objects.create(restaurant=cls.tacos, user=cls.admin, rating=3, body="Crispy shells")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_estimated_count_paginator(self):
+        """Test the paginator estimates large unfiltered tables and caps filtered counts"""
+
+        paginator = EstimatedCountPaginator(Review.objects.order_by("pk"), 1)
+        self.assertEqual(paginator.count, 2)
+        paginator.exact_limit = 1
+        del paginator.count
+        self.assertEqual(paginator.count, estimated_row_count(Review))
+        paginator = EstimatedCountPaginator(Review.objects.filter(rating__gte=1).order_by("pk"), 1)
+        paginator.exact_limit = 1
+        self.assertEqual(paginator.count, 1)
+
+    def test_filter_reviews(self):
+        """Test indexed review search matches bodies, restaurant names and usernames"""
+
+        self.assertEqual(filter_reviews(Review.objects.all(), "broth").get().restaurant, self.noodles)
+        self.assertEqual(filter_reviews(Review.objects.all(), "taco").get().restaurant, self.tacos)
+        self.assertEqual(filter_reviews(Review.objects.all(), "testuser").get().user, self.user)
+        self.assertEqual(filter_reviews(Review.objects.all(), "  ").count(), 2)
+
+    def test_changelist_filters_and_search(self):
+        """Test the changelist's autocomplete filter, rating filter and search"""
+
+        url = reverse("admin:reviews_review_changelist")
+        response = self.client.get(url, {"restaurant__id__exact": self.noodles.pk})
+        self.assertContains(response, 'data-filter-param="restaurant__id__exact"')
+        self.assertContains(response, "reviews/admin/autocomplete_filter.js")
+        self.assertEqual(list(response.context["cl"].result_list), list(self.noodles.reviews.all()))
+        response = self.client.get(url, {"rating": "3"})
+        self.assertEqual([review.rating for review in response.context["cl"].result_list], [3])
+        response = self.client.get(url, {"q": "crispy"})
+        self.assertEqual([review.restaurant for review in response.context["cl"].result_list], [self.tacos])
+
+    def test_restaurant_autocomplete(self):
+        """Test the restaurant autocomplete searches the name index"""
+
+        response = self.client.get(
+            reverse("admin:autocomplete"),
+            {"term": "nood", "app_label": "reviews", "model_name": "review", "field_name": "restaurant"},
+        )
+        self.assertEqual([result["text"] for result in response.json()["results"]], ["Noodle House"])
+
+
+class BatchedDeletionTests(TestCase):
+    """Test deleting restaurants and users with their reviews in batches"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username="admin", password="12345")
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.noodles = Restaurant.objects.create(name="Noodle House")
+        cls.tacos = Restaurant.objects.create(name="Taco Stand")
+        Review.objects.bulk_create(
+            [Review(restaurant=cls.noodles, user=cls.user, rating=rating, body="Fine") for rating in range(1, 6)]
+            + [Review(restaurant=cls.tacos, user=cls.admin, rating=4, body="Crispy shells")]
+        )
+        run_pending()
+
+    def test_delete_in_batches(self):
+        """Test batches keep the aggregates, rollups and search index in step"""
+
+        progress = list(Review.objects.filter(user=self.user).delete_in_batches(batch_size=2, pause=0))
+        self.assertEqual(progress, [2, 4, 5])
+        self.noodles.refresh_from_db()
+        self.assertEqual((self.noodles.review_count, self.noodles.rating_sum), (0, 0))
+        self.assertEqual(Restaurant.objects.recompute_aggregates(check_only=True), [])
+        run_pending()
+        self.assertFalse(DailyRating.objects.filter(restaurant=self.noodles).exists())
+        self.assertEqual(search("fine").reviews, [])
+
+    def test_command(self):
+        """Test the command deletes the reviews, then the restaurants and users"""
+
+        out = StringIO()
+        call_command(
+            "delete_with_reviews",
+            "--restaurant",
+            str(self.noodles.pk),
+            "--user",
+            "admin",
+            "--batch-size",
+            "2",
+            "--pause",
+            "0",
+            stdout=out,
+        )
+        self.assertIn("4 of 5 reviews deleted", out.getvalue())
+        self.assertEqual(list(Restaurant.objects.all()), [self.tacos])
+        self.assertFalse(User.objects.filter(username="admin").exists())
+        self.assertFalse(Review.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command("delete_with_reviews", "--user", "nobody", stdout=StringIO())
+
+    @override_settings(REVIEW_DELETE_BATCH_SIZE=2)
+    def test_admin_queues_deletion(self):
+        """Test the admin hides restaurants at once and deletes the reviews through the job queue"""
+
+        SimilarRestaurant.objects.create(restaurant=self.tacos, similar=self.noodles, score=0.5)
+        tacos = reverse("restaurant_detail", args=[self.tacos.pk])
+        profile = reverse("user_reviews", args=[self.user.pk])
+        # A client that has not written, so it is not pinned past the shared page cache.
+        reader = Client()
+        self.assertContains(reader.get(tacos), "Noodle House")
+        etag = reader.get(profile)["ETag"]
+        review = self.noodles.reviews.first()
+        self.client.force_login(self.admin)
+        url = reverse("admin:reviews_restaurant_changelist")
+        data = {"action": "delete_selected", "_selected_action": [self.noodles.pk]}
+        # The confirmation page lists the cascade but never loads the reviews.
+        with self.assertNumQueries(10):
+            response = self.client.post(url, data)
+        self.assertContains(response, "5 reviews, deleted in batches")
+        self.assertContains(response, "Restaurant ranking:")
+        self.client.post(url, {**data, "post": "yes"})
+        self.assertTrue(Restaurant.objects.filter(pk=self.noodles.pk).exists())
+        self.assertEqual(self.client.get(reverse("restaurant_detail", args=[self.noodles.pk])).status_code, 404)
+        self.assertNotContains(self.client.get(reverse("home")), "Noodle House")
+        self.assertNotContains(reader.get(tacos), "Noodle House")
+        self.assertEqual(reader.get(reverse("review_detail", args=[review.pk])).status_code, 404)
+        response = reader.get(profile, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Noodle House")
+        with self.assertLogs("reviews.jobs", "INFO") as logs:
+            run_pending()
+        self.assertEqual(len([line for line in logs.output if "Deleted 2 reviews" in line]), 2)
+        self.assertFalse(Restaurant.objects.filter(pk=self.noodles.pk).exists())
+        self.assertEqual(Review.objects.count(), 1)
+
+    @override_settings(REVIEW_DELETE_BATCH_SIZE=2)
+    def test_admin_deletes_small_objects_at_once(self):
+        """Test objects whose reviews fit in one batch are deleted in the request"""
+
+        self.client.force_login(self.admin)
+        url = reverse("admin:reviews_restaurant_changelist")
+        self.client.post(url, {"action": "delete_selected", "_selected_action": [self.tacos.pk], "post": "yes"})
+        self.assertFalse(Restaurant.objects.filter(pk=self.tacos.pk).exists())
+        self.assertFalse(Job.objects.filter(name=DELETE_RESTAURANT_JOB).exists())
+
+    @override_settings(REVIEW_DELETE_BATCH_SIZE=2)
+    def test_admin_deactivates_users(self):
+        """Test a user with many reviews is deactivated until the job has deleted them"""
+
+        self.client.force_login(self.admin)
+        url = reverse("admin:auth_user_changelist")
+        data = {"action": "delete_selected", "_selected_action": [self.user.pk]}
+        self.assertContains(self.client.post(url, data), "5 reviews, deleted in batches")
+        self.client.post(url, {**data, "post": "yes"})
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+        self.assertFalse(self.client.login(username="testuser", password="12345"))
+        run_pending()
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+
+
+class UserReviewsTests(QueryBudgetTestMixin, TestCase):
+    """Test the reviewer statistics and the user profile page"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.other = User.objects.create_user(username="otheruser", password="12345")
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+        cls.tacos = Restaurant.objects.create(name="Taco Stand")
+        Review.objects.bulk_create(
+            [Review(restaurant=cls.restaurant, user=cls.user, rating=rating, body="Ok") for rating in (2, 4)]
+        )
+
+    def stats(self, user):
+        stats = ReviewerStats.objects.get(user=user)
+        return (stats.review_count, stats.rating_sum)
+
+    def test_stats_follow_writes(self):
+        """Test every write path keeps the reviewer statistics equal to a recompute"""
+
+        self.assertEqual(self.stats(self.user), (2, 6))
+        review = Review.objects.create(restaurant=self.tacos, user=self.other, rating=5, body="Great")
+        self.assertEqual(self.stats(self.other), (1, 5))
+        review.rating = 3
+        review.user = self.user
+        review.save()
+        self.assertEqual((self.stats(self.user), self.stats(self.other)), ((3, 9), (0, 0)))
+        Review.objects.filter(rating=2).update(user=self.other)
+        self.assertEqual((self.stats(self.user), self.stats(self.other)), ((2, 7), (1, 2)))
+        review.delete()
+        Review.objects.filter(user=self.user).delete_batch()
+        self.assertEqual((self.stats(self.user), self.stats(self.other)), ((0, 0), (1, 2)))
+        before = list(ReviewerStats.objects.order_by("pk").values_list("pk", "review_count", "rating_sum"))
+        ReviewerStats.objects.rebuild()
+        self.assertEqual(
+            list(ReviewerStats.objects.order_by("pk").values_list("pk", "review_count", "rating_sum")), before
+        )
+        self.other.delete()
+        self.assertFalse(ReviewerStats.objects.filter(user_id=self.other.pk).exists())
+
+    def test_profile_page(self):
+        """Test the profile page lists the user's reviews newest first with their restaurants"""
+
+        Review.objects.create(restaurant=self.tacos, user=self.user, rating=5, body="Newest")
+        url = reverse("user_reviews", args=[self.user.pk])
+        self.client.force_login(self.other)
+        response = self.assertWithinQueryBudget("user_reviews", lambda: self.client.get(url))
+        self.assertContains(response, "3 reviews, average rating 3.7 / 5")
+        self.assertEqual([review.body for review in response.context["reviews"]], ["Newest", "Ok", "Ok"])
+        self.assertContains(response, "Taco Stand")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertContains(self.client.get(reverse("user_reviews", args=[self.other.pk])), "No reviews yet.")
+        self.assertEqual(self.client.get(reverse("user_reviews", args=[9999])).status_code, 404)
+
+
+class GeoTests(TestCase):
+    """Test the geohash index and "near me" searches"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Restaurants about 0, 1.1, 2.2 and 11 km north of the point, and one without a location.
+        cls.point = (34.05, -118.24)
+        cls.places = [
+            Restaurant.objects.create(name=f"Place {index}", latitude=34.05 + offset, longitude=-118.24)
+            for index, offset in enumerate([0.0, 0.01, 0.02, 0.1])
+        ]
+        Restaurant.objects.create(name="Nowhere")
+
+    def test_geohash(self):
+        """Test encoding and that the covering cells contain every point within the radius"""
+
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(self.places[0].geohash, geo.encode(34.05, -118.24))
+        rng = random.Random(218)
+        for _ in range(200):
+            latitude, longitude = rng.uniform(-80, 80), rng.uniform(-180, 180)
+            radius_km = rng.choice([0.5, 5, 50])
+            cells = geo.covering_cells(latitude, longitude, radius_km)
+            self.assertLessEqual(len(cells), 16)
+            bearing = rng.uniform(0, 2 * math.pi)
+            distance = rng.uniform(0, radius_km) / geo.KM_PER_DEGREE
+            point_lat = latitude + distance * math.cos(bearing)
+            point_lng = longitude + distance * math.sin(bearing) / math.cos(math.radians(point_lat))
+            point_hash = geo.encode(point_lat, (point_lng + 180) % 360 - 180)
+            self.assertTrue(any(point_hash.startswith(cell) for cell in cells), (latitude, longitude, radius_km))
+
+    def test_nearest(self):
+        """Test nearest() filters by exact distance, sorts and reads the geohash index"""
+
+        restaurants = Restaurant.objects.nearest(*self.point, radius_km=5, limit=10)
+        self.assertEqual(restaurants, self.places[:3])
+        self.assertAlmostEqual(restaurants[1].distance_km, 1.112, places=2)
+        self.assertEqual(Restaurant.objects.nearest(*self.point, radius_km=5, limit=2), self.places[:2])
+        self.assertEqual(Restaurant.objects.nearest(*self.point, radius_km=12, limit=10), self.places)
+        if connection.vendor == "sqlite":
+            plan = Restaurant.objects.near(*self.point, radius_km=5).explain()
+            self.assertIn("restaurant_geohash_idx", plan)
+
+    def test_home_near(self):
+        """Test the home page lists the nearest restaurants with their distances"""
+
+        response = self.client.get(reverse("home"), {"near": "34.05,-118.24", "radius": "3"})
+        self.assertEqual(list(response.context["restaurants"]), self.places[:3])
+        self.assertContains(response, "Restaurants within 3 km")
+        self.assertContains(response, "1.1 km away")
+        self.assertEqual(self.client.get(reverse("home"), {"near": "91,0"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("home"), {"near": "1,2", "radius": "1000"}).status_code, 400)
+
+    def test_api_near(self):
+        """Test the restaurant list API's near mode"""
+
+        url = reverse("api_restaurants")
+        data = self.client.get(url, {"near": "34.05,-118.24", "radius": "12", "limit": "3"}).json()
+        self.assertEqual([row["id"] for row in data["results"]], [place.pk for place in self.places[:3]])
+        self.assertEqual(data["results"][0]["distance_km"], 0)
+        self.assertIsNone(data["next"])
+        data = self.client.get(url, {"near": "34.05,-118.24", "fields": "name,latitude,distance_km"}).json()
+        self.assertEqual(
+            data["results"][1], {"name": "Place 1", "latitude": self.places[1].latitude, "distance_km": 1.112}
+        )
+        self.assertEqual(self.client.get(url, {"near": "north"}).status_code, 400)
+
+
+class SimilarityTests(QueryBudgetTestMixin, TestCase):
+    """Test the precomputed similar restaurants"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f"user{number}", password="12345") for number in range(4)]
+        cls.tacos, cls.burritos, cls.sushi, cls.pizza = (
+            Restaurant.objects.create(name=name) for name in ("Taco Stand", "Burrito Bar", "Sushi Place", "Pizza")
+        )
+        ratings = {
+            cls.tacos: (5, 4, 5, None),
+            cls.burritos: (5, 5, 4, None),
+            cls.sushi: (1, 2, None, 5),
+            cls.pizza: (None, None, None, 3),
+        }
+        Review.objects.bulk_create(
+            Review(restaurant=restaurant, user=user, rating=rating, body="Ok")
+            for restaurant, row in ratings.items()
+            for user, rating in zip(cls.users, row)
+            if rating
+        )
+
+    def neighbours(self):
+        rows = SimilarRestaurant.objects.order_by("restaurant_id", "-score")
+        return {(row.restaurant_id, row.similar_id): round(row.score, 6) for row in rows}
+
+    def test_rebuild(self):
+        """Test the scores are shrunk cosine similarities of the restaurants' ratings"""
+
+        SimilarRestaurant.objects.rebuild(batch_size=2)
+        neighbours = self.neighbours()
+        tacos = math.sqrt(25 + 16 + 25)
+        burritos = math.sqrt(25 + 25 + 16)
+        expected = (25 + 20 + 20) / (tacos * burritos) * 3 / (3 + settings.SIMILARITY_SHRINKAGE)
+        self.assertAlmostEqual(neighbours[(self.tacos.pk, self.burritos.pk)], expected, places=5)
+        self.assertEqual(neighbours[(self.burritos.pk, self.tacos.pk)], neighbours[(self.tacos.pk, self.burritos.pk)])
+        self.assertEqual(
+            [row.similar for row in SimilarRestaurant.objects.for_restaurant(self.tacos.pk)],
+            [self.burritos, self.sushi],
+        )
+        # One shared reviewer is below SIMILARITY_MIN_COMMON_REVIEWERS.
+        self.assertNotIn((self.sushi.pk, self.pizza.pk), neighbours)
+        self.assertFalse(SimilarRestaurant.objects.filter(restaurant=self.pizza).exists())
+        with override_settings(SIMILAR_RESTAURANTS=1):
+            SimilarRestaurant.objects.rebuild()
+        self.assertEqual(SimilarRestaurant.objects.filter(restaurant=self.tacos).get().similar, self.burritos)
+
+    def test_recompute_matches_rebuild(self):
+        """Test incremental recomputes from the reviewers' slice agree with a full rebuild"""
+
+        SimilarRestaurant.objects.rebuild()
+        expected = self.neighbours()
+        SimilarRestaurant.objects.all().delete()
+        SimilarRestaurant.objects.recompute([self.tacos.pk, self.sushi.pk])
+        SimilarRestaurant.objects.recompute([self.burritos.pk, self.pizza.pk])
+        self.assertEqual(self.neighbours(), expected)
+
+    def test_repeat_reviews(self):
+        """Test a user's repeat reviews of a restaurant score the same in recomputes and rebuilds"""
+
+        Review.objects.create(restaurant=self.tacos, user=self.users[0], rating=2, body="Worse")
+        SimilarRestaurant.objects.rebuild()
+        expected = self.neighbours()
+        self.assertTrue(all(0 < score <= 1 for score in expected.values()))
+        SimilarRestaurant.objects.all().delete()
+        SimilarRestaurant.objects.recompute([self.tacos.pk, self.burritos.pk, self.sushi.pk])
+        self.assertEqual(self.neighbours(), expected)
+
+    def test_review_writes_queue_recompute(self):
+        """Test a review write recomputes its restaurant's neighbours after the refresh delay"""
+
+        SimilarRestaurant.objects.rebuild()
+        Job.objects.all().delete()
+        Review.objects.create(restaurant=self.pizza, user=self.users[0], rating=2, body="Meh")
+        Review.objects.create(restaurant=self.pizza, user=self.users[1], rating=2, body="Meh")
+        job = Job.objects.get(name=SIMILARITY_JOB)
+        self.assertEqual(job.key, str(self.pizza.pk))
+        self.assertGreater(
+            job.run_at, timezone.now() + timedelta(seconds=settings.SIMILARITY_REFRESH_DELAY_SECONDS - 60)
+        )
+        run_pending()
+        self.assertFalse(SimilarRestaurant.objects.filter(restaurant=self.pizza).exists())
+        Job.objects.update(run_at=timezone.now())
+        run_pending()
+        self.assertEqual(SimilarRestaurant.objects.for_restaurant(self.pizza.pk)[0].similar, self.sushi)
+
+    def test_detail_page(self):
+        """Test the restaurant page lists the similar restaurants within its query budget"""
+
+        catalog_version = get_versions(CATALOG_VERSION)
+        # A full recompute invalidates every page with one version bump, not one per restaurant.
+        with mock.patch("reviews.management.commands.compute_similarities.invalidate_restaurants") as invalidate:
+            call_command("compute_similarities", stdout=StringIO())
+        invalidate.assert_not_called()
+        self.assertNotEqual(get_versions(CATALOG_VERSION), catalog_version)
+        url = reverse("restaurant_detail", args=[self.tacos.pk])
+        self.client.force_login(self.users[0])
+        response = self.assertWithinQueryBudget("restaurant_detail", lambda: self.client.get(url))
+        self.assertContains(response, "Similar Restaurants:")
+        self.assertContains(response, reverse("restaurant_detail", args=[self.burritos.pk]))
+        self.assertNotContains(self.client.get(reverse("restaurant_detail", args=[self.pizza.pk])), "Similar")
+
+
+class TypeaheadTests(QueryBudgetTestMixin, TestCase):
+    """Test the restaurant name typeahead"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.cafe = Restaurant.objects.create(name="Café Olé")
+        cls.taco = Restaurant.objects.create(name="El Taco Loco")
+        cls.tavern = Restaurant.objects.create(name="Tavern on the Green")
+        Review.objects.bulk_create(
+            [Review(restaurant=cls.tavern, user=cls.user, rating=4, body="Ok") for _ in range(2)]
+            + [Review(restaurant=cls.taco, user=cls.user, rating=5, body="Ok")]
+        )
+
+    def setUp(self):
+        typeahead.reset()
+        self.addCleanup(typeahead.reset)
+
+    def names(self, query, limit=10):
+        return [name for _, name, _ in typeahead.get_index().search(query, limit)]
+
+    def test_search(self):
+        """Test prefixes of any word match, folding case and accents, most reviewed first"""
+
+        self.assertEqual(typeahead.fold("  CAFÉ   Olé "), "cafe ole")
+        self.assertEqual(self.names("ta"), ["Tavern on the Green", "El Taco Loco"])
+        self.assertEqual(self.names("ta", limit=1), ["Tavern on the Green"])
+        self.assertEqual(self.names("TACO l"), ["El Taco Loco"])
+        self.assertEqual(self.names("cafe"), ["Café Olé"])
+        self.assertEqual(self.names("olé"), ["Café Olé"])
+        self.assertEqual(self.names("the green"), ["Tavern on the Green"])
+        self.assertEqual(self.names("green on"), [])
+        self.assertEqual(self.names(" "), [])
+
+    def test_index_follows_writes(self):
+        """Test the index is built once and rebuilt after restaurant writes"""
+
+        with self.assertNumQueries(1):
+            self.names("ta")
+        with self.assertNumQueries(0):
+            self.names("tac")
+        Restaurant.objects.create(name="Tapas Bar")
+        with override_settings(TYPEAHEAD_REBUILD_SECONDS=3600):
+            self.assertNotIn("Tapas Bar", self.names("ta"))
+        with override_settings(TYPEAHEAD_REBUILD_SECONDS=0):
+            self.assertIn("Tapas Bar", self.names("ta"))
+            Review.objects.create(restaurant=self.cafe, user=self.user, rating=5, body="Ok")
+            Review.objects.create(restaurant=self.cafe, user=self.user, rating=5, body="Ok")
+            Review.objects.create(restaurant=self.cafe, user=self.user, rating=5, body="Ok")
+            # Review writes do not rebuild the index; its review counts refresh with its age.
+            with self.assertNumQueries(0):
+                self.assertEqual(typeahead.get_index().restaurants[0][1], "Tavern on the Green")
+            with override_settings(TYPEAHEAD_MAX_AGE_SECONDS=0):
+                self.assertEqual(typeahead.get_index().restaurants[0][1], "Café Olé")
+
+    def test_short_prefixes(self):
+        """Test the precomputed best matches of short prefixes agree with scanning their keys"""
+
+        rows = [(pk, f"Diner {pk:03d}", pk % 7) for pk in range(300)]
+        index = typeahead.PrefixIndex(rows)
+        for query, limit in [("d", 5), ("di", 20), ("din", 150), ("diner 0", 5), ("0", 10)]:
+            found = index.search(query, limit)
+            ranks = index.best_ranks(typeahead.fold(query), limit)
+            self.assertEqual(found, [index.restaurants[rank] for rank in ranks])
+        self.assertEqual([row[2] for row in index.search("d", 3)], [6, 6, 6])
+
+    def test_api(self):
+        """Test the typeahead endpoint answers from the index"""
+
+        url = reverse("api_restaurant_typeahead")
+        self.client.get(url, {"q": "t"})
+        response = self.assertWithinQueryBudget(
+            "api_restaurant_typeahead", lambda: self.client.get(url, {"q": "ta"}), 0
+        )
+        self.assertEqual(
+            response.json()["results"],
+            [
+                {"id": self.tavern.pk, "name": "Tavern on the Green", "review_count": 2},
+                {"id": self.taco.pk, "name": "El Taco Loco", "review_count": 1},
+            ],
+        )
+        data = self.client.get(url, {"q": "ta", "fields": "name", "limit": 1}).json()
+        self.assertEqual(data, {"results": [{"name": "Tavern on the Green"}]})
+        self.assertEqual(self.client.get(url).json(), {"results": []})
+        self.assertEqual(self.client.get(url, {"q": "ta", "fields": "body"}).status_code, 400)
+
+
+class InstrumentationTests(TestCase):
+    """Test the Server-Timing header and request profiling"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.staff = User.objects.create_user(username="staffuser", password="12345", is_staff=True)
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+
+    def setUp(self):
+        cache.clear()
+        self.profile_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(PROFILE_DIR=self.profile_dir))
+
+    def profiles(self):
+        return sorted(os.listdir(self.profile_dir))
+
+    def test_server_timing(self):
+        """Test responses break their time down into database, template and view time"""
+
+        with override_settings(SERVER_TIMING_ENABLED=True):
+            response = self.client.get(reverse("restaurant_detail", args=[self.restaurant.pk]))
+        metrics = {}
+        for metric in response["Server-Timing"].split(", "):
+            name, *params = metric.split(";")
+            metrics[name] = dict(param.split("=", 1) for param in params)
+        self.assertEqual(list(metrics), ["db", "template", "view", "total"])
+        self.assertRegex(metrics["db"]["desc"], r'^"[1-9]\d* queries"$')
+        self.assertGreater(float(metrics["template"]["dur"]), 0)
+        parts = sum(float(metrics[name]["dur"]) for name in ("db", "template", "view"))
+        self.assertAlmostEqual(parts, float(metrics["total"]["dur"]), delta=0.5)
+        with override_settings(SERVER_TIMING_ENABLED=False):
+            self.client.force_login(self.staff)
+            self.assertNotIn("Server-Timing", self.client.get(reverse("home")))
+            # Nothing records statements or loads the user the view did not need.
+            url = reverse("api_restaurant", args=[self.restaurant.pk])
+            with CaptureQueriesContext(connection) as anonymous:
+                Client().get(url)
+            with mock.patch("reviews.instrumentation.QueryRecorder") as recorder:
+                with self.assertNumQueries(len(anonymous)):
+                    self.client.get(url)
+            recorder.assert_not_called()
+
+    def test_profiling(self):
+        """Test requests are profiled by URL name, by sampling and for staff asking with ?profile"""
+
+        self.client.get(reverse("home"))
+        self.client.force_login(self.user)
+        self.client.get(reverse("home"), {"profile": "1"})
+        self.assertEqual(self.profiles(), [])
+        with override_settings(PROFILE_URL_NAMES=["restaurant_detail"]):
+            self.client.get(reverse("home"))
+            response = self.client.get(reverse("restaurant_detail", args=[self.restaurant.pk]))
+        self.assertEqual(self.profiles(), [response["X-Profile"]])
+        self.assertTrue(response["X-Profile"].endswith("-restaurant_detail.prof"))
+        with override_settings(PROFILE_SAMPLE_RATE=1):
+            self.client.get(reverse("home"))
+        self.client.force_login(self.staff)
+        self.client.get(reverse("home"), {"profile": "1"})
+        self.assertEqual(len(self.profiles()), 3)
+        with override_settings(PROFILE_URL_NAMES=["home"], PROFILE_MAX_FILES=2):
+            response = self.client.get(reverse("home"))
+        self.assertEqual(len(self.profiles()), 2)
+        self.assertEqual(self.profiles()[-1], response["X-Profile"])
+
+        out = StringIO()
+        call_command("profile_summary", "--url-name", "home", "--limit", "5", stdout=out)
+        self.assertIn("2 profiles", out.getvalue())
+        self.assertIn("cumulative", out.getvalue())
+        call_command("profile_summary", "--sort", "tottime", "--clear", stdout=StringIO())
+        self.assertEqual(self.profiles(), [])
+        with self.assertRaises(CommandError):
+            call_command("profile_summary", stdout=StringIO())
+
+
+@override_settings(METRICS_PUBLIC=True)
+class MetricsTests(QueryBudgetTestMixin, TestCase):
+    """Test the Prometheus metrics endpoint"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.restaurant = Restaurant.objects.create(name="Test Restaurant")
+
+    def sample(self, text, metric, **labels):
+        """Returns the value of a sample in the exposition, or 0 when it is absent."""
+        selector = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+        prefix = f"{metric}{{{selector}}} " if selector else f"{metric} "
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix) :])
+        return 0.0
+
+    def scrape(self):
+        response = self.assertWithinQueryBudget("metrics", lambda: self.client.get(reverse("metrics")))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        return response.content.decode()
+
+    @override_settings(SERVER_TIMING_ENABLED=True)
+    def test_request_and_cache_metrics(self):
+        """Test requests, their queries and fragment cache lookups are counted per URL name"""
+
+        url = reverse("restaurant_detail", args=[self.restaurant.pk])
+        cache.clear()
+        before = self.scrape()
+        self.client.get(url)
+        self.client.get(url)
+        self.client.get(reverse("restaurant_detail", args=[9999]))
+        after = self.scrape()
+
+        def delta(metric, **labels):
+            return self.sample(after, metric, **labels) - self.sample(before, metric, **labels)
+
+        self.assertEqual(delta("django_requests_total", route="restaurant_detail", method="GET", status="200"), 2)
+        self.assertEqual(delta("django_requests_total", route="restaurant_detail", method="GET", status="404"), 1)
+        self.assertEqual(delta("django_request_duration_seconds_count", route="restaurant_detail"), 3)
+        self.assertEqual(delta("django_request_db_queries_count", route="restaurant_detail"), 3)
+        self.assertGreater(delta("django_request_db_queries_sum", route="restaurant_detail"), 0)
+        self.assertEqual(delta("django_request_db_duration_seconds_count", route="restaurant_detail"), 3)
+        fragment = "includes/restaurant_detail_body.html"
+        self.assertEqual(delta("django_cache_lookups_total", cache=fragment, result="hit"), 1)
+        self.assertEqual(delta("django_cache_lookups_total", cache=fragment, result="miss"), 2)
+
+    def test_job_queue_depth(self):
+        """Test the scrape reports the pending jobs by name"""
+
+        Review.objects.create(restaurant=self.restaurant, user=self.user, rating=4, body="Ok")
+        self.assertEqual(self.sample(self.scrape(), "job_queue_waiting", name="rankings"), 1)
+        run_pending()
+        self.assertEqual(self.sample(self.scrape(), "job_queue_waiting", name="rankings"), 0)
+
+    @override_settings(METRICS_PUBLIC=False)
+    def test_hidden_without_token(self):
+        """Test the endpoint is hidden when no token is configured and it is not public"""
+
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
+
+    @override_settings(METRICS_TOKEN="secret", METRICS_PUBLIC=False)
+    def test_token(self):
+        """Test a configured token is required"""
+
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+
+class WarmupTests(TestCase):
+    """Test the startup warmup and the server configuration"""
+
+    def test_warm_up(self):
+        """Test every template and URL pattern is compiled and the connections opened"""
+
+        report = {name: result for name, result, _ in warmup.warm_up(["django_project.urls_async"])}
+        templates = sum(len(files) for _, _, files in os.walk(settings.BASE_DIR / "templates"))
+        self.assertGreaterEqual(report["templates"], templates)
+        self.assertGreater(report["urls"], 30)
+        self.assertEqual(report["connections"], len(settings.DATABASES))
+        out = StringIO()
+        call_command("warmup", "--no-databases", stdout=out)
+        self.assertIn("templates", out.getvalue())
+        self.assertNotIn("connections", out.getvalue())
+
+    def test_gunicorn_config(self):
+        """Test the server configuration preloads the application and recycles workers with jitter"""
+
+        with mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "3", "PORT": "5000"}):
+            config = runpy.run_path(str(settings.BASE_DIR / "gunicorn.conf.py"))
+            self.assertEqual(os.environ["DJANGO_DB_PROFILE"], "wal")
+        self.assertTrue(config["preload_app"])
+        self.assertEqual((config["workers"], config["bind"], config["worker_class"]), (3, "0.0.0.0:5000", "gthread"))
+        self.assertGreater(config["max_requests_jitter"], 0)
+        self.assertLessEqual(config["graceful_timeout"], config["timeout"])
+        self.assertNotIn("PROMETHEUS_MULTIPROC_DIR", os.environ)
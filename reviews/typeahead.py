@@ -0,0 +1,136 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import heapq
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from django.conf import settings
+from .caching import CATALOG_VERSION, RESTAURANT_NAMES_VERSION, get_versions
+from .models import Restaurant
+
+# Restaurant name typeahead from a prefix index held in each process. Every word of a folded name starts
+# a key (the name from that word on), so "loco" and "taco lo" both find "El Taco Loco". The keys are one
+# sorted list, the keys starting with a prefix are the slice between two bisections, and each key points
+# at its restaurant's rank by review count, so the best matches are the smallest ranks in the slice.
+# The slices of one to SHORT_PREFIX_LENGTH letter prefixes can hold most of the keys, so the best
+# TOP_RANKS ranks of each of those are kept when the index is built.
+
+# Sorts after every character a folded name can contain.
+RANGE_END = chr(0x10FFFF)
+MAX_QUERY_LENGTH = 100
+SHORT_PREFIX_LENGTH = 3
+# The typeahead API's largest page.
+TOP_RANKS = 100
+
+
+def fold(text):
+    """
+    Returns text case-folded, without accents and with its whitespace collapsed, for matching.
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return " ".join("".join(char for char in decomposed if not unicodedata.combining(char)).casefold().split())
+
+
+class PrefixIndex:
+    """
+    An immutable prefix index over (id, name, review_count) restaurant rows.
+    """
+
+    def __init__(self, rows, versions=None):
+        # Rank order: most reviewed first, then by name.
+        self.restaurants = sorted(rows, key=lambda row: (-row[2], row[1], row[0]))
+        keys = []
+        for rank, (_, name, _) in enumerate(self.restaurants):
+            folded = fold(name)
+            start = 0
+            for word in folded.split(" "):
+                keys.append((folded[start:], rank))
+                start += len(word) + 1
+        keys.sort()
+        self.keys = [key for key, _ in keys]
+        self.ranks = array("l", (rank for _, rank in keys))
+        prefixes = {key[:length] for key in self.keys for length in range(1, SHORT_PREFIX_LENGTH + 1)}
+        self.top = {prefix: self.best_ranks(prefix, TOP_RANKS) for prefix in prefixes}
+        self.versions = versions
+        self.built = time.monotonic()
+
+    def __len__(self):
+        return len(self.restaurants)
+
+    def best_ranks(self, prefix, limit):
+        """
+        Returns the smallest limit ranks of the keys starting with the prefix, in order.
+        """
+        start = bisect_left(self.keys, prefix)
+        stop = bisect_left(self.keys, prefix + RANGE_END, start)
+        return heapq.nsmallest(limit, set(self.ranks[start:stop]))
+
+    def search(self, query, limit):
+        """
+        Returns up to limit (id, name, review_count) rows with a word starting with the query, most
+        reviewed first.
+        """
+        prefix = fold(query[:MAX_QUERY_LENGTH])
+        if not prefix:
+            return []
+        if len(prefix) <= SHORT_PREFIX_LENGTH and limit <= TOP_RANKS:
+            ranks = self.top.get(prefix, [])[:limit]
+        else:
+            ranks = self.best_ranks(prefix, limit)
+        return [self.restaurants[rank] for rank in ranks]
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def build_index():
+    """
+    Returns a new index of every restaurant, tagged with the restaurant name versions it reflects.
+    """
+    # Read the versions first: a write landing during the query moves them again, so the next lookup rebuilds.
+    versions = get_versions(CATALOG_VERSION, RESTAURANT_NAMES_VERSION)
+    restaurants = Restaurant.objects.visible().order_by().values_list("pk", "name", "review_count")
+    return PrefixIndex(restaurants.iterator(chunk_size=10_000), versions)
+
+
+def get_index():
+    """
+    Returns this process's index, building it on first use.
+
+    Adding, renaming, hiding or deleting a restaurant bumps the restaurant names version; the index is
+    rebuilt on the next lookup after that, at most every settings.TYPEAHEAD_REBUILD_SECONDS, and lookups
+    in between only read the version counters from the cache. Review writes leave the names alone, so
+    the review counts the matches are ranked by are only refreshed every settings.TYPEAHEAD_MAX_AGE_SECONDS.
+    """
+    global _index
+    index = _index
+    age = time.monotonic() - index.built if index is not None else None
+    if (
+        index is None
+        or age >= settings.TYPEAHEAD_MAX_AGE_SECONDS
+        or (
+            index.versions != get_versions(CATALOG_VERSION, RESTAURANT_NAMES_VERSION)
+            and age >= settings.TYPEAHEAD_REBUILD_SECONDS
+        )
+    ):
+        with _lock:
+            # Another thread may have rebuilt it while this one waited.
+            if _index is index:
+                _index = build_index()
+            index = _index
+    return index
+
+
+def reset():
+    """
+    Drop this process's index, so the next lookup rebuilds it.
+    """
+    global _index
+    _index = None
@@ -5,20 +5,46 @@ Date: October 10, 2024
 """
 
 from django.urls import path
+from .api import (
+    RestaurantListApiView,
+    RestaurantExportApiView,
+    RestaurantTypeaheadApiView,
+    RestaurantDetailApiView,
+    RestaurantReviewsApiView,
+    RestaurantReviewsExportApiView,
+)
+from .metrics import MetricsView
 from .views import (
     HomeView,
     RestaurantDetailView,
+    RestaurantStatsView,
     AddReviewView,
     ReviewDetailView,
     UpdateReviewView,
     DeleteReviewView,
+    SearchView,
+    UserReviewsView,
 )
 
 urlpatterns = [
     path("", HomeView.as_view(), name="home"),
     path("restaurant/<int:pk>/", RestaurantDetailView.as_view(), name="restaurant_detail"),
+    path("restaurant/<int:pk>/stats/", RestaurantStatsView.as_view(), name="restaurant_stats"),
     path("restaurant/<int:restaurant_pk>/add_review/", AddReviewView.as_view(), name="add_review"),
     path("review/<int:pk>/", ReviewDetailView.as_view(), name="review_detail"),
     path("review/<int:pk>/update/", UpdateReviewView.as_view(), name="update_review"),
     path("review/<int:pk>/delete/", DeleteReviewView.as_view(), name="delete_review"),
+    path("search/", SearchView.as_view(), name="search"),
+    path("user/<int:pk>/", UserReviewsView.as_view(), name="user_reviews"),
+    path("metrics", MetricsView.as_view(), name="metrics"),
+    path("api/restaurants/", RestaurantListApiView.as_view(), name="api_restaurants"),
+    path("api/restaurants/export/", RestaurantExportApiView.as_view(), name="api_restaurants_export"),
+    path("api/restaurants/typeahead/", RestaurantTypeaheadApiView.as_view(), name="api_restaurant_typeahead"),
+    path("api/restaurants/<int:pk>/", RestaurantDetailApiView.as_view(), name="api_restaurant"),
+    path("api/restaurants/<int:pk>/reviews/", RestaurantReviewsApiView.as_view(), name="api_restaurant_reviews"),
+    path(
+        "api/restaurants/<int:pk>/reviews/export/",
+        RestaurantReviewsExportApiView.as_view(),
+        name="api_restaurant_reviews_export",
+    ),
 ]
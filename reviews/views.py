@@ -4,7 +4,7 @@ CIS 218: Django Project
 Date: October 10, 2024
 """
 
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.views import LoginView, LogoutView
 from django.urls import reverse, reverse_lazy
@@ -12,45 +12,253 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
-from django.db.models import Avg
 from django.views import View
 from django.shortcuts import get_object_or_404
-from .models import Restaurant, Review
+from django.db import router
+from django.core.exceptions import BadRequest
+from django.contrib.auth.models import User
+from .models import Restaurant, RestaurantRanking, Review, ReviewerStats, SimilarRestaurant
 from .forms import ReviewForm
+from .pagination import KeysetPaginator, paginate_or_404
+from .conditional import ConditionalPageMixin
+from .search import search
+from .geo import parse_near
+from .rollups import PERIODS, rating_series
+from .caching import (
+    CATALOG_VERSION,
+    RESTAURANT_LIST_VERSION,
+    VersionedFragmentCacheMixin,
+    get_versions,
+    restaurant_version,
+)
 
+RESTAURANTS_PER_PAGE = 24
+REVIEWS_PER_PAGE = 20
+SIMILAR_RESTAURANTS_SHOWN = 5
 
-class HomeView(ListView):
+# Home page sort modes: (label, ranking table ordering). Ranked modes page through RestaurantRanking's
+# indexes; "name" pages through the restaurant table itself.
+RESTAURANT_SORTS = {
+    "name": ("A-Z", None),
+    "top": ("Top rated", ("-bayesian_score", "-restaurant_id")),
+    "trending": ("Trending", ("-trending_score", "-restaurant_id")),
+}
+
+
+class HomeView(VersionedFragmentCacheMixin, ListView):
     """
     View for the home page, displaying a list of all restaurants.
     """
 
     model = Restaurant
     template_name = "home.html"
+    read_from_replica = True
+    fragment_template_name = "includes/home_list.html"
     context_object_name = "restaurants"
+    paginate_by = RESTAURANTS_PER_PAGE
+    keyset_ordering = ("name", "id")
+
+    def get_fragment_versions(self):
+        """
+        The list shows every restaurant's aggregates, so it changes with any restaurant or review write.
+        """
+        return [CATALOG_VERSION, RESTAURANT_LIST_VERSION]
 
     def get_queryset(self):
         """
-        Returns the queryset of restaurants, annotated with their average rating.
+        Returns the queryset of restaurants. Ratings come from the stored aggregates on each row.
+        """
+        return Restaurant.objects.visible()
+
+    def get_sort(self):
+        """
+        Returns the sort mode from ?sort=, defaulting to alphabetical.
+        """
+        sort = self.request.GET.get("sort")
+        return sort if sort in RESTAURANT_SORTS else "name"
+
+    def get_keyset_paginator(self, page_size):
+        """
+        Returns the cursor paginator for the selected sort mode.
+        """
+        ordering = RESTAURANT_SORTS[self.get_sort()][1]
+        if ordering is None:
+            return KeysetPaginator(self.get_queryset(), self.keyset_ordering, page_size)
+        rankings = RestaurantRanking.objects.filter(restaurant__deleted__isnull=True).select_related("restaurant")
+        return KeysetPaginator(rankings, ordering, page_size)
+
+    @staticmethod
+    def restaurants_on_page(page):
+        """
+        Swap the ranking rows of a ranked page for their restaurants.
         """
-        return Restaurant.objects.annotate(avg_rating=Avg("reviews__rating"))
+        if page.object_list and isinstance(page.object_list[0], RestaurantRanking):
+            page.object_list = [ranking.restaurant for ranking in page.object_list]
+        return page
+
+    def get_near(self):
+        """
+        Returns (latitude, longitude, radius_km) from ?near=lat,lng&radius=km, or None.
+        """
+        near = self.request.GET.get("near")
+        if not near:
+            return None
+        try:
+            return parse_near(near, self.request.GET.get("radius"))
+        except ValueError as exc:
+            raise BadRequest(str(exc))
+
+    def sort_context(self):
+        near = self.get_near()
+        return {
+            "sort": self.get_sort(),
+            "sorts": [(key, label) for key, (label, _) in RESTAURANT_SORTS.items()],
+            "near_radius_km": near and near[2],
+        }
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Paginate by cursor instead of page number, so deep pages cost the same as the first.
+
+        A "near me" list is one page of the nearest restaurants instead, with their distances.
+        """
+        near = self.get_near()
+        if near is not None:
+            return None, None, Restaurant.objects.visible().nearest(*near, limit=page_size), False
+        paginator = self.get_keyset_paginator(page_size)
+        page = self.restaurants_on_page(paginate_or_404(paginator, self.request.GET.get("cursor")))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        """
+        Add the sort modes for the sort links.
+        """
+        context = super().get_context_data(**kwargs)
+        context.update(self.sort_context())
+        return context
 
 
-class RestaurantDetailView(DetailView):
+class RestaurantDetailView(VersionedFragmentCacheMixin, ConditionalPageMixin, DetailView):
     """
     View for displaying details of a single restaurant, including all its reviews.
     """
 
     model = Restaurant
+    queryset = Restaurant.objects.visible()
     template_name = "restaurant_detail.html"
+    read_from_replica = True
+    fragment_template_name = "includes/restaurant_detail_body.html"
     context_object_name = "restaurant"
+    reviews_ordering = ("-created", "-id")
+
+    def get_fragment_versions(self):
+        """
+        The page only changes when this restaurant or one of its reviews is written.
+        """
+        return [CATALOG_VERSION, restaurant_version(self.kwargs["pk"])]
+
+    def get_validators(self, restaurant):
+        """
+        Every review write touches the restaurant's updated time and may change its review count.
+        """
+        return (restaurant.updated, restaurant.review_count)
+
+    def get_fragment_validators(self, context):
+        return self.get_validators(context["object"])
+
+    def get_context_data(self, **kwargs):
+        """
+        Add extra context data including reviews, average rating and similar restaurants.
+        """
+        context = super().get_context_data(**kwargs)
+        reviews = self.object.reviews.select_related("user")
+        paginator = KeysetPaginator(reviews, self.reviews_ordering, REVIEWS_PER_PAGE)
+        context["reviews_page"] = paginate_or_404(paginator, self.request.GET.get("cursor"))
+        context["reviews"] = context["reviews_page"].object_list
+        context["average_rating"] = self.object.average_rating()
+        context["similar_restaurants"] = list(self.get_similar_restaurants(self.object))
+        return context
+
+    def get_similar_restaurants(self, restaurant):
+        """
+        Returns the precomputed similar restaurants (reviews.similarity), read with one index range scan.
+        """
+        similar = SimilarRestaurant.objects.using(restaurant._state.db)
+        return similar.for_restaurant(restaurant.pk, SIMILAR_RESTAURANTS_SHOWN)
+
+
+class RestaurantStatsView(ConditionalPageMixin, DetailView):
+    """
+    View for a restaurant's rating statistics: its histogram and rating history.
+
+    The history is read from the daily rollups and grouped by ?period= (day, week or month) in the
+    database, so the page reads one row per day with reviews however many reviews there are.
+    """
+
+    model = Restaurant
+    queryset = Restaurant.objects.visible()
+    template_name = "restaurant_stats.html"
+    read_from_replica = True
+    context_object_name = "restaurant"
+
+    def get_validators(self, restaurant):
+        """
+        Every review write touches the restaurant's updated time, as on the restaurant page.
+        """
+        return (restaurant.updated, restaurant.review_count)
+
+    def get_period(self):
+        """
+        Returns the requested downsampling period, falling back to days.
+        """
+        period = self.request.GET.get("period")
+        return period if period in PERIODS else "day"
+
+    def get_context_data(self, **kwargs):
+        """
+        Add the average rating and the rating history for the requested period.
+        """
+        context = super().get_context_data(**kwargs)
+        context["period"] = self.get_period()
+        context["periods"] = [(key, label) for key, (label, _) in PERIODS.items()]
+        context["series"] = rating_series(self.object.daily_ratings.all(), context["period"])
+        context["average_rating"] = self.object.average_rating()
+        return context
+
+
+class UserReviewsView(ConditionalPageMixin, DetailView):
+    """
+    View for a user's profile: their review statistics and their reviews, newest first.
+
+    Reviews are paged by cursor over the (user, created, id) index and fetched with their restaurants
+    in one joined query, so the deepest page of a prolific reviewer costs the same as the first.
+    """
+
+    model = User
+    template_name = "user_reviews.html"
+    read_from_replica = True
+    context_object_name = "profile_user"
+    queryset = User.objects.filter(is_active=True).select_related("review_stats")
+    reviews_ordering = ("-created", "-id")
+
+    def get_validators(self, user):
+        """
+        Every write to the user's reviews touches their statistics' updated time; hiding a restaurant
+        bumps the catalog version.
+        """
+        stats = ReviewerStats.for_user(user)
+        return (stats.updated, stats.review_count, *get_versions(CATALOG_VERSION))
 
     def get_context_data(self, **kwargs):
         """
-        Add extra context data including reviews and average rating.
+        Add the user's statistics and a page of their reviews.
         """
         context = super().get_context_data(**kwargs)
-        context["reviews"] = self.object.reviews.all().order_by("-created")
-        context["average_rating"] = self.object.reviews.aggregate(Avg("rating"))["rating__avg"]
+        context["stats"] = ReviewerStats.for_user(self.object)
+        reviews = Review.objects.filter(user=self.object, restaurant__deleted__isnull=True).select_related("restaurant")
+        paginator = KeysetPaginator(reviews, self.reviews_ordering, REVIEWS_PER_PAGE)
+        context["reviews_page"] = paginate_or_404(paginator, self.request.GET.get("cursor"))
+        context["reviews"] = context["reviews_page"].object_list
         return context
 
 
@@ -63,12 +271,20 @@ class AddReviewView(LoginRequiredMixin, CreateView):
     form_class = ReviewForm
     template_name = "add_review.html"
 
+    def get_restaurant(self):
+        """
+        Return the restaurant being reviewed, fetching it at most once per request.
+        """
+        if not hasattr(self, "restaurant"):
+            self.restaurant = get_object_or_404(Restaurant.objects.visible(), pk=self.kwargs["restaurant_pk"])
+        return self.restaurant
+
     def form_valid(self, form):
         """
         If the form is valid, save the associated model.
         """
         form.instance.user = self.request.user
-        form.instance.restaurant = get_object_or_404(Restaurant, pk=self.kwargs["restaurant_pk"])
+        form.instance.restaurant = self.get_restaurant()
         return super().form_valid(form)
 
     def get_success_url(self):
@@ -82,18 +298,26 @@ class AddReviewView(LoginRequiredMixin, CreateView):
         Insert the restaurant into the context dict.
         """
         context = super().get_context_data(**kwargs)
-        context["restaurant"] = get_object_or_404(Restaurant, pk=self.kwargs["restaurant_pk"])
+        context["restaurant"] = self.get_restaurant()
         return context
 
 
-class ReviewDetailView(DetailView):
+class ReviewDetailView(ConditionalPageMixin, DetailView):
     """
     View for displaying details of a single review.
     """
 
     model = Review
     template_name = "review_detail.html"
+    read_from_replica = True
     context_object_name = "review"
+    queryset = Review.objects.filter(restaurant__deleted__isnull=True).select_related("restaurant", "user")
+
+    def get_validators(self, review):
+        """
+        The page also shows the restaurant's name, so a restaurant change counts as a modification.
+        """
+        return (max(review.updated, review.restaurant.updated),)
 
     def get_context_data(self, **kwargs):
         """
@@ -104,21 +328,36 @@ class ReviewDetailView(DetailView):
         return context
 
 
-class UpdateReviewView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class ReviewAuthorMixin(LoginRequiredMixin, UserPassesTestMixin):
     """
-    View for updating an existing review.
+    Restrict a review view to the review's author, loading the review only once per request.
     """
 
-    model = Review
-    form_class = ReviewForm
-    template_name = "update_review.html"
+    queryset = Review.objects.filter(restaurant__deleted__isnull=True).select_related("restaurant", "user")
+
+    def get_object(self, queryset=None):
+        """
+        Return the review, reusing the copy fetched by test_func.
+        """
+        if not hasattr(self, "_review"):
+            self._review = super().get_object(queryset)
+        return self._review
 
     def test_func(self):
         """
-        Ensure that only the author of the review can update it.
+        Ensure that only the author of the review can change it.
         """
-        review = self.get_object()
-        return self.request.user == review.user
+        return self.request.user.pk == self.get_object().user_id
+
+
+class UpdateReviewView(ReviewAuthorMixin, UpdateView):
+    """
+    View for updating an existing review.
+    """
+
+    model = Review
+    form_class = ReviewForm
+    template_name = "update_review.html"
 
     def get_success_url(self):
         """
@@ -135,7 +374,7 @@ class UpdateReviewView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return context
 
 
-class DeleteReviewView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class DeleteReviewView(ReviewAuthorMixin, DeleteView):
     """
     View for deleting an existing review.
     """
@@ -143,13 +382,6 @@ class DeleteReviewView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     model = Review
     template_name = "delete_review.html"
 
-    def test_func(self):
-        """
-        Ensure that only the author of the review can delete it.
-        """
-        review = self.get_object()
-        return self.request.user == review.user
-
     def get_success_url(self):
         """
         Return the URL to redirect to after successful deletion.
@@ -163,3 +395,26 @@ class DeleteReviewView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         context = super().get_context_data(**kwargs)
         context["restaurant"] = self.object.restaurant
         return context
+
+
+class SearchView(TemplateView):
+    """
+    View for searching restaurant names and review bodies.
+    """
+
+    template_name = "search.html"
+    read_from_replica = True
+
+    def get_context_data(self, **kwargs):
+        """
+        Add the ranked results for the ?q= query and ?page= page number.
+        """
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get("q", "").strip()
+        try:
+            page = int(self.request.GET.get("page", 1))
+        except ValueError:
+            page = 1
+        context["query"] = query
+        context["results"] = search(query, page=page, per_page=REVIEWS_PER_PAGE, using=router.db_for_read(Review))
+        return context
@@ -0,0 +1,102 @@
+"""
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+"""
+
+import logging
+import os
+import time
+from django.db import connections
+from django.template import engines
+from django.template.utils import get_app_template_dirs
+from django.urls import URLPattern, URLResolver, get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def compile_templates():
+    """
+    Load and parse every template of every engine, so the cached loaders hold them before a request does.
+
+    Returns the number of templates compiled.
+    """
+    compiled = 0
+    for engine in engines.all():
+        directories = list(engine.dirs)
+        if engine.app_dirs:
+            directories += get_app_template_dirs("templates")
+        for directory in directories:
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    if filename.endswith((".html", ".txt")):
+                        engine.get_template(os.path.relpath(os.path.join(root, filename), directory))
+                        compiled += 1
+    return compiled
+
+
+def _compile_patterns(resolver):
+    count = 0
+    for pattern in resolver.url_patterns:
+        # The route regexes are compiled on first access.
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            count += _compile_patterns(pattern)
+        elif isinstance(pattern, URLPattern):
+            count += 1
+    return count
+
+
+def resolve_urls(urlconfs=None):
+    """
+    Import the URLconfs, compile every route and build the reverse lookup tables.
+
+    Returns the number of URL patterns compiled.
+    """
+    count = 0
+    for urlconf in urlconfs or [None]:
+        resolver = get_resolver(urlconf)
+        count += _compile_patterns(resolver)
+        # Reversing a name builds the resolver's reverse dictionaries and namespaces.
+        resolver.reverse_dict
+        resolver.namespace_dict
+    return count
+
+
+def prime_connections():
+    """
+    Open a connection to every configured database.
+
+    Returns the number of connections opened.
+    """
+    for alias in connections:
+        connections[alias].ensure_connection()
+    return len(connections.all())
+
+
+def run_steps(steps):
+    """
+    Run (name, function) steps and return [(name, result, seconds)], logging each one.
+    """
+    report = []
+    for name, function in steps:
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        logger.info("Warmup: %s: %s in %.1f ms", name, result, elapsed * 1000)
+        report.append((name, result, elapsed))
+    return report
+
+
+def warm_up(urlconfs=None, databases=True):
+    """
+    Pay the cold-start costs of a process up front: templates, URLs and, when databases is true, the
+    database connections. Returns the report of run_steps().
+
+    Under gunicorn (gunicorn.conf.py) the templates and URLs are compiled once in the preloaded master
+    and shared by the forked workers; each worker then opens its own connections.
+    """
+    steps = [("templates", compile_templates), ("urls", lambda: resolve_urls(urlconfs))]
+    if databases:
+        steps.append(("connections", prime_connections))
+    return run_steps(steps)
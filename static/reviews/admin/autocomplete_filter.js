@@ -0,0 +1,21 @@
+/*
+Name: Revelle Williams
+CIS 218: Django Project
+Date: October 10, 2024
+*/
+// Reload the changelist when an autocomplete list filter (reviews.admin.AutocompleteFilter) changes.
+'use strict';
+{
+    const $ = django.jQuery;
+
+    $(document).on('change', 'select[data-filter-param]', function() {
+        const params = new URLSearchParams(window.location.search);
+        params.delete('p');
+        if (this.value) {
+            params.set(this.dataset.filterParam, this.value);
+        } else {
+            params.delete(this.dataset.filterParam);
+        }
+        window.location.search = params.toString();
+    });
+}